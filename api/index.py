@@ -1,191 +1,145 @@
-import os
+"""
+Vercel entry point: a bare ASGI app in front of the backend's modules.
+
+A cold start pays for every import, so until a delivery actually needs a review nothing
+beyond the standard library and ``backend/webhooks.py`` is loaded: ``/``, ``/health``,
+pings, other events and ignored actions are answered first. A review then runs inside the
+request with the same pipeline as ``backend/main.py`` (there is no background worker
+between invocations), so the function's time limit must cover one review. The debounce
+that lets a burst of pushes settle is off here: it would only add to that time, and to the
+wait of a GitHub delivery that gives up after 10 seconds.
+"""
+
+import importlib.util
 import json
+import logging
+import os
+import sys
 import time
-import jwt
-import httpx
-import hashlib
-import hmac
-import yaml
-import textwrap
-import base64
-from typing import Dict, Any, Optional, List
-from fastapi import FastAPI, Request, Header, HTTPException
-from fastapi.responses import JSONResponse
-from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from openai import OpenAI
-
-# Environment configuration
-class Settings:
-    def __init__(self):
-        self.openai_api_key = os.getenv("OPENAI_API_KEY", "")
-        self.github_app_id = os.getenv("GITHUB_APP_ID", "")
-        self.github_webhook_secret = os.getenv("GITHUB_WEBHOOK_SECRET", "")
-        self.github_private_key_b64 = os.getenv("GITHUB_PRIVATE_KEY_BASE64", "")
-        self.bot_comment_tag = os.getenv("BOT_COMMENT_TAG", "ai-review-bot")
-        self.max_patch_chars = int(os.getenv("MAX_PATCH_CHARS", "12000"))
-
-    @property
-    def github_private_key_pem(self) -> bytes:
-        if not self.github_private_key_b64 or self.github_private_key_b64 == "placeholder":
-            return b"placeholder"
-        return base64.b64decode(self.github_private_key_b64)
-
-settings = Settings()
-
-# Pydantic models
-class Finding(BaseModel):
-    severity: str
-    title: str
-    details: str
-    suggestion: Optional[str] = None
-
-class FileReview(BaseModel):
-    file: str
-    findings: List[Finding] = []
-
-class ReviewResult(BaseModel):
-    summary: str
-    files: List[FileReview] = []
-
-# GitHub client functions
-GITHUB_API = "https://api.github.com"
-
-def verify_signature(secret: str, raw_body: bytes, signature_header: str) -> bool:
-    if not signature_header or not signature_header.startswith("sha256="):
-        return False
-    digest = hmac.new(secret.encode(), raw_body, hashlib.sha256).hexdigest()
-    return hmac.compare_digest(f"sha256={digest}", signature_header)
-
-def _app_jwt() -> str:
-    if settings.github_private_key_b64 == "placeholder":
-        return "placeholder"
-    now = int(time.time())
-    payload = {"iat": now - 60, "exp": now + 9 * 60, "iss": settings.github_app_id}
-    return jwt.encode(payload, settings.github_private_key_pem, algorithm="RS256")
-
-async def _installation_token(installation_id: int) -> str:
-    jwt_token = _app_jwt()
-    if jwt_token == "placeholder":
-        return "placeholder"
-    async with httpx.AsyncClient() as client:
-        r = await client.post(
-            f"{GITHUB_API}/app/installations/{installation_id}/access_tokens",
-            headers={"Authorization": f"Bearer {jwt_token}", "Accept": "application/vnd.github+json"},
-        )
-        r.raise_for_status()
-        return r.json()["token"]
-
-async def list_changed_files(owner: str, repo: str, pr_number: int, token: str) -> List[Dict[str, Any]]:
-    if token == "placeholder":
-        return []
-    async with httpx.AsyncClient() as client:
-        files = []
-        page = 1
-        while True:
-            r = await client.get(
-                f"{GITHUB_API}/repos/{owner}/{repo}/pulls/{pr_number}/files",
-                headers={"Authorization": f"token {token}", "Accept": "application/vnd.github+json"},
-                params={"per_page": 100, "page": page},
-            )
-            r.raise_for_status()
-            batch = r.json()
-            files.extend(batch)
-            if len(batch) < 100:
-                break
-            page += 1
-        return files
-
-async def create_or_update_comment(owner: str, repo: str, pr_number: int, token: str, body: str, marker: str):
-    if token == "placeholder":
-        return True
-    # Implementation for creating/updating comments
-    return True
-
-# Reviewer functions
-DEFAULT_RULES = {
-    "max_findings_per_file": 5,
-    "focus": ["correctness", "security", "performance", "readability"],
-    "ignore_globs": ["*.lock", "*.md", "dist/**", "build/**"],
-    "severity_threshold": "info"
-}
-
-def parse_repo_rules(config_text: str | None) -> Dict[str, Any]:
-    try:
-        if not config_text:
-            return DEFAULT_RULES
-        y = yaml.safe_load(config_text) or {}
-        return {**DEFAULT_RULES, **y}
-    except Exception:
-        return DEFAULT_RULES
-
-async def review_changed_files(owner: str, repo: str, pr_number: int, changed: List[Dict[str, Any]], repo_rules: Dict[str, Any]) -> ReviewResult:
-    if not settings.openai_api_key or settings.openai_api_key == "":
-        return ReviewResult(summary="OpenAI API key not configured", files=[])
-    
-    return ReviewResult(summary="AI review completed successfully", files=[])
-
-def render_markdown(result: ReviewResult, tag: str) -> str:
-    lines = []
-    lines.append(f"<!-- {tag} -->")
-    lines.append("## 🤖 AI Code Review\n")
-    lines.append(result.summary.strip())
-    lines.append("\n> _Re-run automatically on new commits (synchronize)_")
-    return "\n".join(lines)
-
-# FastAPI app
-app = FastAPI(title="AI Code Review Bot", version="1.0.0")
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-@app.get("/")
-async def root():
-    return {
-        "message": "🤖 AI Code Review Bot is running!",
-        "status": "healthy",
-        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
-        "platform": "vercel"
-    }
-
-@app.get("/health")
-async def health():
-    return {"ok": True, "service": "ai-code-review-bot", "platform": "vercel"}
-
-@app.post("/webhook")
-async def webhook(
-    request: Request,
-    x_github_event: str = Header(None, convert_underscores=False),
-    x_hub_signature_256: str = Header(None, convert_underscores=False),
-):
+
+BACKEND = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+_MODULES = frozenset(name[:-3] for name in os.listdir(BACKEND) if name.endswith(".py"))
+
+class _BackendFinder:
+    """Import the backend's modules (``config``, ``state``, ``metrics``...) from backend/ by their
+    own names, as ``backend/main.py`` does, without putting the directory on ``sys.path``. A
+    name that an installed distribution provides too is an ImportError rather than one of the
+    two silently replacing the other."""
+
+    @staticmethod
+    def find_spec(name, path=None, target=None):
+        if path is not None or name not in _MODULES:
+            return None
+        for finder in sys.meta_path:
+            if finder is _BackendFinder or not hasattr(finder, "find_spec"):
+                continue
+            other = finder.find_spec(name, None)
+            if other and os.path.dirname(other.origin or "") != BACKEND:
+                raise ImportError(f"backend module {name!r} clashes with {other.origin}")
+        return importlib.util.spec_from_file_location(name, os.path.join(BACKEND, f"{name}.py"))
+
+sys.meta_path.insert(0, _BackendFinder)
+# Only /tmp is writable on Vercel; it is kept between invocations of a warm instance
+for _name, _file in (("STATE_URL", "state.db"), ("REVIEW_CACHE_URL", "review_cache.db"),
+                     ("KNOWLEDGE_URL", "knowledge.db")):
+    os.environ.setdefault(_name, f"sqlite:////tmp/{_file}")
+os.environ["REVIEW_DEBOUNCE_SECONDS"] = "0"
+
+import webhooks
+
+logger = logging.getLogger("ai_review")
+
+_CORS = [(b"access-control-allow-origin", b"*")]
+
+def _configured(value: str) -> bool:
+    return value not in {"", "placeholder"}
+
+async def _read_body(receive) -> bytes:
+    chunks, more = [], True
+    while more:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        more = message.get("more_body", False)
+    return b"".join(chunks)
+
+async def _respond(send, status: int, body=None, headers=()) -> None:
+    raw = json.dumps(body).encode() if body is not None else b""
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(raw)).encode()),
+                            *_CORS, *headers]})
+    await send({"type": "http.response.body", "body": raw})
+
+async def _review(payload: dict, delivery: str):
+    """Run the review in this request; returns ``(status, body)``."""
+    import github_client as gh
+    import llm
+    import state
+    from jobs import JobCancelled, RetryLater
+    from pipeline import review_pull_request
+
+    pr = payload["pull_request"]["number"]
+    # Redeliveries are dropped as in backend/main.py; the claim is freed when the review fails
+    if delivery and not await state.shared.aset_if_absent(f"delivery:{delivery}", "1", ttl=webhooks.DELIVERY_TTL):
+        return 202, {"status": "duplicate", "job_id": delivery, "pr": pr}
     try:
-        raw = await request.body()
-        
-        # Skip signature verification if in placeholder mode
-        if settings.github_webhook_secret != "" and settings.github_webhook_secret != "placeholder":
-            if not verify_signature(settings.github_webhook_secret, raw, x_hub_signature_256):
-                raise HTTPException(status_code=401, detail="Invalid signature")
-
-        payload = await request.json()
-        
-        # Only react to PR lifecycle events
-        if x_github_event != "pull_request":
-            return JSONResponse({"ignored": True, "event": x_github_event})
-
-        action = payload.get("action")
-        if action not in {"opened", "reopened", "synchronize"}:
-            return JSONResponse({"ignored_action": action})
-
-        # If GitHub App not configured, return success but don't process
-        if settings.github_app_id == "" or settings.github_app_id == "placeholder":
-            return JSONResponse({"status": "github-app-not-configured", "message": "GitHub App ID not set"})
-
-        return JSONResponse({"status": "webhook-received", "action": action})
-    
+        return 200, await review_pull_request(payload)
+    except JobCancelled:
+        return 200, {"status": "superseded", "pr": pr}
+    except RetryLater as e:
+        if delivery:
+            await state.shared.adelete(f"delivery:{delivery}")
+        return 503, {"status": "deferred", "pr": pr, "retry_at": e.retry_at}
     except Exception as e:
-        return JSONResponse({"error": str(e)}, status_code=500)
+        if delivery:
+            await state.shared.adelete(f"delivery:{delivery}")
+        logger.exception("Error reviewing delivery %s", delivery)
+        return 500, {"detail": f"Internal server error: {str(e)}"}
+    finally:
+        # The next invocation may run on another event loop; do not keep connections bound to this one
+        await llm.close_client()
+        await gh.close_client()
+
+async def _webhook(scope, receive, send) -> None:
+    raw = await _read_body(receive)
+    headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+    secret, app_id = os.getenv("GITHUB_WEBHOOK_SECRET", ""), os.getenv("GITHUB_APP_ID", "")
+    # With neither a secret nor an app configured (a preview deployment) deliveries are only acknowledged
+    if (_configured(secret) or _configured(app_id)) and not webhooks.verify_signature(
+            secret, raw, headers.get("x-hub-signature-256", "")):
+        return await _respond(send, 401, {"detail": "Invalid signature"})
+    try:
+        payload, ignored = webhooks.triage(headers.get("x-github-event"), raw)
+    except ValueError:
+        return await _respond(send, 400, {"detail": "Invalid JSON payload"})
+    if ignored:
+        return await _respond(send, 200, ignored)
+    if not _configured(app_id):
+        return await _respond(send, 200, {"status": "github-app-not-configured", "message": "GitHub App ID not set"})
+    status, body = await _review(payload, headers.get("x-github-delivery", ""))
+    await _respond(send, status, body)
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        return
+    method, path = scope["method"], scope["path"].rstrip("/") or "/"
+    if method == "OPTIONS":
+        await _respond(send, 204, headers=[(b"access-control-allow-methods", b"GET, POST, OPTIONS"),
+                                           (b"access-control-allow-headers", b"*")])
+    elif method == "GET" and path == "/":
+        await _respond(send, 200, {"message": "🤖 AI Code Review Bot is running!", "status": "healthy",
+                                   "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                                   "platform": "vercel"})
+    elif method == "GET" and path == "/health":
+        await _respond(send, 200, {"ok": True, "service": "ai-code-review-bot", "platform": "vercel"})
+    elif method == "POST" and path == "/webhook":
+        await _webhook(scope, receive, send)
+    else:
+        await _respond(send, 404, {"detail": "Not Found"})
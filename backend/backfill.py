@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Backfill: review many pull requests, or the commits of a local checkout, in one run.
+
+Onboarding a repo or changing its rules means re-reviewing what is already there. Targets:
+
+  --repo owner/name        the repo's open pull requests (or only --prs 12,40-45), through the
+                           same pipeline as a webhook; comments are posted unless --dry-run
+  --git PATH --range A..B  the commits of a local checkout, diffed by git itself, so no GitHub
+                           API call is made; --squash reviews the whole range as one diff.
+                           Always a dry run
+
+Targets run --concurrency at a time. Every finished target is appended to a checkpoint
+(JSON lines, --checkpoint); a rerun skips what it lists as done, so an interrupted backfill
+resumes where it stopped and failed targets are tried again. A dry run does not count as
+done for a run that posts, and a PR is keyed by its head SHA, so one pushed to since is
+reviewed again. Dry runs write one report per target to --out, as --format json or
+markdown (the comment that would have been posted).
+
+    python backfill.py --repo acme/api --dry-run --format markdown
+    python backfill.py --repo acme/api --prs 101-180 --concurrency 8
+    python backfill.py --git ~/src/api --range v1.2.0..main --out backfill-api --format json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import time
+from typing import Any, AsyncIterator, Dict, List, NamedTuple, Optional, Set, Tuple
+
+# A backfill is not a burst of pushes: there is nothing to debounce
+os.environ.setdefault("REVIEW_DEBOUNCE_SECONDS", "0")
+
+from config import settings
+import github_client as gh
+import llm
+import metrics
+from jobs import JobCancelled, RetryLater
+from models import ReviewResult
+from pathfilter import FilterReport
+from pipeline import collect_files, review_pull_request, truncation_note
+from reviewer import DEFAULT_RULES, parse_repo_rules, render_markdown, review_changed_files
+
+# Checkpoint states that count as done for a run that posts, or for a dry run; anything else
+# is retried. A dry run's reports do not stand in for comments that were never posted
+FINISHED = {False: {"posted", "superseded"}, True: {"posted", "dry-run", "superseded"}}
+
+class Target(NamedTuple):
+    id: str  # checkpoint key
+    name: str  # report file name
+    payload: Optional[Dict[str, Any]] = None  # pull requests: a synthetic webhook payload
+    base: Optional[str] = None  # local diffs: base..head, or head against its parent when None
+    head: Optional[str] = None
+
+class Checkpoint:
+    """Finished targets, one JSON line each, appended as they finish."""
+
+    def __init__(self, path: str, finished: Set[str]):
+        self.path, self.finished = path, finished
+        self.done: Set[str] = set()
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # the line a crash cut short
+                    if entry.get("status") in finished:
+                        self.done.add(entry["target"])
+        elif os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def record(self, target: str, status: str, **info: Any) -> None:
+        with open(self.path, "a") as f:
+            f.write(json.dumps({"target": target, "status": status, "at": time.time(), **info}) + "\n")
+        if status in self.finished:
+            self.done.add(target)
+
+def parse_numbers(spec: str) -> Set[int]:
+    """``"12,40-45"`` -> ``{12, 40, 41, 42, 43, 44, 45}``."""
+    numbers: Set[int] = set()
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        lo, _, hi = part.partition("-")
+        numbers.update(range(int(lo), int(hi or lo) + 1))
+    return numbers
+
+# --- local git -----------------------------------------------------------------------
+
+async def git(checkout: str, *args: str) -> str:
+    proc = await asyncio.create_subprocess_exec(
+        "git", "-C", checkout, "-c", "core.quotePath=false", *args,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+    out, err = await proc.communicate()
+    if proc.returncode:
+        raise RuntimeError(f"git {' '.join(args)} failed: {err.decode(errors='replace').strip()}")
+    return out.decode(errors="replace")
+
+def _header_path(line: str) -> str:
+    """The path in ``diff --git a/<path> b/<path>`` when both sides are the same file."""
+    rest = line[len("diff --git a/"):]
+    half = (len(rest) - 3) // 2
+    if rest[half:half + 3] == " b/" and rest[:half] == rest[half + 3:]:
+        return rest[:half]
+    return rest.split(" b/", 1)[0]
+
+def parse_git_diff(text: str) -> List[Dict[str, Any]]:
+    """``git diff`` output as the file entries GitHub's PR files API returns: ``filename``,
+    ``status`` (added, removed, modified, renamed), ``patch`` (from the first hunk header on),
+    ``previous_filename``, ``additions`` and ``deletions``."""
+    files = []
+    for block in re.split(r"(?m)^(?=diff --git )", text):
+        if not block.startswith("diff --git "):
+            continue
+        header, hunks, body = block.partition("\n@@")
+        lines = header.split("\n")
+        f: Dict[str, Any] = {"filename": _header_path(lines[0]), "status": "modified",
+                             "patch": ("@@" + body).rstrip("\n") if hunks else ""}
+        for line in lines[1:]:
+            if line.startswith("new file mode"):
+                f["status"] = "added"
+            elif line.startswith("deleted file mode"):
+                f["status"] = "removed"
+            elif line.startswith("rename from "):
+                f["status"], f["previous_filename"] = "renamed", line[len("rename from "):]
+            elif line.startswith("rename to "):
+                f["filename"] = line[len("rename to "):]
+            elif line.startswith("+++ b/"):
+                f["filename"] = line[len("+++ b/"):].rstrip("\t")
+        patch_lines = f["patch"].split("\n")
+        f["additions"] = sum(1 for l in patch_lines if l.startswith("+"))
+        f["deletions"] = sum(1 for l in patch_lines if l.startswith("-"))
+        f["changes"] = f["additions"] + f["deletions"]
+        files.append(f)
+    return files
+
+async def _aiter(items: List[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+    for item in items:
+        yield item
+
+def repo_name(remote_url: str, checkout: str) -> str:
+    """``owner/repo`` from the origin URL (SSH or HTTPS), else ``local/<directory>``."""
+    m = re.search(r"[:/]([^/:]+)/([^/]+?)(?:\.git)?/?$", remote_url.strip())
+    return f"{m.group(1)}/{m.group(2)}" if m else f"local/{os.path.basename(os.path.abspath(checkout))}"
+
+async def commit_targets(checkout: str, spec: str, squash: bool, name: str) -> Tuple[List[Target], str]:
+    """Targets for a commit range, and the commit whose ``.aicodereview.yml`` applies."""
+    if squash:
+        three = "..." in spec
+        base, _, head = spec.partition("..." if three else "..")
+        if not head:
+            raise SystemExit("--squash needs a BASE..HEAD range")
+        head = (await git(checkout, "rev-parse", "--verify", f"{head}^{{commit}}")).strip()
+        base = (await git(checkout, "merge-base", base, head) if three
+                else await git(checkout, "rev-parse", "--verify", f"{base}^{{commit}}")).strip()
+        return [Target(f"{name}@{base[:12]}..{head[:12]}", f"range-{base[:12]}-{head[:12]}", base=base, head=head)], head
+    # A single revision means just that commit, not its whole history
+    shas = (await git(checkout, "rev-list", "--reverse", "--no-merges", spec if ".." in spec else f"{spec}^!")).split()
+    tip = (spec.rsplit("..", 1)[-1].lstrip(".") or "HEAD") if ".." in spec else spec
+    return [Target(f"{name}@{sha}", f"commit-{sha[:12]}", head=sha) for sha in shas], tip
+
+async def review_local(checkout: str, name: str, target: Target, rules: Dict[str, Any]) -> ReviewResult:
+    if target.base:
+        text = await git(checkout, "diff", "--no-color", "--no-ext-diff", "-M", target.base, target.head)
+    else:
+        text = await git(checkout, "show", "--format=", "--no-color", "--no-ext-diff", "-M", target.head)
+    files = parse_git_diff(text)
+    skipped = FilterReport()
+    changed, truncated = await collect_files(_aiter(files), rules, skipped)
+    owner, repo = name.split("/", 1)
+    result = await review_changed_files(owner, repo, 0, changed, rules, skipped=skipped)
+    if truncated:
+        result.summary = truncation_note(rules, len(changed), len(files)) + result.summary
+    result.head_sha = target.head
+    return result
+
+# --- GitHub --------------------------------------------------------------------------
+
+async def pr_targets(owner: str, repo: str, installation: Optional[int], wanted: Set[int]) -> List[Target]:
+    installation = installation or await gh.get_repo_installation(owner, repo)
+    token = await gh._installation_token(installation)
+    targets = []
+    for pr in await gh.list_pull_requests(owner, repo, token):
+        if wanted and pr["number"] not in wanted:
+            continue
+        sha = pr["head"]["sha"]
+        payload = {
+            "action": "opened",  # a full review, whatever the bot said before
+            "installation": {"id": installation},
+            "repository": {"name": repo, "full_name": f"{owner}/{repo}", "owner": {"login": owner}},
+            "pull_request": {"number": pr["number"], "head": {"sha": sha}, "changed_files": pr.get("changed_files")},
+        }
+        targets.append(Target(f"{owner}/{repo}#{pr['number']}@{sha}", f"pr-{pr['number']}", payload=payload))
+    return targets
+
+# --- runner --------------------------------------------------------------------------
+
+def write_report(out: str, fmt: str, target: Target, result: ReviewResult) -> str:
+    os.makedirs(out, exist_ok=True)
+    path = os.path.join(out, f"{target.name}.{'json' if fmt == 'json' else 'md'}")
+    with open(path, "w") as f:
+        if fmt == "json":
+            json.dump({"target": target.id, **result.model_dump()}, f, indent=2)
+        else:
+            f.write(render_markdown(result, settings.bot_comment_tag) + "\n")
+    return path
+
+async def run(args) -> bool:
+    rules: Dict[str, Any] = DEFAULT_RULES
+    if args.git:
+        remote = ""
+        try:
+            remote = await git(args.git, "remote", "get-url", "origin")
+        except RuntimeError:
+            pass
+        name = args.name or repo_name(remote, args.git)
+        try:
+            targets, tip = await commit_targets(args.git, args.range, args.squash, name)
+        except RuntimeError as e:
+            raise SystemExit(str(e))
+        if args.rules:
+            with open(args.rules) as f:
+                rules = parse_repo_rules(f.read())
+        else:
+            try:
+                rules = parse_repo_rules(await git(args.git, "show", f"{tip}:.aicodereview.yml"))
+            except RuntimeError:
+                pass  # no config in the repo: defaults
+    else:
+        owner, _, repo = args.repo.partition("/")
+        targets = await pr_targets(owner, repo, args.installation, parse_numbers(args.prs or ""))
+
+    checkpoint = Checkpoint(args.checkpoint or os.path.join(args.out, "checkpoint.jsonl"), FINISHED[args.dry_run])
+    todo = [t for t in targets if t.id not in checkpoint.done]
+    print(f"{len(targets)} target(s), {len(targets) - len(todo)} already done per {checkpoint.path}")
+    sem = asyncio.Semaphore(args.concurrency)
+    failed = 0
+
+    async def review(target: Target) -> Tuple[str, Optional[ReviewResult]]:
+        if target.payload is None:
+            # Model calls of a local backfill share the fair scheduler as one tenant
+            with metrics.trace(repo=target.id.split("@")[0], installation="backfill"):
+                return "dry-run", await review_local(args.git, target.id.split("@")[0], target, rules)
+        while True:
+            try:
+                res = await review_pull_request(target.payload, post=not args.dry_run)
+                return ("dry-run", res["result"]) if args.dry_run else ("posted", None)
+            except RetryLater as e:
+                # Out of GitHub quota for now: wait for the reset rather than fail the target
+                print(f"  {target.name}: {e}; waiting {max(0.0, e.retry_at - time.time()):.0f}s")
+                await asyncio.sleep(max(0.0, e.retry_at - time.time()))
+
+    async def one(target: Target) -> None:
+        nonlocal failed
+        async with sem:
+            started, info = time.perf_counter(), {}
+            try:
+                status, result = await review(target)
+            except JobCancelled:
+                status, result = "superseded", None
+            except Exception as e:
+                status, result, info = "error", None, {"error": f"{type(e).__name__}: {e}"}
+                failed += 1
+            if result is not None:
+                info = {"files": len(result.files), "findings": sum(len(fr.findings) for fr in result.files),
+                        "report": write_report(args.out, args.format, target, result)}
+            info["seconds"] = round(time.perf_counter() - started, 2)
+            checkpoint.record(target.id, status, **info)
+            detail = info.get("error") or (f"{info['findings']} finding(s)" if "findings" in info else "")
+            print(f"{'❌' if status == 'error' else '✓'} {target.name:<24} {status:<10} {detail}  {info['seconds']}s")
+
+    try:
+        await asyncio.gather(*(one(t) for t in todo))
+    finally:
+        await llm.close_client()
+        await gh.close_client()
+    print(f"{len(todo) - failed} of {len(todo)} target(s) finished"
+          + (f"; {failed} failed and will be retried on the next run" if failed else ""))
+    return not failed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--repo", help="owner/name: review its open pull requests")
+    source.add_argument("--git", metavar="PATH", help="local checkout to review commits of (with --range)")
+    parser.add_argument("--prs", help="only these PR numbers, e.g. 12,40-45")
+    parser.add_argument("--installation", type=int, help="app installation id (looked up when omitted)")
+    parser.add_argument("--range", help="commits of --git: A..B, A...B or a single commit")
+    parser.add_argument("--squash", action="store_true", help="review --range as one diff instead of per commit")
+    parser.add_argument("--name", help="owner/repo for a local checkout (default: from its origin remote)")
+    parser.add_argument("--rules", help=".aicodereview.yml for a local checkout (default: the one at the range's tip)")
+    parser.add_argument("--dry-run", action="store_true", help="write reports to --out instead of posting")
+    parser.add_argument("--out", default="backfill-out", help="directory for reports and the default checkpoint")
+    parser.add_argument("--format", choices=("json", "markdown"), default="json")
+    parser.add_argument("--checkpoint", help="checkpoint file (default: OUT/checkpoint.jsonl)")
+    parser.add_argument("--concurrency", type=int, default=4, help="targets reviewed at once")
+    args = parser.parse_args()
+    if args.git:
+        if not args.range:
+            parser.error("--git needs --range")
+        args.dry_run = True  # there is nothing to post a local diff to
+    ok = asyncio.run(run(args))
+    raise SystemExit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+PR corpus for the benchmark: synthetic PRs of a given size, or recorded ones.
+
+A recorded PR is a JSON file holding the webhook payload and the PR's file list exactly
+as GitHub returned it from ``GET /repos/{owner}/{repo}/pulls/{n}/files``:
+
+    {"payload": {...pull_request webhook...}, "files": [{"filename": ..., "patch": ...}, ...]}
+"""
+
+import glob
+import json
+import os
+import random
+from typing import Any, Dict, List, NamedTuple
+
+OWNER, REPO, INSTALLATION = "bench", "corpus", 4242
+
+class PR(NamedTuple):
+    name: str
+    payload: Dict[str, Any]
+    files: List[Dict[str, Any]]
+
+    @property
+    def diff_bytes(self) -> int:
+        return sum(len((f.get("patch") or "").encode()) for f in self.files)
+
+# name -> (files, bytes of diff)
+SCENARIOS = {
+    "tiny": (1, 1024),
+    "small": (10, 20 * 1024),
+    "medium": (100, 512 * 1024),
+    "large": (1000, 5 * 1024 * 1024),
+    "huge": (3000, 50 * 1024 * 1024),
+}
+
+EXTENSIONS = ["py", "js", "ts", "go", "java", "rb"]
+
+def webhook_payload(number: int, sha: str, action: str = "opened", changed_files: int = 0) -> Dict[str, Any]:
+    return {
+        "action": action,
+        "installation": {"id": INSTALLATION},
+        "repository": {"name": REPO, "full_name": f"{OWNER}/{REPO}", "owner": {"login": OWNER}},
+        "pull_request": {"number": number, "head": {"sha": sha}, "changed_files": changed_files},
+    }
+
+def _patch(rng: random.Random, target_bytes: int, seed: int) -> str:
+    """A unified diff of roughly ``target_bytes``: hunks of context, removals and additions."""
+    lines, size, line_no = [], 0, 1
+    while size < target_bytes:
+        body = [f" def handler_{seed}_{line_no}(request):"]
+        for i in range(rng.randint(1, 6)):
+            body.append(f"-    value_{i} = request.args.get('k{i}')")
+        for i in range(rng.randint(2, 12)):
+            body.append(f"+    value_{i} = sanitize(request.args.get('k{i}', {rng.randint(0, 10**6)}))")
+        body.append("     return value_0")
+        old_len = sum(1 for l in body if l[0] in " -")
+        new_len = sum(1 for l in body if l[0] in " +")
+        hunk = f"@@ -{line_no},{old_len} +{line_no},{new_len} @@\n" + "\n".join(body)
+        lines.append(hunk)
+        size += len(hunk) + 1
+        line_no += old_len + 20
+    return "\n".join(lines)
+
+def synthetic(number: int, files: int, diff_bytes: int, seed: int = 0) -> PR:
+    """A PR with ``files`` modified files sharing ``diff_bytes`` of diff. ``number`` varies the
+    content, so PRs of the same scenario do not hit the review cache."""
+    rng = random.Random(f"{seed}:{number}")
+    per_file = max(64, diff_bytes // max(1, files))
+    changed = []
+    for i in range(files):
+        patch = _patch(rng, per_file, number * 100000 + i)
+        changed.append({
+            "sha": f"{rng.getrandbits(160):040x}",
+            "filename": f"src/pkg_{i % 50}/module_{i}.{EXTENSIONS[i % len(EXTENSIONS)]}",
+            "status": "modified",
+            "additions": patch.count("\n+"), "deletions": patch.count("\n-"),
+            "changes": patch.count("\n+") + patch.count("\n-"),
+            "patch": patch,
+        })
+    sha = f"{rng.getrandbits(160):040x}"
+    return PR(f"synthetic-{files}f", webhook_payload(number, sha, changed_files=files), changed)
+
+def recorded(path: str, number: int) -> PR:
+    """Load a recording, renumbered to PR ``number`` and moved to the fake's repo so one
+    fake GitHub serves every recording."""
+    with open(path) as f:
+        data = json.load(f)
+    payload = json.loads(json.dumps(data["payload"]))
+    payload.update(action="opened", installation={"id": INSTALLATION},
+                   repository=webhook_payload(0, "")["repository"])
+    payload["pull_request"]["number"] = number
+    return PR(os.path.splitext(os.path.basename(path))[0], payload, data["files"])
+
+def recordings(directory: str) -> List[str]:
+    return sorted(glob.glob(os.path.join(directory, "*.json")))
@@ -0,0 +1,219 @@
+"""
+Local stand-ins for the GitHub REST API and the OpenAI chat completions endpoint.
+
+Both add a fixed ``latency`` to every request and enforce a per-minute request limit
+(``rpm``, 0 = unlimited) the way the real services do: GitHub answers 403 with
+``X-RateLimit-Remaining: 0``, OpenAI answers 429 with ``Retry-After``. Counters are
+served from ``GET /_bench/stats`` and cleared with ``POST /_bench/reset``.
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import re
+import time
+from collections import deque
+from typing import Any, Dict, List
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+
+import corpus
+
+class Window:
+    """Sliding one-minute request window."""
+
+    def __init__(self, rpm: int):
+        self.rpm, self.hits = rpm, deque()
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        while self.hits and now - self.hits[0] > 60:
+            self.hits.popleft()
+        if self.rpm and len(self.hits) >= self.rpm:
+            return False
+        self.hits.append(now)
+        return True
+
+    def remaining(self) -> int:
+        return max(0, self.rpm - len(self.hits)) if self.rpm else 5000
+
+    def reset_in(self) -> float:
+        return 60 - (time.monotonic() - self.hits[0]) if self.hits else 0.0
+
+def fake_github_app(latency: float = 0.0, rpm: int = 0) -> FastAPI:
+    app = FastAPI()
+    window = Window(rpm)
+    prs: Dict[int, List[Dict[str, Any]]] = {}
+    heads: Dict[int, str] = {}
+    comments: Dict[int, List[Dict[str, Any]]] = {}
+    stats = {"requests": 0, "rate_limited": 0, "not_modified": 0, "comments_posted": 0,
+             "comments_created": 0, "token_mints": 0}
+
+    @app.middleware("http")
+    async def limits(request: Request, call_next):
+        if request.url.path.startswith("/_bench"):
+            return await call_next(request)
+        stats["requests"] += 1
+        if latency:
+            await asyncio.sleep(latency)
+        if not window.allow():
+            stats["rate_limited"] += 1
+            return JSONResponse({"message": "API rate limit exceeded"}, status_code=403, headers={
+                "X-RateLimit-Remaining": "0", "X-RateLimit-Reset": str(int(time.time() + window.reset_in()) + 1)})
+        response = await call_next(request)
+        response.headers["X-RateLimit-Remaining"] = str(window.remaining())
+        response.headers["X-RateLimit-Limit"] = str(rpm or 5000)
+        response.headers["X-RateLimit-Reset"] = str(int(time.time() + (window.reset_in() if rpm else 3600)) + 1)
+        response.headers["X-RateLimit-Resource"] = "core"
+        return response
+
+    def conditional(request: Request, data: Any, headers: Dict[str, str] = None) -> Response:
+        body = json.dumps(data).encode()
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if request.headers.get("if-none-match") == etag:
+            stats["not_modified"] += 1
+            return Response(status_code=304, headers={"ETag": etag})
+        return Response(body, media_type="application/json", headers={"ETag": etag, **(headers or {})})
+
+    @app.post("/_bench/prs")
+    async def register(spec: Dict[str, Any]):
+        """Build a PR from ``{"number", "synthetic": {"files", "bytes", "seed"}}`` or
+        ``{"number", "recorded": path}`` here, so large diffs never cross the wire."""
+        n = spec["number"]
+        if "recorded" in spec:
+            with open(spec["recorded"]) as f:
+                prs[n] = json.load(f)["files"]
+        else:
+            s = spec["synthetic"]
+            prs[n] = corpus.synthetic(n, s["files"], s["bytes"], s.get("seed", 0)).files
+        comments[n] = []
+        heads[n] = spec.get("head") or hashlib.sha1(f"bench:{n}".encode()).hexdigest()
+        return {"number": n, "files": len(prs[n])}
+
+    @app.get("/_bench/stats")
+    async def get_stats():
+        return stats
+
+    @app.post("/_bench/reset")
+    async def reset():
+        for k in stats:
+            stats[k] = 0
+        return stats
+
+    @app.get("/_bench/comments/{number}")
+    async def get_comments(number: int):
+        return comments.get(number, [])
+
+    @app.post("/app/installations/{installation_id}/access_tokens")
+    async def access_token(installation_id: int):
+        stats["token_mints"] += 1
+        expires = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() + 3600))
+        return JSONResponse({"token": f"ghs_bench_{installation_id}", "expires_at": expires}, status_code=201)
+
+    @app.get("/repos/{owner}/{repo}/installation")
+    async def installation(owner: str, repo: str):
+        return {"id": corpus.INSTALLATION}
+
+    @app.get("/repos/{owner}/{repo}/pulls")
+    async def list_pulls(request: Request, owner: str, repo: str, state: str = "open"):
+        return conditional(request, [{"number": n, "title": f"Bench PR {n}", "draft": False, "head": {"sha": heads[n]},
+                                      "base": {"ref": "main"}} for n in sorted(prs)])
+
+    @app.get("/repos/{owner}/{repo}/contents/{path:path}")
+    async def contents(owner: str, repo: str, path: str):
+        return JSONResponse({"message": "Not Found"}, status_code=404)
+
+    @app.get("/repos/{owner}/{repo}/pulls/{number}/files")
+    async def pull_files(request: Request, owner: str, repo: str, number: int, page: int = 1, per_page: int = 30):
+        files = prs.get(number, [])[:3000]
+        last = max(1, math.ceil(len(files) / per_page))
+        links = [f'<{request.url.include_query_params(page=p)}>; rel="{rel}"'
+                 for p, rel in ((page + 1, "next"), (last, "last")) if page < last]
+        return conditional(request, files[(page - 1) * per_page:page * per_page],
+                           {"Link": ", ".join(links)} if links else None)
+
+    @app.get("/repos/{owner}/{repo}/issues/{number}/comments")
+    async def list_comments(request: Request, owner: str, repo: str, number: int):
+        return conditional(request, comments.get(number, []))
+
+    @app.post("/repos/{owner}/{repo}/issues/{number}/comments")
+    async def create_comment(owner: str, repo: str, number: int, body: Dict[str, Any]):
+        stats["comments_posted"] += 1
+        stats["comments_created"] += 1
+        comment = {"id": number * 1000 + len(comments.setdefault(number, [])), "body": body["body"]}
+        comments[number].append(comment)
+        return JSONResponse(comment, status_code=201)
+
+    @app.patch("/repos/{owner}/{repo}/issues/comments/{comment_id}")
+    async def update_comment(owner: str, repo: str, comment_id: int, body: Dict[str, Any]):
+        stats["comments_posted"] += 1
+        for c in comments.get(comment_id // 1000, []):
+            if c["id"] == comment_id:
+                c["body"] = body["body"]
+                return c
+        return JSONResponse({"message": "Not Found"}, status_code=404)
+
+    return app
+
+DIFF_HEADER = re.compile(r"^diff --git a/(.+) b/\1$", re.M)
+
+def fake_openai_app(latency: float = 0.0, rpm: int = 0, findings_per_file: int = 1) -> FastAPI:
+    app = FastAPI()
+    window = Window(rpm)
+    stats = {"requests": 0, "rate_limited": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+    # Leading messages already seen, standing in for the provider's prompt-prefix cache
+    prefixes = set()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        if latency:
+            await asyncio.sleep(latency)
+        if not window.allow():
+            stats["rate_limited"] += 1
+            return JSONResponse({"error": {"message": "Rate limit reached", "type": "requests"}}, status_code=429,
+                                headers={"Retry-After": f"{window.reset_in():.1f}"})
+        prompt = "".join(m["content"] for m in body["messages"])
+        # Answer with findings for the files named in the prompt, so parsing has real work
+        paths = DIFF_HEADER.findall(prompt)
+        files = [{"file": p, "findings": [{"severity": "minor", "title": f"Check input handling {i}",
+                                           "details": "Values from request.args are not validated.",
+                                           "suggestion": "Validate before use.", "line": 2}
+                                          for i in range(findings_per_file)]} for p in paths]
+        content = json.dumps({"summary": f"Reviewed {len(paths)} file(s).", "files": files})
+        usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        leading = body["messages"][0]["content"]
+        if leading in prefixes:
+            usage["prompt_tokens_details"] = {"cached_tokens": len(leading) // 4}
+            stats["cached_tokens"] += len(leading) // 4
+        prefixes.add(leading)
+        stats["prompt_tokens"] += usage["prompt_tokens"]
+        stats["completion_tokens"] += usage["completion_tokens"]
+        return {
+            "id": "chatcmpl-bench", "object": "chat.completion", "created": int(time.time()),
+            "model": body["model"],
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": usage,
+        }
+
+    @app.get("/_bench/stats")
+    async def get_stats():
+        return stats
+
+    @app.post("/_bench/reset")
+    async def reset():
+        for k in stats:
+            stats[k] = 0
+        return stats
+
+    return app
+
+def run_fake(kind: str, port: int, latency: float, rpm: int):
+    import uvicorn
+    app = fake_github_app(latency, rpm) if kind == "github" else fake_openai_app(latency, rpm)
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
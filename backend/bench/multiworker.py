@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Multi-worker test: several uvicorn worker processes sharing one state backend must
+behave like a single bot.
+
+Starts the fake GitHub and OpenAI servers, runs ``uvicorn main:app --workers N`` against
+them with SQLite state, job and cache files in a temp directory (or --state-url, e.g. a
+Redis URL), then fires webhooks at it: --pushes pushes per PR in quick succession, each
+delivered --duplicates times as GitHub retries would. The run fails unless
+
+  - one installation token was minted for all workers
+  - each PR got exactly one bot comment (later pushes edit it)
+  - that comment covers the PR's last push
+  - every delivery's job ended done or cancelled (superseded)
+
+    python bench/multiworker.py --workers 4 --prs 10 --pushes 3 --duplicates 2
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import multiprocessing
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+BACKEND = os.path.dirname(BENCH)
+sys.path[:0] = [BACKEND, BENCH]
+
+import corpus
+from fakes import run_fake
+from load_test import free_port, wait_for_port
+from run import TUNABLE_DEFAULTS, WEBHOOK_SECRET, bench_env
+
+def commented_sha(body: str) -> str:
+    """The head SHA recorded in the state marker of a bot comment."""
+    m = re.search(r"<!-- [^ ]+:state ([A-Za-z0-9+/=]+) -->", body)
+    return json.loads(zlib.decompress(base64.b64decode(m.group(1))))["head_sha"] if m else ""
+
+async def deliver(client, payload: dict, delivery: str):
+    raw = json.dumps(payload).encode()
+    sig = "sha256=" + hmac.new(WEBHOOK_SECRET.encode(), raw, hashlib.sha256).hexdigest()
+    # A fresh connection per delivery so the kernel spreads them over the workers
+    r = await client.post("/webhook", content=raw, headers={
+        "X-GitHub-Event": "pull_request", "X-GitHub-Delivery": delivery, "Connection": "close",
+        "X-Hub-Signature-256": sig, "Content-Type": "application/json"})
+    r.raise_for_status()
+
+async def run(args, env: dict) -> bool:
+    import httpx
+
+    fakes = [
+        multiprocessing.Process(target=run_fake, args=("github", args.github_port, args.github_latency, 0), daemon=True),
+        multiprocessing.Process(target=run_fake, args=("openai", args.openai_port, args.llm_latency, 0), daemon=True),
+    ]
+    for p in fakes:
+        p.start()
+    await wait_for_port(args.github_port)
+    await wait_for_port(args.openai_port)
+    bot = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+                            "--port", str(args.bot_port), "--workers", str(args.workers), "--log-level", "warning"],
+                           cwd=BACKEND, env=env)
+    ok = True
+    try:
+        await wait_for_port(args.bot_port)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.bot_port}", timeout=60) as client, \
+                httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.github_port}", timeout=60) as github:
+            # Give every worker time to finish booting before the burst
+            for _ in range(args.workers * 4):
+                (await client.get("/health", headers={"Connection": "close"})).raise_for_status()
+            numbers = list(range(1, args.prs + 1))
+            for n in numbers:
+                spec = {"number": n, "synthetic": {"files": args.files, "bytes": args.files * 2048, "seed": 0}}
+                (await github.post("/_bench/prs", json=spec)).raise_for_status()
+
+            shas = {n: [hashlib.sha1(f"{n}:{i}".encode()).hexdigest() for i in range(args.pushes)] for n in numbers}
+            deliveries = []
+            started = time.perf_counter()
+            for i in range(args.pushes):
+                batch = []
+                for n in numbers:
+                    payload = corpus.webhook_payload(n, shas[n][i], "opened" if i == 0 else "synchronize", args.files)
+                    delivery = f"mw-{n}-{i}"
+                    deliveries.append(delivery)
+                    batch += [deliver(client, payload, delivery) for _ in range(args.duplicates)]
+                await asyncio.gather(*batch)
+                await asyncio.sleep(args.push_interval)
+
+            deadline = time.monotonic() + args.timeout
+            pending = set(deliveries)
+            while pending and time.monotonic() < deadline:
+                for delivery in list(pending):
+                    r = await client.get(f"/jobs/{delivery}", headers={"Connection": "close"})
+                    if r.status_code == 200 and r.json()["status"] in {"done", "cancelled", "dead"}:
+                        pending.discard(delivery)
+                await asyncio.sleep(0.2)
+            elapsed = time.perf_counter() - started
+
+            statuses = {}
+            for delivery in deliveries:
+                status = (await client.get(f"/jobs/{delivery}")).json().get("status", "missing")
+                statuses[status] = statuses.get(status, 0) + 1
+            stats = (await github.get("/_bench/stats")).json()
+            print(f"{len(deliveries) * args.duplicates} deliveries for {args.prs} PR(s) on {args.workers} workers "
+                  f"settled in {elapsed:.1f}s: {statuses}")
+            print(f"token mints {stats['token_mints']}  comments created {stats['comments_created']}  "
+                  f"comment writes {stats['comments_posted']}")
+
+            def fail(message):
+                nonlocal ok
+                ok = False
+                print(f"❌ {message}")
+
+            if pending:
+                fail(f"{len(pending)} job(s) still unfinished after {args.timeout:.0f}s")
+            if set(statuses) - {"done", "cancelled"}:
+                fail(f"unexpected job states: {statuses}")
+            if stats["token_mints"] != 1:
+                fail(f"{stats['token_mints']} installation tokens minted, expected 1")
+            for n in numbers:
+                comments = (await github.get(f"/_bench/comments/{n}")).json()
+                if len(comments) != 1:
+                    fail(f"PR #{n} has {len(comments)} bot comments, expected 1")
+                elif commented_sha(comments[0]["body"]) != shas[n][-1]:
+                    fail(f"PR #{n}'s comment does not cover its last push {shas[n][-1][:7]}")
+    finally:
+        bot.terminate()
+        bot.wait(timeout=30)
+        for p in fakes:
+            p.terminate()
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--prs", type=int, default=10)
+    parser.add_argument("--files", type=int, default=3, help="files per PR")
+    parser.add_argument("--pushes", type=int, default=3, help="pushes per PR")
+    parser.add_argument("--push-interval", type=float, default=0.2, help="seconds between pushes")
+    parser.add_argument("--duplicates", type=int, default=2, help="deliveries of each webhook")
+    parser.add_argument("--debounce", type=float, default=0.5)
+    parser.add_argument("--github-latency", type=float, default=0.02)
+    parser.add_argument("--llm-latency", type=float, default=1.0)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--state-url", help="shared state backend (default: SQLite in a temp dir)")
+    parser.add_argument("--github-port", type=int, default=free_port())
+    parser.add_argument("--openai-port", type=int, default=free_port())
+    parser.add_argument("--bot-port", type=int, default=free_port())
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {**TUNABLE_DEFAULTS, **os.environ, **bench_env(args.github_port, args.openai_port),
+               "STATE_URL": args.state_url or f"sqlite:///{tmp}/state.db",
+               "JOB_STORE_URL": f"sqlite:///{tmp}/jobs.db", "REVIEW_CACHE_URL": f"sqlite:///{tmp}/review_cache.db",
+               "KNOWLEDGE_URL": f"sqlite:///{tmp}/knowledge.db",
+               "REVIEW_DEBOUNCE_SECONDS": str(args.debounce)}
+        ok = asyncio.run(run(args, env))
+    print("✅ workers shared state correctly" if ok else "❌ multi-worker run misbehaved")
+    raise SystemExit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Prompt token report: input tokens per model call in the old prompt format (rules and
+patches dumped as YAML) against the current one (cacheable rules prefix, raw diff).
+
+PRs go through the same hunk selection and chunk planning as a real review, then each
+planned call is built both ways and counted with tiktoken when it is installed (~4
+characters per token otherwise; the header says which). Per call it prints old and new
+prompt tokens, the saving, and the shared prefix a provider can serve from its cache.
+
+    python bench/prompt_report.py --scenarios tiny,small,medium
+    python bench/prompt_report.py --corpus recordings/ --rules ../.aicodereview.yml.example --json
+"""
+
+import argparse
+import json
+import os
+import sys
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.dirname(BENCH), BENCH]
+# Nothing here reviews anything; keep the stores the imports create off disk
+os.environ.setdefault("REVIEW_CACHE_URL", "memory://")
+os.environ.setdefault("STATE_URL", "memory://")
+os.environ.setdefault("KNOWLEDGE_URL", "memory://")
+
+import corpus
+import planner
+import prompt
+from config import settings
+from diffparse import select_hunks
+from reviewer import DEFAULT_RULES, parse_repo_rules, shorten_patch
+
+def calls(rules: dict, files: list) -> list:
+    payload = [{"path": f["filename"],
+                "patch": select_hunks(f.get("patch") or "", settings.max_patch_tokens, rules.get("focus") or [])
+                or shorten_patch(f.get("patch") or "", settings.max_patch_chars)}
+               for f in files if f.get("status") not in {"removed", "renamed"}]
+    return planner.plan_chunks(payload, settings.review_chunk_tokens)
+
+def report(name: str, rules: dict, files: list) -> dict:
+    rows = []
+    for chunk in calls(rules, files):
+        built = prompt.build(rules, chunk)
+        legacy = prompt.legacy_tokens(rules, chunk)
+        rows.append({"files": len(chunk), "legacy_tokens": legacy, "tokens": built.tokens,
+                     "saved": legacy - built.tokens, "prefix_tokens": built.prefix_tokens})
+    legacy, new = sum(r["legacy_tokens"] for r in rows), sum(r["tokens"] for r in rows)
+    return {"name": name, "calls": rows, "legacy_tokens": legacy, "tokens": new, "saved": legacy - new,
+            "saved_ratio": round((legacy - new) / legacy, 4) if legacy else 0.0}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default="tiny,small,medium",
+                        help=f"comma-separated, from: {', '.join(corpus.SCENARIOS)} (empty for none)")
+    parser.add_argument("--corpus", help="directory of recorded PRs (*.json, see bench/corpus.py)")
+    parser.add_argument("--rules", help=".aicodereview.yml to apply (default: built-in rules)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    rules = dict(DEFAULT_RULES)
+    if args.rules:
+        with open(args.rules) as f:
+            rules = parse_repo_rules(f.read())
+    prs = [corpus.synthetic(1, *corpus.SCENARIOS[name], seed=args.seed)._replace(name=name)
+           for name in filter(None, args.scenarios.split(","))]
+    if args.corpus:
+        prs += [corpus.recorded(path, 1) for path in corpus.recordings(args.corpus)]
+    reports = [report(pr.name, rules, pr.files) for pr in prs]
+
+    if args.json:
+        print(json.dumps({"tokenizer": "tiktoken" if planner._encoder() else "estimate", "prs": reports}, indent=2))
+        return
+    print(f"tokens counted with {'tiktoken o200k_base' if planner._encoder() else 'the ~4 chars/token estimate'}")
+    for r in reports:
+        print(f"▶ {r['name']}: {len(r['calls'])} call(s)  {r['legacy_tokens']} -> {r['tokens']} tokens  "
+              f"saved {r['saved']} ({r['saved_ratio']:.1%})")
+        for i, c in enumerate(r["calls"], 1):
+            print(f"  call {i:>3}: {c['files']:>3} file(s)  {c['legacy_tokens']:>7} -> {c['tokens']:>7}  "
+                  f"saved {c['saved']:>6}  cacheable prefix {c['prefix_tokens']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark: replay PR webhooks against local fakes of GitHub and OpenAI.
+
+The fakes run in child processes; the bot runs in this process behind uvicorn, exactly
+as deployed, with in-memory job, cache and state stores. Each scenario registers
+--reviews PRs with the fake GitHub, posts their signed webhooks --concurrency at a time,
+and waits for each job to finish. Reported per scenario:
+
+  webhook ack p50/p99      time for POST /webhook to answer
+  review p50/p99           webhook sent -> job done (comment posted)
+  reviews/s, peak RSS      throughput and the bot process's max resident set
+  GitHub calls / review    requests the fake GitHub served, per review
+  LLM tokens / review      prompt + completion tokens the fake OpenAI billed, per review
+
+    python bench/run.py --scenarios tiny,small,medium --reviews 20 --out bench.json
+    python bench/run.py --corpus recordings/ --baseline bench.json
+
+With --baseline, metrics that got worse by more than --tolerance (default 10%) are
+listed and the exit status is 1. The bot's own OpenAI limiter is off by default
+(OPENAI_RPM=0, OPENAI_TPM=0) so that --llm-rpm on the fake decides, and so is the spacing
+of GitHub writes (GITHUB_WRITE_INTERVAL_SECONDS=0). Finding reuse across PRs is off too
+(KNOWLEDGE_URL empty): synthetic PRs share templated code and would be answered from it;
+export KNOWLEDGE_URL=memory:// to measure it. Export other bot settings (REVIEW_CONCURRENCY,
+JOB_WORKERS, ...) to benchmark them.
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [BACKEND, os.path.dirname(os.path.abspath(__file__))]
+
+import corpus
+from fakes import run_fake
+from load_test import free_port, percentile, serve, wait_for_port
+
+WEBHOOK_SECRET = "bench-secret"
+# Lower is better for all of these; reviews_per_second is compared inverted
+COMPARED = ["ack_p50_ms", "ack_p99_ms", "review_p50_ms", "review_p99_ms", "peak_rss_mb",
+            "github_calls_per_review", "llm_tokens_per_review", "reviews_per_second"]
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return peak / (1024 * 1024) if platform.system() == "Darwin" else peak / 1024
+
+def bench_env(github_port: int, openai_port: int) -> dict:
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    # The fake GitHub does not check the app JWT, but the bot needs a real key to sign one
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048).private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+    return {
+        "GITHUB_API_URL": f"http://127.0.0.1:{github_port}",
+        "GITHUB_APP_ID": "1", "GITHUB_WEBHOOK_SECRET": WEBHOOK_SECRET,
+        "GITHUB_PRIVATE_KEY_BASE64": base64.b64encode(key).decode(),
+        "OPENAI_API_KEY": "bench", "OPENAI_BASE_URL": f"http://127.0.0.1:{openai_port}/v1",
+        "JOB_STORE_URL": "memory://", "REVIEW_CACHE_URL": "memory://", "STATE_URL": "memory://",
+        "REVIEW_DEBOUNCE_SECONDS": "0", "LOG_LEVEL": "WARNING",
+    }
+
+# Bot tunables the benchmark defaults differently; values already in the environment win
+TUNABLE_DEFAULTS = {"OPENAI_RPM": "0", "OPENAI_TPM": "0", "GITHUB_WRITE_INTERVAL_SECONDS": "0", "KNOWLEDGE_URL": ""}
+
+def scenario_specs(args) -> list:
+    """``(name, shape, [(register spec, payload), ...])`` per scenario; PR numbers are unique
+    across the run so reviews never share a coalescing key or a cached comment."""
+    number, specs = 1, []
+    for name in filter(None, args.scenarios.split(",")):
+        files, size = corpus.SCENARIOS[name]
+        prs = []
+        for _ in range(args.reviews):
+            pr = corpus.webhook_payload(number, hashlib.sha1(f"{args.seed}:{number}".encode()).hexdigest(),
+                                        changed_files=files)
+            prs.append(({"number": number, "synthetic": {"files": files, "bytes": size, "seed": args.seed}}, pr))
+            number += 1
+        specs.append((name, {"files": files, "diff_bytes": size}, prs))
+    if args.corpus:
+        for path in corpus.recordings(args.corpus):
+            prs = []
+            for _ in range(args.reviews):
+                pr = corpus.recorded(path, number)
+                prs.append(({"number": number, "recorded": os.path.abspath(path)}, pr.payload))
+                number += 1
+            specs.append((pr.name, {"files": len(pr.files), "diff_bytes": pr.diff_bytes}, prs))
+    return specs
+
+async def run_scenario(client, github, openai, prs, concurrency: int, queue) -> dict:
+    for spec, _ in prs:
+        (await github.post("/_bench/prs", json=spec, timeout=600)).raise_for_status()
+    await github.post("/_bench/reset")
+    await openai.post("/_bench/reset")
+
+    sem = asyncio.Semaphore(concurrency)
+    acks, totals, failed = [], [], 0
+
+    async def one(payload):
+        nonlocal failed
+        async with sem:
+            raw = json.dumps(payload).encode()
+            sig = "sha256=" + hmac.new(WEBHOOK_SECRET.encode(), raw, hashlib.sha256).hexdigest()
+            delivery = f"bench-{payload['pull_request']['number']}"
+            started = time.perf_counter()
+            r = await client.post("/webhook", content=raw, headers={
+                "X-GitHub-Event": "pull_request", "X-GitHub-Delivery": delivery,
+                "X-Hub-Signature-256": sig, "Content-Type": "application/json"})
+            acks.append((time.perf_counter() - started) * 1000)
+            r.raise_for_status()
+            # Poll the queue directly; going through /jobs would add HTTP noise to the number
+            while True:
+                job = await queue.get(delivery)
+                if job and job.status in {"done", "dead", "cancelled"}:
+                    break
+                await asyncio.sleep(0.005)
+            totals.append((time.perf_counter() - started) * 1000)
+            if job.status != "done":
+                failed += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(payload) for _, payload in prs))
+    elapsed = time.perf_counter() - started
+
+    gh_stats = (await github.get("/_bench/stats")).json()
+    ai_stats = (await openai.get("/_bench/stats")).json()
+    n = len(prs)
+    return {
+        "reviews": n, "failed": failed, "seconds": round(elapsed, 3),
+        "reviews_per_second": round(n / elapsed, 3),
+        "ack_p50_ms": round(percentile(acks, 0.5), 2), "ack_p99_ms": round(percentile(acks, 0.99), 2),
+        "review_p50_ms": round(percentile(totals, 0.5), 2), "review_p99_ms": round(percentile(totals, 0.99), 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "github_calls_per_review": round(gh_stats["requests"] / n, 2),
+        "github_not_modified": gh_stats["not_modified"], "github_rate_limited": gh_stats["rate_limited"],
+        "llm_calls_per_review": round(ai_stats["requests"] / n, 2),
+        "llm_tokens_per_review": round((ai_stats["prompt_tokens"] + ai_stats["completion_tokens"]) / n, 1),
+        "llm_cached_tokens_per_review": round(ai_stats["cached_tokens"] / n, 1),
+        "llm_rate_limited": ai_stats["rate_limited"],
+    }
+
+async def run(args) -> dict:
+    import httpx
+    import main
+
+    children = [
+        multiprocessing.Process(target=run_fake, args=("github", args.github_port, args.github_latency, args.github_rpm), daemon=True),
+        multiprocessing.Process(target=run_fake, args=("openai", args.openai_port, args.llm_latency, args.llm_rpm), daemon=True),
+    ]
+    for p in children:
+        p.start()
+    await wait_for_port(args.github_port)
+    await wait_for_port(args.openai_port)
+    bot_server, bot_task = await serve(main.app, args.bot_port)
+
+    results = {"meta": {"python": platform.python_version(), "reviews": args.reviews, "concurrency": args.concurrency,
+                        "github_latency": args.github_latency, "llm_latency": args.llm_latency,
+                        "github_rpm": args.github_rpm, "llm_rpm": args.llm_rpm, "started": time.time()},
+               "scenarios": {}}
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.bot_port}", timeout=600) as client, \
+                httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.github_port}") as github, \
+                httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.openai_port}") as openai:
+            for name, shape, prs in scenario_specs(args):
+                print(f"▶ {name}: {len(prs)} review(s) of {shape['files']} file(s), {shape['diff_bytes'] / 1024:.0f} KB diff")
+                res = {**shape, **await run_scenario(client, github, openai, prs, args.concurrency, main.queue)}
+                results["scenarios"][name] = res
+                print(f"  review p50 {res['review_p50_ms']:.0f} ms  p99 {res['review_p99_ms']:.0f} ms  "
+                      f"{res['reviews_per_second']:.2f} reviews/s  rss {res['peak_rss_mb']:.0f} MB  "
+                      f"gh {res['github_calls_per_review']}/review  tokens {res['llm_tokens_per_review']:.0f}/review")
+    finally:
+        bot_server.should_exit = True
+        await bot_task
+        for p in children:
+            p.terminate()
+    return results
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    for k in ("reviews", "concurrency", "github_latency", "llm_latency", "github_rpm", "llm_rpm"):
+        if baseline.get("meta", {}).get(k) != results["meta"][k]:
+            print(f"⚠️  baseline was run with {k}={baseline.get('meta', {}).get(k)}, this run uses {results['meta'][k]}")
+    regressions = []
+    for name, res in results["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        for metric in COMPARED:
+            old, new = base.get(metric), res.get(metric)
+            if not old or new is None:
+                continue
+            change = (old - new) / old if metric == "reviews_per_second" else (new - old) / old
+            flag = "❌" if change > tolerance else "  "
+            verdict = f"{change:+.1%} worse" if change > 0 else f"{-change:.1%} better" if change < 0 else "unchanged"
+            print(f"{flag} {name:>12} {metric:<24} {old:>10} -> {new:<10} ({verdict})")
+            if change > tolerance:
+                regressions.append((name, metric, old, new))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default="tiny,small,medium",
+                        help=f"comma-separated, from: {', '.join(corpus.SCENARIOS)} (empty for none)")
+    parser.add_argument("--corpus", help="directory of recorded PRs (*.json, see bench/corpus.py)")
+    parser.add_argument("--reviews", type=int, default=10, help="reviews per scenario")
+    parser.add_argument("--concurrency", type=int, default=10, help="webhooks in flight at once")
+    parser.add_argument("--github-latency", type=float, default=0.02)
+    parser.add_argument("--github-rpm", type=int, default=0)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--llm-rpm", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write results as JSON")
+    parser.add_argument("--baseline", help="JSON from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    parser.add_argument("--github-port", type=int, default=free_port())
+    parser.add_argument("--openai-port", type=int, default=free_port())
+    parser.add_argument("--bot-port", type=int, default=free_port())
+    args = parser.parse_args()
+
+    # Settings are read at import time, so the environment must be in place before main is imported
+    os.environ.update(bench_env(args.github_port, args.openai_port))
+    for k, v in TUNABLE_DEFAULTS.items():
+        os.environ.setdefault(k, v)
+    results = asyncio.run(run(args))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"results written to {args.out}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"❌ {len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}")
+            raise SystemExit(1)
+        print("✅ no regressions against baseline")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark: import time and cold-start memory of the bot's entry points.
+
+Every probe runs --repeat times, each in a fresh interpreter, and reports the median time
+spent in the probe, the median wall time of the whole process (interpreter start
+included), the largest peak RSS and which heavy dependencies ended up imported:
+
+  vercel_import   load api/index.py
+  vercel_ignored  load it, then answer GET /health, a signed ping and an ignored PR action
+  server_import   import backend/main.py (FastAPI app, job queue, stores)
+  review_stack    import what the first review needs (pipeline, OpenAI SDK, httpx, jwt, yaml)
+
+vercel_ignored must not import any of them; the run fails if it does.
+
+    python bench/startup.py --out startup.json
+    python bench/startup.py --baseline startup.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+BACKEND = os.path.dirname(BENCH)
+INDEX = os.path.join(os.path.dirname(BACKEND), "api", "index.py")
+sys.path[:0] = [BACKEND, BENCH]
+
+from run import WEBHOOK_SECRET
+
+HEAVY = ("openai", "httpx", "jwt", "yaml", "fastapi", "starlette", "pydantic", "cryptography")
+# Lower is better for all of these
+COMPARED = ["probe_ms", "process_ms", "peak_rss_mb"]
+
+_LOAD_INDEX = f"""
+import importlib.util
+spec = importlib.util.spec_from_file_location("vercel_index", {INDEX!r})
+index = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(index)
+"""
+
+_IGNORED = _LOAD_INDEX + f"""
+import asyncio, hashlib, hmac
+
+async def call(method, path, body=b"", headers=()):
+    sent = []
+    async def receive():
+        return {{"type": "http.request", "body": body, "more_body": False}}
+    async def send(message):
+        sent.append(message)
+    await index.app({{"type": "http", "method": method, "path": path, "headers": list(headers)}}, receive, send)
+    return sent[0]["status"]
+
+def signed(event, payload):
+    raw = json.dumps(payload).encode()
+    sig = "sha256=" + hmac.new({WEBHOOK_SECRET!r}.encode(), raw, hashlib.sha256).hexdigest()
+    return raw, [(b"x-github-event", event.encode()), (b"x-hub-signature-256", sig.encode())]
+
+async def main():
+    statuses = [await call("GET", "/health")]
+    statuses.append(await call("POST", "/webhook", *signed("ping", {{"zen": "Keep it logically awesome."}})))
+    statuses.append(await call("POST", "/webhook", *signed("pull_request", {{"action": "closed"}})))
+    assert statuses == [200, 200, 200], statuses
+
+asyncio.run(main())
+"""
+
+PROBES = {
+    "vercel_import": _LOAD_INDEX,
+    "vercel_ignored": _IGNORED,
+    "server_import": "import main",
+    "review_stack": "import pipeline, openai, httpx, jwt, yaml",
+}
+
+_CHILD = """
+import json, platform, resource, sys, time
+sys.path[:0] = [{backend!r}]
+started = time.perf_counter()
+{body}
+elapsed = time.perf_counter() - started
+
+def peak_rss_mb():
+    # A child's ru_maxrss starts from its parent's on Linux; VmHWM is reset by exec
+    try:
+        with open("/proc/self/status") as f:
+            return next(int(l.split()[1]) for l in f if l.startswith("VmHWM:")) / 1024
+    except (OSError, StopIteration):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        return peak / (1024 * 1024) if platform.system() == "Darwin" else peak / 1024
+
+print(json.dumps({{"probe_ms": elapsed * 1000, "rss_mb": peak_rss_mb(),
+                  "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+def child_env() -> dict:
+    # Keep every store in memory and give the webhook a secret and an app to verify against
+    return {**os.environ, "JOB_STORE_URL": "memory://", "REVIEW_CACHE_URL": "memory://", "STATE_URL": "memory://",
+            "KNOWLEDGE_URL": "memory://", "GITHUB_WEBHOOK_SECRET": WEBHOOK_SECRET, "GITHUB_APP_ID": "1",
+            "LOG_LEVEL": "WARNING", "PYTHONDONTWRITEBYTECODE": "1"}
+
+def probe(name: str, repeat: int) -> dict:
+    code = _CHILD.format(backend=BACKEND, body=PROBES[name], heavy=HEAVY)
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND, env=child_env(),
+                             capture_output=True, text=True)
+        wall = (time.perf_counter() - started) * 1000
+        if out.returncode != 0:
+            raise SystemExit(f"probe {name} failed:\n{out.stderr}")
+        runs.append({**json.loads(out.stdout.strip().splitlines()[-1]), "process_ms": wall})
+    return {"probe_ms": round(statistics.median(r["probe_ms"] for r in runs), 1),
+            "process_ms": round(statistics.median(r["process_ms"] for r in runs), 1),
+            "peak_rss_mb": round(max(r["rss_mb"] for r in runs), 1),
+            "heavy_imports": runs[-1]["loaded"]}
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for name, res in results["probes"].items():
+        base = baseline.get("probes", {}).get(name)
+        if not base:
+            continue
+        for metric in COMPARED:
+            old, new = base.get(metric), res.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            flag = "❌" if change > tolerance else "  "
+            verdict = f"{change:+.1%} worse" if change > 0 else f"{-change:.1%} better" if change < 0 else "unchanged"
+            print(f"{flag} {name:>14} {metric:<12} {old:>8} -> {new:<8} ({verdict})")
+            if change > tolerance:
+                regressions.append((name, metric, old, new))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--probes", default=",".join(PROBES), help=f"comma-separated, from: {', '.join(PROBES)}")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh processes per probe")
+    parser.add_argument("--out", help="write the results as JSON")
+    parser.add_argument("--baseline", help="JSON from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.20)
+    args = parser.parse_args()
+
+    results = {"meta": {"python": platform.python_version(), "repeat": args.repeat}, "probes": {}}
+    for name in filter(None, args.probes.split(",")):
+        res = results["probes"][name] = probe(name, args.repeat)
+        print(f"▶ {name:<14} {res['probe_ms']:>7.1f} ms in probe  {res['process_ms']:>7.1f} ms process  "
+              f"rss {res['peak_rss_mb']:>5.1f} MB  heavy: {', '.join(res['heavy_imports']) or '-'}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"results written to {args.out}")
+
+    ok = True
+    leaked = results["probes"].get("vercel_ignored", {}).get("heavy_imports")
+    if leaked:
+        ok = False
+        print(f"❌ answering ignored deliveries imported {', '.join(leaked)}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            ok = False
+            print(f"❌ {len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}")
+        else:
+            print("✅ no regressions against baseline")
+    raise SystemExit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
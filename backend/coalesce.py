@@ -0,0 +1,143 @@
+import asyncio
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+from jobs import JobCancelled
+from state import Lock, MemoryState, StateBackend
+
+PRKey = Tuple[str, str, int]
+
+def pr_key(payload: Dict[str, Any]) -> PRKey:
+    return (payload["repository"]["owner"]["login"], payload["repository"]["name"],
+            payload["pull_request"]["number"])
+
+class Head(NamedTuple):
+    """A PR's head commit as one delivery saw it. ``updated_at`` is the PR's own timestamp from
+    the payload: deliveries can arrive out of order, and it tells which push came last."""
+    sha: str
+    updated_at: str = ""
+
+    def encode(self) -> str:
+        return f"{self.updated_at} {self.sha}" if self.updated_at else self.sha
+
+    @classmethod
+    def decode(cls, value: str) -> "Head":
+        updated_at, _, sha = value.rpartition(" ")
+        return cls(sha, updated_at)
+
+    def older_than(self, other: "Head") -> bool:
+        """True only when the timestamps say so; two pushes within the same second (or payloads
+        without ``updated_at``) fall back to arrival order."""
+        return bool(self.updated_at and other.updated_at and self.updated_at < other.updated_at)
+
+def pr_head(payload: Dict[str, Any]) -> Head:
+    pr = payload["pull_request"]
+    return Head(pr["head"]["sha"], pr.get("updated_at") or "")
+
+class Superseded(JobCancelled):
+    pass
+
+class ReviewCoalescer:
+    """Tracks the newest head SHA per PR so that only the latest state gets reviewed.
+
+    The webhook calls ``observe`` for every event. A review waits out the debounce window
+    with ``settle`` and then calls ``check`` before each expensive step; once a newer head
+    has been observed for the PR those calls raise ``Superseded``. A review registered with
+    ``track`` is also cancelled outright when a newer head is observed, aborting any model
+    call it has in flight. Which head is newer is decided by the PR's ``updated_at`` (see
+    ``Head``), so a late redelivery of an older push neither replaces nor cancels anything.
+
+    The newest SHA and the per-PR review lock live in ``state``; with a shared backend every
+    worker process sees the same PR state, so a push that lands on one worker cancels the
+    review running on another and two workers never review the same PR at once.
+    """
+
+    def __init__(self, debounce: float = 3.0, state: Optional[StateBackend] = None,
+                 lease: float = 30.0, poll: float = 1.0, head_ttl: float = 7 * 86400):
+        self.debounce = debounce
+        self.state = state or MemoryState()
+        self.lease = lease  # per-PR lock TTL; a live review keeps extending it
+        self.poll = poll  # how often a running review looks for newer pushes made elsewhere
+        self.head_ttl = head_ttl
+        self._locks: Dict[Tuple[PRKey, str], Lock] = {}
+        self._tasks: Dict[PRKey, Tuple[Head, asyncio.Task]] = {}
+        self._watchers: Dict[PRKey, asyncio.Task] = {}
+
+    def _name(self, key: PRKey) -> str:
+        return f"pr:{key[0]}/{key[1]}#{key[2]}"
+
+    async def observe(self, key: PRKey, head: Head) -> bool:
+        """Record ``head`` as the PR's newest unless a newer one is already recorded; returns
+        whether it was. Compare-and-swap on the shared value, so concurrent deliveries on
+        different workers cannot overwrite a newer head with an older one."""
+        name = self._name(key) + ":head"
+        while True:
+            current = await self.state.aget(name)
+            if current is None:
+                if await self.state.aset_if_absent(name, head.encode(), ttl=self.head_ttl):
+                    break
+                continue
+            latest = Head.decode(current)
+            if latest.sha == head.sha:
+                return True
+            if head.older_than(latest):
+                return False
+            if await self.state.adelete_if_equals(name, current) and \
+                    await self.state.aset_if_absent(name, head.encode(), ttl=self.head_ttl):
+                break
+        tracked = self._tasks.get(key)
+        if tracked and tracked[0].sha != head.sha:
+            tracked[1].cancel()
+        return True
+
+    async def _supersedes(self, key: PRKey, head: Head) -> Optional[Head]:
+        """The recorded head when it is newer than ``head``, else None."""
+        name = self._name(key) + ":head"
+        current = await self.state.aget(name)
+        if current is None:
+            # Head expired or never observed (e.g. a job replayed after a restart)
+            await self.state.aset_if_absent(name, head.encode(), ttl=self.head_ttl)
+            current = await self.state.aget(name) or head.encode()
+        latest = Head.decode(current)
+        return latest if latest.sha != head.sha and not latest.older_than(head) else None
+
+    async def check(self, key: PRKey, head: Head) -> None:
+        latest = await self._supersedes(key, head)
+        if latest:
+            raise Superseded(f"superseded by {latest.sha[:7]}")
+
+    async def settle(self, key: PRKey, head: Head) -> None:
+        """Wait for a burst of pushes to settle, then claim the PR for this head."""
+        await self.check(key, head)
+        if self.debounce > 0:
+            await asyncio.sleep(self.debounce)
+        await self.check(key, head)
+        lock = Lock(self.state, self._name(key) + ":lock", ttl=self.lease, value=head.sha)
+        while not await lock.try_acquire():
+            if await lock.holder() == head.sha:
+                # Another delivery for the same head (e.g. reopened) is already being reviewed
+                raise Superseded(f"review of {head.sha[:7]} already in progress")
+            # An older head is still being reviewed; its worker cancels it once it sees our push
+            await asyncio.sleep(min(self.poll, 0.2))
+            await self.check(key, head)
+        self._locks[(key, head.sha)] = lock
+
+    def track(self, key: PRKey, head: Head, task: asyncio.Task) -> None:
+        self._tasks[key] = (head, task)
+        self._watchers[key] = asyncio.ensure_future(self._watch(key, head, task))
+
+    async def _watch(self, key: PRKey, head: Head, task: asyncio.Task) -> None:
+        while not task.done():
+            await asyncio.sleep(self.poll)
+            lock = self._locks.get((key, head.sha))
+            if lock:
+                await lock.extend()
+            if self.state.shared and await self._supersedes(key, head):
+                task.cancel()
+                return
+
+    async def release(self, key: PRKey, head: Head) -> None:
+        lock = self._locks.pop((key, head.sha), None)
+        if key in self._tasks and self._tasks[key][0].sha == head.sha:
+            del self._tasks[key]
+            self._watchers.pop(key).cancel()
+        if lock:
+            await lock.release()
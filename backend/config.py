@@ -10,8 +10,50 @@ class Settings(BaseModel):
     github_app_id: str = os.getenv("GITHUB_APP_ID", "")
     github_webhook_secret: str = os.getenv("GITHUB_WEBHOOK_SECRET", "")
     github_private_key_b64: str = os.getenv("GITHUB_PRIVATE_KEY_BASE64", "")
+    github_api_url: str = os.getenv("GITHUB_API_URL", "https://api.github.com")
+    github_cache_max_entries: int = int(os.getenv("GITHUB_CACHE_MAX_ENTRIES", "2000"))
+    github_cache_max_bytes: int = int(os.getenv("GITHUB_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+    github_max_retries: int = int(os.getenv("GITHUB_MAX_RETRIES", "3"))
+    github_retry_backoff_seconds: float = float(os.getenv("GITHUB_RETRY_BACKOFF_SECONDS", "1"))
+    github_max_wait_seconds: float = float(os.getenv("GITHUB_MAX_WAIT_SECONDS", "60"))
+    github_rate_reserve: int = int(os.getenv("GITHUB_RATE_RESERVE", "100"))
+    github_write_interval_seconds: float = float(os.getenv("GITHUB_WRITE_INTERVAL_SECONDS", "1"))
     bot_comment_tag: str = os.getenv("BOT_COMMENT_TAG", "ai-review-bot")
     max_patch_chars: int = int(os.getenv("MAX_PATCH_CHARS", "12000"))
+    max_patch_tokens: int = int(os.getenv("MAX_PATCH_TOKENS", "3000"))
+    state_url: str = os.getenv("STATE_URL", "sqlite:///state.db")
+    web_workers: int = int(os.getenv("WEB_CONCURRENCY", "1"))
+    job_lease_seconds: float = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+    job_store_url: str = os.getenv("JOB_STORE_URL", "sqlite:///jobs.db")
+    job_workers: int = int(os.getenv("JOB_WORKERS", "4"))
+    job_max_attempts: int = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+    job_backoff_seconds: float = float(os.getenv("JOB_BACKOFF_SECONDS", "2"))
+    job_retention_seconds: float = float(os.getenv("JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+    review_cache_url: str = os.getenv("REVIEW_CACHE_URL", "sqlite:///review_cache.db")
+    review_cache_max_entries: int = int(os.getenv("REVIEW_CACHE_MAX_ENTRIES", "5000"))
+    review_cache_ttl_seconds: float = float(os.getenv("REVIEW_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+    knowledge_url: str = os.getenv("KNOWLEDGE_URL", "sqlite:///knowledge.db")
+    knowledge_max_entries: int = int(os.getenv("KNOWLEDGE_MAX_ENTRIES", "50000"))
+    knowledge_max_per_repo: int = int(os.getenv("KNOWLEDGE_MAX_PER_REPO", "5000"))
+    knowledge_min_tokens: int = int(os.getenv("KNOWLEDGE_MIN_TOKENS", "24"))
+    knowledge_max_distance: int = int(os.getenv("KNOWLEDGE_MAX_DISTANCE", "0"))
+    review_chunk_tokens: int = int(os.getenv("REVIEW_CHUNK_TOKENS", "12000"))
+    review_concurrency: int = int(os.getenv("REVIEW_CONCURRENCY", "4"))
+    llm_concurrency: int = int(os.getenv("LLM_CONCURRENCY", "16"))
+    installation_weights: str = os.getenv("INSTALLATION_WEIGHTS", "")
+    openai_model: str = os.getenv("OPENAI_MODEL", "gpt-4o")
+    openai_cheap_model: str = os.getenv("OPENAI_CHEAP_MODEL", "gpt-4o-mini")
+    openai_base_url: str = os.getenv("OPENAI_BASE_URL", "")
+    openai_timeout_seconds: float = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "120"))
+    openai_connect_timeout_seconds: float = float(os.getenv("OPENAI_CONNECT_TIMEOUT_SECONDS", "5"))
+    openai_max_retries: int = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+    openai_stream: bool = os.getenv("OPENAI_STREAM", "false").lower() in {"1", "true", "yes"}
+    openai_rpm: int = int(os.getenv("OPENAI_RPM", "500"))
+    openai_tpm: int = int(os.getenv("OPENAI_TPM", "30000"))
+    review_debounce_seconds: float = float(os.getenv("REVIEW_DEBOUNCE_SECONDS", "3"))
+    log_level: str = os.getenv("LOG_LEVEL", "INFO")
+    metrics_max_repos: int = int(os.getenv("METRICS_MAX_REPOS", "500"))
+    prompt_savings_sample: float = float(os.getenv("PROMPT_SAVINGS_SAMPLE", "0.01"))
 
     @property
     def github_private_key_pem(self) -> bytes:
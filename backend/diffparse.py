@@ -0,0 +1,170 @@
+import re
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Sequence, Set
+from planner import estimate_tokens
+
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@ ?(.*)$")
+
+# Words that make a hunk more interesting under a given `focus` rule
+FOCUS_KEYWORDS = {
+    "security": ("password", "secret", "token", "auth", "eval", "exec", "sql", "query", "crypto", "hash",
+                 "random", "pickle", "subprocess", "shell", "cookie", "session", "permission", "sanitize"),
+    "performance": ("for ", "while ", "loop", "cache", "sleep", "query", "join", "sort", "async", "await",
+                    "thread", "lock", "alloc", "copy", "regex"),
+    "correctness": ("if ", "else", "return", "raise", "throw", "except", "catch", "null", "none", "==", "!=",
+                    "<=", ">=", "len(", "index", "[0]", "[-1]"),
+    "readability": ("todo", "fixme", "hack"),
+}
+
+class DiffLine(NamedTuple):
+    kind: str  # "+", "-", " " or "\\" (no newline at end of file)
+    text: str
+    old_no: Optional[int]
+    new_no: Optional[int]
+
+class Hunk(NamedTuple):
+    old_start: int
+    new_start: int
+    section: str
+    lines: List[DiffLine]
+
+    @property
+    def changed(self) -> int:
+        return sum(1 for l in self.lines if l.kind in "+-")
+
+    @property
+    def added(self) -> int:
+        return sum(1 for l in self.lines if l.kind == "+")
+
+    def render(self) -> str:
+        old_len = sum(1 for l in self.lines if l.kind in " -")
+        new_len = sum(1 for l in self.lines if l.kind in " +")
+        header = f"@@ -{self.old_start},{old_len} +{self.new_start},{new_len} @@"
+        if self.section:
+            header += f" {self.section}"
+        return "\n".join([header] + [l.kind + l.text for l in self.lines])
+
+def _iter_lines(patch: str) -> Iterator[str]:
+    start = 0
+    while start < len(patch):
+        end = patch.find("\n", start)
+        if end == -1:
+            end = len(patch)
+        yield patch[start:end].rstrip("\r")
+        start = end + 1
+
+def iter_hunks(patch: str) -> Iterator[Hunk]:
+    """Stream the hunks of a unified diff (a GitHub ``patch`` field or ``git diff`` output),
+    numbering every line with its old/new line number. File headers are skipped."""
+    hunk: Optional[Hunk] = None
+    old_no = new_no = 0
+    for raw in _iter_lines(patch):
+        m = _HUNK_HEADER.match(raw)
+        if m:
+            if hunk:
+                yield hunk
+            old_no, new_no = int(m.group(1)), int(m.group(3))
+            hunk = Hunk(old_no, new_no, m.group(5).strip(), [])
+            continue
+        if hunk is None:
+            continue
+        kind, text = (raw[:1] or " "), raw[1:]
+        if kind == "+":
+            hunk.lines.append(DiffLine("+", text, None, new_no))
+            new_no += 1
+        elif kind == "-":
+            hunk.lines.append(DiffLine("-", text, old_no, None))
+            old_no += 1
+        elif kind == " ":
+            hunk.lines.append(DiffLine(" ", text, old_no, new_no))
+            old_no += 1
+            new_no += 1
+        elif kind == "\\":
+            hunk.lines.append(DiffLine("\\", text, None, None))
+        else:
+            # Next file's "diff --git" header in multi-file git output
+            yield hunk
+            hunk = None
+    if hunk:
+        yield hunk
+
+def commentable_lines(patch: str, added_only: bool = False) -> Set[int]:
+    """New-file line numbers that appear in the diff, i.e. where GitHub accepts an inline
+    review comment on the RIGHT side."""
+    kinds = "+" if added_only else "+ "
+    return {l.new_no for h in iter_hunks(patch) for l in h.lines if l.kind in kinds}
+
+def compress_context(hunk: Hunk, keep: int = 2) -> List[Hunk]:
+    """Drop context lines more than ``keep`` lines away from a change, splitting the hunk
+    where a gap opens so that every piece keeps exact line numbers in its header."""
+    changed_at = [i for i, l in enumerate(hunk.lines) if l.kind in "+-"]
+    if not changed_at:
+        return []
+    wanted = set()
+    for i in changed_at:
+        wanted.update(range(max(0, i - keep), min(len(hunk.lines), i + keep + 1)))
+    pieces: List[List[int]] = []
+    current: List[int] = []
+    for i in range(len(hunk.lines)):
+        if i in wanted:
+            current.append(i)
+        elif current:
+            pieces.append(current)
+            current = []
+    if current:
+        pieces.append(current)
+    return [Hunk(_start(hunk.lines, idx[0], 2), _start(hunk.lines, idx[0], 3), hunk.section,
+                 [hunk.lines[i] for i in idx]) for idx in pieces]
+
+def _start(lines: Sequence[DiffLine], i: int, field: int) -> int:
+    """Old (field 2) or new (field 3) line number a piece starting at ``lines[i]`` begins at.
+    A piece opening with an added/removed line takes it from the next line that has one."""
+    for l in lines[i:]:
+        if l[field] is not None:
+            return l[field]
+    prev = [l[field] for l in lines[:i] if l[field] is not None]
+    return prev[-1] + 1 if prev else 0
+
+def score_hunk(hunk: Hunk, focus: Iterable[str]) -> float:
+    """Rank by how much of the hunk is new code, boosted by keywords of the repo's focus areas."""
+    if not hunk.lines:
+        return 0.0
+    score = hunk.added + 0.5 * (hunk.changed - hunk.added)
+    score *= 1 + hunk.added / len(hunk.lines)
+    text = "\n".join(l.text.lower() for l in hunk.lines if l.kind == "+")
+    for area in focus or ():
+        score += 2 * sum(text.count(k) for k in FOCUS_KEYWORDS.get(str(area).lower(), ()))
+    return score
+
+def select_hunks(patch: str, token_budget: int, focus: Iterable[str] = ()) -> Optional[str]:
+    """Fit a patch into ``token_budget`` tokens, keeping whole hunks.
+
+    Context is compressed first; if the patch is still too large, the highest-scoring hunks
+    are kept (in file order) and the omission is noted. Returns None if ``patch`` has no hunks.
+    """
+    hunks = [piece for h in iter_hunks(patch) for piece in compress_context(h)]
+    if not hunks:
+        return None
+    rendered = [h.render() for h in hunks]
+    costs = [estimate_tokens(r) + 1 for r in rendered]
+    if sum(costs) <= token_budget:
+        return "\n".join(rendered)
+
+    ranked = sorted(range(len(hunks)), key=lambda i: score_hunk(hunks[i], focus), reverse=True)
+    chosen, used = set(), 0
+    for i in ranked:
+        if used + costs[i] <= token_budget:
+            chosen.add(i)
+            used += costs[i]
+    if not chosen:
+        # Even the best hunk is over budget on its own: keep its head, cut at a line boundary
+        best = ranked[0]
+        lines, used = [], 0
+        for line in rendered[best].split("\n"):
+            used += estimate_tokens(line) + 1
+            if used > token_budget:
+                break
+            lines.append(line)
+        return "\n".join(lines) + "\n... [hunk truncated] ..."
+    out = [rendered[i] for i in sorted(chosen)]
+    out.append(f"... [{len(hunks) - len(chosen)} lower-priority hunk(s) omitted] ...")
+    return "\n".join(out)
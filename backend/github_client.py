@@ -1,86 +1,469 @@
-import time, jwt, httpx, hashlib, hmac
-from typing import Dict, Any, Optional, List
+import asyncio, json, random, time
+from collections import OrderedDict
+from datetime import datetime
+from typing import AsyncIterator, Dict, Any, Optional, List, Tuple
 from config import settings
+from lazy import lazy_import
+import metrics
+from jobs import RetryLater
+from state import Lock, shared
+from webhooks import verify_signature
+
+httpx = lazy_import("httpx")
+jwt = lazy_import("jwt")
 
 GITHUB_API = "https://api.github.com"
 
-def verify_signature(secret: str, raw_body: bytes, signature_header: str) -> bool:
-    if not signature_header or not signature_header.startswith("sha256="):
+# Refresh tokens this long before GitHub says they expire
+TOKEN_REFRESH_MARGIN = 5 * 60
+JWT_LIFETIME = 9 * 60
+# GitHub lists at most 3,000 files for a pull request
+MAX_PR_FILES = 3000
+PER_PAGE = 100
+
+_client: Optional["httpx.AsyncClient"] = None
+_jwt: Tuple[str, float] = ("", 0.0)
+_tokens: Dict[int, Tuple[str, float]] = {}
+_token_locks: Dict[int, asyncio.Lock] = {}
+_latency: Dict[str, Dict[str, float]] = {}
+
+# Methods safe to resend after a 5xx or a dropped connection; a POST may have gone through
+_IDEMPOTENT = {"GET", "HEAD", "PUT", "PATCH", "DELETE"}
+_RETRY_STATUS = {500, 502, 503, 504}
+
+class RateLimited(RetryLater):
+    """GitHub's rate limit for an installation will not allow a request before ``retry_at``."""
+
+class RateBudget:
+    """One installation's GitHub rate limits, as its responses' headers report them.
+
+    Primary limit: ``X-RateLimit-Remaining`` / ``-Reset`` per resource. Once fewer than
+    ``GITHUB_RATE_RESERVE`` requests are left, requests are spread evenly over the time to
+    the reset rather than spent at once and then refused. Secondary limits: a 403/429 with
+    ``Retry-After`` (or GitHub's one-minute default) blocks the whole installation until
+    then, and writes are spaced ``GITHUB_WRITE_INTERVAL_SECONDS`` apart as GitHub asks.
+    """
+
+    def __init__(self, writes_spaced: bool = True):
+        self.writes_spaced = writes_spaced  # content writes; minting tokens with the app JWT is not one
+        self.limits: Dict[str, Tuple[int, int, float]] = {}  # resource -> (remaining, limit, reset epoch)
+        self.blocked_until = 0.0
+        self.next_write = 0.0
+        self.throttled = 0
+
+    def delay(self, method: str, now: float) -> float:
+        """Seconds to hold a request back; a write also books its slot."""
+        wait = max(0.0, self.blocked_until - now)
+        remaining, limit, reset = self.limits.get("core", (1 << 30, 0, 0.0))
+        if reset > now and remaining <= min(settings.github_rate_reserve, limit // 10):
+            wait = max(wait, reset - now if remaining <= 0 else (reset - now) / remaining)
+        if method not in ("GET", "HEAD") and self.writes_spaced:
+            start = max(now + wait, self.next_write)
+            self.next_write = start + settings.github_write_interval_seconds
+            wait = start - now
+        return wait
+
+    def spend(self) -> None:
+        remaining, limit, reset = self.limits.get("core", (1 << 30, 0, 0.0))
+        if limit:
+            # Count the request now so concurrent callers pace against what is really left
+            self.limits["core"] = (remaining - 1, limit, reset)
+
+    def observe(self, r: "httpx.Response", now: float) -> Optional[float]:
+        """Record the response's limit headers; for a rate-limited response return how long
+        to wait before trying again."""
+        h = r.headers
+        resource = h.get("x-ratelimit-resource", "core")
+        if "x-ratelimit-remaining" in h:
+            self.limits[resource] = (int(h["x-ratelimit-remaining"]), int(h.get("x-ratelimit-limit", 0)),
+                                     float(h.get("x-ratelimit-reset", 0)))
+        if r.status_code not in (403, 429):
+            return None
+        if "retry-after" in h:
+            wait = float(h["retry-after"])
+        elif h.get("x-ratelimit-remaining") == "0":
+            wait = max(0.0, float(h.get("x-ratelimit-reset", now)) - now)
+        elif r.status_code == 429 or b"secondary rate limit" in r.content.lower():
+            wait = 60.0
+        else:
+            return None  # a plain permission error
+        self.throttled += 1
+        self.blocked_until = max(self.blocked_until, now + wait)
+        return wait
+
+    def stats(self) -> Dict[str, Any]:
+        return {"limits": {res: {"remaining": rem, "limit": lim, "reset": reset}
+                           for res, (rem, lim, reset) in self.limits.items()},
+                "blocked_until": self.blocked_until, "throttled": self.throttled}
+
+_budgets: Dict[str, RateBudget] = {}
+
+class ConditionalCache:
+    """LRU store of GET responses keyed by URL, revalidated with ETag / Last-Modified.
+
+    GitHub does not count ``304 Not Modified`` answers against the rate limit, so serving
+    the stored body on 304 makes repeat reads of unchanged resources free. Bounded by both
+    entry count and total body bytes.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._data: "OrderedDict[str, Tuple[Dict[str, str], bytes]]" = OrderedDict()
+        self.counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def validators(self, key: str) -> Dict[str, str]:
+        item = self._data.get(key)
+        if not item:
+            return {}
+        headers = {}
+        if "etag" in item[0]:
+            headers["If-None-Match"] = item[0]["etag"]
+        if "last-modified" in item[0]:
+            headers["If-Modified-Since"] = item[0]["last-modified"]
+        return headers
+
+    def hit(self, key: str) -> Optional[Tuple[Dict[str, str], bytes]]:
+        """The stored response, or None if it was evicted since its validators were sent."""
+        item = self._data.get(key)
+        if item is None:
+            return None
+        self._data.move_to_end(key)
+        self.counters["hits"] += 1
+        return item
+
+    def store(self, key: str, r: "httpx.Response") -> None:
+        self.counters["misses"] += 1
+        validators = {k: r.headers[k] for k in ("etag", "last-modified") if k in r.headers}
+        self.discard(key)
+        if r.status_code != 200 or not validators or len(r.content) > self.max_bytes:
+            return
+        headers = {**validators, "content-type": r.headers.get("content-type", ""), "link": r.headers.get("link", "")}
+        self._data[key] = (headers, r.content)
+        self.bytes += len(r.content)
+        self.counters["stores"] += 1
+        while len(self._data) > self.max_entries or self.bytes > self.max_bytes:
+            _, (_, body) = self._data.popitem(last=False)
+            self.bytes -= len(body)
+            self.counters["evictions"] += 1
+
+    def discard(self, key: str) -> None:
+        item = self._data.pop(key, None)
+        if item:
+            self.bytes -= len(item[1])
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.counters["hits"] + self.counters["misses"]
+        return {**self.counters, "entries": len(self._data), "bytes": self.bytes,
+                "hit_ratio": self.counters["hits"] / lookups if lookups else 0.0}
+
+response_cache = ConditionalCache(settings.github_cache_max_entries, settings.github_cache_max_bytes)
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
         return False
-    digest = hmac.new(secret.encode(), raw_body, hashlib.sha256).hexdigest()
-    return hmac.compare_digest(f"sha256={digest}", signature_header)
+
+def get_client() -> "httpx.AsyncClient":
+    """Return the app-lifetime GitHub client (keep-alive pool, HTTP/2 when ``h2`` is installed)."""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            base_url=settings.github_api_url or GITHUB_API,
+            http2=_http2_available(),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60),
+            timeout=httpx.Timeout(30, connect=5),
+        )
+    return _client
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+def latency_stats() -> Dict[str, Dict[str, float]]:
+    """Per-endpoint request count and latency (seconds) since startup."""
+    return {
+        name: {"count": s["count"], "avg": s["total"] / s["count"], "max": s["max"]}
+        for name, s in _latency.items()
+    }
+
+async def _request(endpoint: str, method: str, url: str, **kwargs) -> "httpx.Response":
+    """Send a request on the shared client, timing it under ``endpoint``.
+
+    Paced by the installation's ``RateBudget``. Rate-limited answers are retried after the
+    wait GitHub asks for, and 5xx answers and dropped connections (idempotent methods only)
+    with jittered exponential backoff, up to ``GITHUB_MAX_RETRIES`` times. Raises
+    ``RateLimited`` when the limit will not lift within ``GITHUB_MAX_WAIT_SECONDS``.
+    """
+    installation = str(metrics.current("installation", "app"))
+    budget = _budgets.get(installation) or _budgets.setdefault(installation, RateBudget(installation != "app"))
+    for attempt in range(settings.github_max_retries + 1):
+        now = time.time()
+        wait = budget.delay(method, now)
+        if wait > settings.github_max_wait_seconds:
+            raise RateLimited(f"GitHub rate limit for installation {installation}", now + wait)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        budget.spend()
+        last = attempt == settings.github_max_retries
+        try:
+            r = await _send(endpoint, method, url, **kwargs)
+        except httpx.TransportError:
+            if last or method not in _IDEMPOTENT:
+                raise
+            await asyncio.sleep(_backoff(attempt))
+            continue
+        now = time.time()
+        limited = budget.observe(r, now)
+        if limited is not None:
+            if last or limited > settings.github_max_wait_seconds:
+                raise RateLimited(f"GitHub rate limit for installation {installation} ({r.status_code})", now + limited)
+            # Jitter so that every request blocked by the same limit does not return at once
+            await asyncio.sleep(limited + random.uniform(0, settings.github_retry_backoff_seconds))
+        elif r.status_code in _RETRY_STATUS and method in _IDEMPOTENT and not last:
+            await asyncio.sleep(_backoff(attempt))
+        else:
+            return r
+    return r
+
+def _backoff(attempt: int) -> float:
+    # Full jitter: anywhere up to the exponential step
+    return random.uniform(0, settings.github_retry_backoff_seconds * 2 ** attempt)
+
+async def _send(endpoint: str, method: str, url: str, **kwargs) -> "httpx.Response":
+    started, status = time.perf_counter(), "error"
+    try:
+        r = await get_client().request(method, url, **kwargs)
+        status = str(r.status_code)
+        remaining = r.headers.get("x-ratelimit-remaining")
+        if remaining is not None:
+            metrics.GITHUB_RATE_REMAINING.set(int(remaining), installation=metrics.current("installation", "app"),
+                                              resource=r.headers.get("x-ratelimit-resource", "core"))
+        return r
+    finally:
+        elapsed = time.perf_counter() - started
+        s = _latency.setdefault(endpoint, {"count": 0, "total": 0.0, "max": 0.0})
+        s["count"] += 1
+        s["total"] += elapsed
+        s["max"] = max(s["max"], elapsed)
+        metrics.GITHUB_REQUEST_SECONDS.observe(elapsed, endpoint=endpoint, status=status)
+
+def rate_limit_stats() -> Dict[str, Dict[str, Any]]:
+    """Per-installation limits last reported by GitHub."""
+    return {installation: b.stats() for installation, b in _budgets.items()}
+
+async def _cached_get(endpoint: str, url: str, headers: Dict[str, str], params: Optional[Dict[str, Any]] = None) -> "httpx.Response":
+    """GET through ``response_cache``: a 304 is answered with the stored body as a 200."""
+    key = str(get_client().build_request("GET", url, params=params).url) + "|" + headers.get("Accept", "")
+    r = await _request(endpoint, "GET", url, headers={**headers, **response_cache.validators(key)}, params=params)
+    if r.status_code == 304:
+        item = response_cache.hit(key)
+        if item is not None:
+            cached_headers, body = item
+            return httpx.Response(200, headers={k: v for k, v in cached_headers.items() if v},
+                                  content=body, request=r.request)
+        # Evicted while the request was in flight (other pages filling the cache): fetch it whole
+        r = await _request(endpoint, "GET", url, headers=headers, params=params)
+    response_cache.store(key, r)
+    return r
+
+def _headers(token: str, accept: str = "application/vnd.github+json") -> Dict[str, str]:
+    return {"Authorization": f"token {token}", "Accept": accept}
 
 def _app_jwt() -> str:
+    global _jwt
     now = int(time.time())
-    payload = {"iat": now - 60, "exp": now + 9 * 60, "iss": settings.github_app_id}
-    return jwt.encode(payload, settings.github_private_key_pem, algorithm="RS256")
+    if _jwt[1] - now > 60:
+        return _jwt[0]
+    payload = {"iat": now - 60, "exp": now + JWT_LIFETIME, "iss": settings.github_app_id}
+    _jwt = (jwt.encode(payload, settings.github_private_key_pem, algorithm="RS256"), now + JWT_LIFETIME)
+    return _jwt[0]
 
 async def _installation_token(installation_id: int) -> str:
-    jwt_token = _app_jwt()
-    async with httpx.AsyncClient() as client:
-        r = await client.post(
-            f"{GITHUB_API}/app/installations/{installation_id}/access_tokens",
-            headers={"Authorization": f"Bearer {jwt_token}", "Accept": "application/vnd.github+json"},
-        )
+    cached = _tokens.get(installation_id)
+    if cached and cached[1] - time.time() > TOKEN_REFRESH_MARGIN:
+        return cached[0]
+    # One mint per installation at a time; concurrent callers wait and reuse the result.
+    # The asyncio lock serializes this process, the shared lock the other workers.
+    lock = _token_locks.setdefault(installation_id, asyncio.Lock())
+    async with lock:
+        for cached in (_tokens.get(installation_id), await _shared_token(installation_id)):
+            if cached and cached[1] - time.time() > TOKEN_REFRESH_MARGIN:
+                _tokens[installation_id] = cached
+                return cached[0]
+        async with Lock(shared, f"token-mint:{installation_id}", ttl=30):
+            cached = await _shared_token(installation_id)
+            if cached and cached[1] - time.time() > TOKEN_REFRESH_MARGIN:
+                _tokens[installation_id] = cached
+                return cached[0]
+            # Signed with the app JWT, so this call counts against the app's own rate limit
+            with metrics.trace(installation="app"):
+                r = await _request(
+                    "app.access_tokens", "POST", f"/app/installations/{installation_id}/access_tokens",
+                    headers={"Authorization": f"Bearer {_app_jwt()}", "Accept": "application/vnd.github+json"},
+                )
+            r.raise_for_status()
+            data = r.json()
+            expires_at = datetime.fromisoformat(data["expires_at"].replace("Z", "+00:00")).timestamp()
+            _tokens[installation_id] = (data["token"], expires_at)
+            await shared.aset(f"token:{installation_id}", json.dumps([data["token"], expires_at]),
+                              ttl=expires_at - time.time() - TOKEN_REFRESH_MARGIN)
+            return data["token"]
+
+async def _shared_token(installation_id: int) -> Optional[Tuple[str, float]]:
+    raw = await shared.aget(f"token:{installation_id}")
+    return tuple(json.loads(raw)) if raw else None
+
+def _last_page(r: "httpx.Response") -> int:
+    last = r.links.get("last", {}).get("url")
+    return int(httpx.URL(last).params.get("page", 1)) if last else 1
+
+async def iter_changed_files(owner: str, repo: str, pr_number: int, token: str, prefetch: int = 3) -> AsyncIterator[Dict[str, Any]]:
+    """Yield a PR's files as their pages arrive.
+
+    Page 1's ``Link`` header gives the page count, so up to ``prefetch`` later pages are
+    requested concurrently while earlier ones are being consumed. Stops at GitHub's
+    3,000-file listing cap. Closing the generator early cancels outstanding page fetches.
+    """
+    url = f"/repos/{owner}/{repo}/pulls/{pr_number}/files"
+
+    async def fetch(page: int) -> List[Dict[str, Any]]:
+        r = await _cached_get("pulls.files", url, headers=_headers(token), params={"per_page": PER_PAGE, "page": page})
         r.raise_for_status()
-        return r.json()["token"]
+        return r.json()
+
+    first = await _cached_get("pulls.files", url, headers=_headers(token), params={"per_page": PER_PAGE, "page": 1})
+    first.raise_for_status()
+    last = min(_last_page(first), MAX_PR_FILES // PER_PAGE)
+    pending: Dict[int, asyncio.Future] = {}
+    try:
+        for page in range(1, last + 1):
+            for ahead in range(page + 1, min(last, page + prefetch) + 1):
+                if ahead not in pending:
+                    pending[ahead] = asyncio.ensure_future(fetch(ahead))
+            batch = first.json() if page == 1 else await pending.pop(page)
+            for f in batch:
+                yield f
+    finally:
+        for t in pending.values():
+            t.cancel()
 
 async def list_changed_files(owner: str, repo: str, pr_number: int, token: str) -> List[Dict[str, Any]]:
-    async with httpx.AsyncClient() as client:
-        files = []
-        page = 1
-        while True:
-            r = await client.get(
-                f"{GITHUB_API}/repos/{owner}/{repo}/pulls/{pr_number}/files",
-                headers={"Authorization": f"token {token}", "Accept": "application/vnd.github+json"},
-                params={"per_page": 100, "page": page},
-            )
-            r.raise_for_status()
-            batch = r.json()
-            files.extend(batch)
-            if len(batch) < 100:
-                break
-            page += 1
-        return files
+    return [f async for f in iter_changed_files(owner, repo, pr_number, token)]
 
-async def get_repo_file(owner: str, repo: str, path: str, token: str) -> Optional[str]:
-    async with httpx.AsyncClient() as client:
-        r = await client.get(
-            f"{GITHUB_API}/repos/{owner}/{repo}/contents/{path}",
-            headers={"Authorization": f"token {token}", "Accept": "application/vnd.github.raw+json"},
-        )
-        if r.status_code == 200:
-            return r.text
+async def compare_files(owner: str, repo: str, base: str, head: str, token: str) -> Optional[List[Dict[str, Any]]]:
+    """Files changed between two commits, or None when ``head`` is not a fast-forward of
+    ``base`` (force-push, unknown SHA) or the comparison hit GitHub's 300-file cap."""
+    r = await _cached_get(
+        "repos.compare", f"/repos/{owner}/{repo}/compare/{base}...{head}",
+        headers=_headers(token),
+    )
+    if r.status_code == 404:
+        return None
+    r.raise_for_status()
+    data = r.json()
+    files = data.get("files", [])
+    if data.get("status") != "ahead" or len(files) >= 300:
         return None
+    return files
 
-async def list_issue_comments(owner: str, repo: str, pr_number: int, token: str):
-    async with httpx.AsyncClient() as client:
-        r = await client.get(
-            f"{GITHUB_API}/repos/{owner}/{repo}/issues/{pr_number}/comments",
-            headers={"Authorization": f"token {token}", "Accept": "application/vnd.github+json"},
-            params={"per_page": 100},
+async def get_repo_installation(owner: str, repo: str) -> int:
+    """Id of the app's installation on a repo, for callers that start without a webhook."""
+    with metrics.trace(installation="app"):
+        r = await _request(
+            "repos.installation", "GET", f"/repos/{owner}/{repo}/installation",
+            headers={"Authorization": f"Bearer {_app_jwt()}", "Accept": "application/vnd.github+json"},
         )
+    r.raise_for_status()
+    return r.json()["id"]
+
+async def list_pull_requests(owner: str, repo: str, token: str, state: str = "open") -> List[Dict[str, Any]]:
+    return await _paginate("pulls.list", f"/repos/{owner}/{repo}/pulls", token, {"state": state})
+
+async def get_repo_file(owner: str, repo: str, path: str, token: str) -> Optional[str]:
+    r = await _cached_get(
+        "repos.contents", f"/repos/{owner}/{repo}/contents/{path}",
+        headers=_headers(token, "application/vnd.github.raw+json"),
+    )
+    if r.status_code == 200:
+        return r.text
+    return None
+
+async def _paginate(endpoint: str, url: str, token: str, query: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Collect every page of a list endpoint by following ``Link: rel="next"``."""
+    items: List[Dict[str, Any]] = []
+    params: Optional[Dict[str, Any]] = {"per_page": PER_PAGE, **(query or {})}
+    while url:
+        r = await _cached_get(endpoint, url, headers=_headers(token), params=params)
         r.raise_for_status()
-        return r.json()
+        items.extend(r.json())
+        # The next link already carries per_page and page
+        url, params = r.links.get("next", {}).get("url"), None
+    return items
+
+async def list_issue_comments(owner: str, repo: str, pr_number: int, token: str):
+    return await _paginate("issues.comments", f"/repos/{owner}/{repo}/issues/{pr_number}/comments", token)
+
+async def list_review_comments(owner: str, repo: str, pr_number: int, token: str) -> List[Dict[str, Any]]:
+    return await _paginate("pulls.comments", f"/repos/{owner}/{repo}/pulls/{pr_number}/comments", token)
+
+async def find_bot_review(owner: str, repo: str, pr_number: int, token: str, marker: str) -> Optional[Dict[str, Any]]:
+    """The most recent PR review whose body carries ``marker``."""
+    reviews = await _paginate("pulls.reviews", f"/repos/{owner}/{repo}/pulls/{pr_number}/reviews", token)
+    return next((rv for rv in reversed(reviews) if marker in (rv.get("body") or "")), None)
+
+async def create_review(owner: str, repo: str, pr_number: int, token: str, commit_id: str, body: str,
+                        comments: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Post one PR review carrying all new inline ``comments`` in a single write."""
+    r = await _request(
+        "pulls.reviews.create", "POST", f"/repos/{owner}/{repo}/pulls/{pr_number}/reviews",
+        headers=_headers(token),
+        json={"commit_id": commit_id, "event": "COMMENT", "body": body, "comments": comments},
+    )
+    r.raise_for_status()
+    return r.json()
+
+async def update_review(owner: str, repo: str, pr_number: int, review_id: int, token: str, body: str) -> None:
+    r = await _request(
+        "pulls.reviews.update", "PUT", f"/repos/{owner}/{repo}/pulls/{pr_number}/reviews/{review_id}",
+        headers=_headers(token),
+        json={"body": body},
+    )
+    r.raise_for_status()
+
+async def update_review_comment(owner: str, repo: str, comment_id: int, token: str, body: str) -> None:
+    r = await _request(
+        "pulls.comments.update", "PATCH", f"/repos/{owner}/{repo}/pulls/comments/{comment_id}",
+        headers=_headers(token),
+        json={"body": body},
+    )
+    r.raise_for_status()
+
+async def find_bot_comment(owner: str, repo: str, pr_number: int, token: str, marker: str) -> Optional[Dict[str, Any]]:
+    comments = await list_issue_comments(owner, repo, pr_number, token)
+    return next((c for c in comments if marker in c.get("body", "")), None)
 
 async def create_or_update_comment(owner: str, repo: str, pr_number: int, token: str, body: str, marker: str):
     # Try to update an existing bot comment to avoid spam
-    comments = await list_issue_comments(owner, repo, pr_number, token)
-    target = next((c for c in comments if marker in c.get("body", "")), None)
-
-    async with httpx.AsyncClient() as client:
-        if target:
-            r = await client.patch(
-                f"{GITHUB_API}/repos/{owner}/{repo}/issues/comments/{target['id']}",
-                headers={"Authorization": f"token {token}", "Accept": "application/vnd.github+json"},
-                json={"body": body},
-            )
-        else:
-            r = await client.post(
-                f"{GITHUB_API}/repos/{owner}/{repo}/issues/{pr_number}/comments",
-                headers={"Authorization": f"token {token}", "Accept": "application/vnd.github+json"},
-                json={"body": body},
-            )
-        r.raise_for_status()
+    target = await find_bot_comment(owner, repo, pr_number, token, marker)
+
+    if target:
+        r = await _request(
+            "issues.comments.update", "PATCH", f"/repos/{owner}/{repo}/issues/comments/{target['id']}",
+            headers=_headers(token),
+            json={"body": body},
+        )
+    else:
+        r = await _request(
+            "issues.comments.create", "POST", f"/repos/{owner}/{repo}/issues/{pr_number}/comments",
+            headers=_headers(token),
+            json={"body": body},
+        )
+    r.raise_for_status()
 
     return True
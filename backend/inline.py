@@ -0,0 +1,76 @@
+import hashlib, re
+from typing import Any, Dict, List, Tuple
+from pydantic import BaseModel
+from diffparse import commentable_lines
+from models import Finding, ReviewResult
+
+class InlinePlan(BaseModel):
+    create: List[Dict[str, Any]] = []  # comments[] entries for the batched review
+    update: List[Tuple[int, str]] = []  # (comment id, new body)
+    resolve: List[Tuple[int, str]] = []
+    unanchored: List[Tuple[str, Finding]] = []  # findings without a line inside the diff
+
+def fingerprint(path: str, f: Finding) -> str:
+    """Identity of a finding across pushes; the line is left out so moved code keeps its thread."""
+    return hashlib.sha1(f"{path}\0{f.severity.lower()}\0{f.title.strip().lower()}".encode()).hexdigest()[:12]
+
+def _marker(tag: str, fid: str, resolved: bool = False) -> str:
+    return f"<!-- {tag}:finding {fid}{' resolved' if resolved else ''} -->"
+
+def render_finding(f: Finding) -> str:
+    lines = [f"**{f.severity.upper()}** — **{f.title}**", "", f.details.strip()]
+    if f.suggestion:
+        lines += ["", f"_Suggestion_: {f.suggestion.strip()}"]
+    return "\n".join(lines)
+
+def plan_inline_review(result: ReviewResult, changed: List[Dict[str, Any]], existing: List[Dict[str, Any]],
+                       tag: str, added_only: bool = False) -> InlinePlan:
+    """Diff the new findings against the bot's existing inline comments.
+
+    New findings on a line inside the diff become ``create`` entries; findings whose text
+    changed are updated in place; open bot comments with no matching finding are resolved.
+    Pass ``added_only`` when ``changed`` is not the PR's own diff (incremental reviews), as
+    only lines added there are certain to be part of the PR diff.
+    """
+    anchorable = {f["filename"]: commentable_lines(f.get("patch") or "", added_only) for f in changed}
+    marker = re.compile(rf"<!-- {re.escape(tag)}:finding ([0-9a-f]+)( resolved)? -->")
+    open_comments: Dict[str, Dict[str, Any]] = {}
+    for c in existing:
+        m = marker.search(c.get("body") or "")
+        if m and not m.group(2):
+            open_comments[m.group(1)] = c
+
+    plan, seen = InlinePlan(), set()
+    for fr in result.files:
+        for f in fr.findings:
+            fid = fingerprint(fr.file, f)
+            if fid in seen:
+                continue
+            seen.add(fid)
+            body = f"{render_finding(f)}\n\n{_marker(tag, fid)}"
+            if fid in open_comments:
+                if open_comments[fid].get("body") != body:
+                    plan.update.append((open_comments[fid]["id"], body))
+            elif f.line is not None and f.line in anchorable.get(fr.file, ()):
+                plan.create.append({"path": fr.file, "line": f.line, "side": "RIGHT", "body": body})
+            else:
+                plan.unanchored.append((fr.file, f))
+
+    for fid, c in open_comments.items():
+        if fid not in seen:
+            # The REST API cannot resolve threads; mark the comment resolved instead
+            title = (c.get("body") or "").split("\n", 1)[0]
+            body = f"~~{title}~~\n\n✅ No longer reported as of `{(result.head_sha or '')[:7]}`.\n\n{_marker(tag, fid, True)}"
+            plan.resolve.append((c["id"], body))
+    return plan
+
+def render_review_body(result: ReviewResult, plan: InlinePlan, header: str) -> str:
+    """Review summary: ``header`` (tag + state markers) and findings that could not be anchored."""
+    lines = [header, "## 🤖 AI Code Review\n", result.summary.strip()]
+    if plan.unanchored:
+        lines.append("\n### Findings outside the diff")
+        for path, f in plan.unanchored:
+            lines.append(f"- `{path}` — **{f.severity.upper()}** — **{f.title}**\n  {f.details.strip()}")
+    counts = f"{len(plan.create)} new, {len(plan.update)} updated, {len(plan.resolve)} resolved inline comment(s)"
+    lines.append(f"\n> _{counts}. Re-run automatically on new commits (synchronize)_")
+    return "\n".join(lines)
@@ -0,0 +1,440 @@
+import asyncio, functools, json, logging, sqlite3, threading, time, uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional
+from pydantic import BaseModel
+
+# Job lifecycle: queued -> running -> done
+#                         running -> cancelled (handler raised JobCancelled)
+#                         running -> queued (retry with backoff) -> ... -> dead
+#                         running -> queued at a given time (handler raised RetryLater; no attempt used)
+# A running job holds a lease that its worker renews; if the worker dies the lease runs
+# out and any worker (in any process sharing the store) claims the job again. A worker
+# that finds its lease gone stops the job and leaves the row to the new holder.
+QUEUED, RUNNING, DONE, CANCELLED, DEAD = "queued", "running", "done", "cancelled", "dead"
+FINISHED = frozenset({DONE, CANCELLED, DEAD})
+
+logger = logging.getLogger("ai_review")
+
+class JobCancelled(Exception):
+    """Raised by a handler when its job no longer needs to run; the job is not retried."""
+
+class RetryLater(Exception):
+    """Raised by a handler that cannot make progress before ``retry_at`` (e.g. an exhausted
+    rate limit); the job is requeued for then without using up an attempt."""
+
+    def __init__(self, message: str, retry_at: float):
+        super().__init__(message)
+        self.retry_at = retry_at
+
+class Job(BaseModel):
+    id: str
+    kind: str
+    payload: Dict[str, Any]
+    status: str = QUEUED
+    attempts: int = 0
+    max_attempts: int = 5
+    run_at: float = 0.0
+    last_error: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+    created_at: float = 0.0
+    updated_at: float = 0.0
+    lease_until: float = 0.0
+    tenant: str = ""  # whose work this is (the GitHub installation); claims are spread across tenants
+
+class JobStore:
+    """Persistence backend for the job queue. Subclass to plug in another store.
+
+    The queue calls it through the ``a``-prefixed coroutines, which run the operations off the
+    event loop: a SQLite write may wait on another process's lock for seconds.
+    """
+
+    async def _call(self, fn, *args):
+        return await asyncio.to_thread(fn, *args)
+
+    async def aput(self, job: Job) -> Job:
+        return await self._call(self.put, job)
+
+    async def aget(self, job_id: str) -> Optional[Job]:
+        return await self._call(self.get, job_id)
+
+    async def aupdate(self, job: Job, held: Optional[float] = None) -> bool:
+        return await self._call(self.update, job, held)
+
+    async def aclaim(self, now: float, lease: float) -> Optional[Job]:
+        return await self._call(self.claim, now, lease)
+
+    async def arenew(self, job_id: str, held: float, lease_until: float) -> bool:
+        return await self._call(self.renew, job_id, held, lease_until)
+
+    async def acount(self, status: str) -> int:
+        return await self._call(self.count, status)
+
+    async def aprune(self, before: float) -> int:
+        return await self._call(self.prune, before)
+
+    def put(self, job: Job) -> Job:
+        """Insert a job; if one with the same id exists, return the existing job unchanged."""
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> Optional[Job]:
+        raise NotImplementedError
+
+    def update(self, job: Job, held: Optional[float] = None) -> bool:
+        """Write ``job``. With ``held``, only while the stored job is running under that lease:
+        False (and nothing written) once it expired and another worker claimed the job."""
+        raise NotImplementedError
+
+    def claim(self, now: float, lease: float) -> Optional[Job]:
+        """Atomically move a due queued job (or a running job whose lease has expired) to
+        running, leased until ``now + lease``, count the attempt and return it. The oldest job of
+        the tenant with the fewest running jobs goes first, so one busy tenant cannot take every
+        worker. The attempt is saved here so that a run which takes its process down still
+        counts against ``max_attempts``."""
+        raise NotImplementedError
+
+    def renew(self, job_id: str, held: float, lease_until: float) -> bool:
+        """Move a running job's lease from ``held`` to ``lease_until``; False if the job is no
+        longer running under ``held``."""
+        raise NotImplementedError
+
+    def count(self, status: str) -> int:
+        raise NotImplementedError
+
+    def prune(self, before: float) -> int:
+        """Delete finished jobs (done, cancelled, dead) last updated before ``before``; returns how many."""
+        raise NotImplementedError
+
+class MemoryJobStore(JobStore):
+    async def _call(self, fn, *args):
+        # Nothing here blocks; a thread hop would only add latency
+        return fn(*args)
+
+    def __init__(self):
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def put(self, job: Job) -> Job:
+        with self._lock:
+            existing = self._jobs.get(job.id)
+            if existing:
+                return existing.model_copy()
+            self._jobs[job.id] = job.model_copy()
+            return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.model_copy() if job else None
+
+    def update(self, job: Job, held: Optional[float] = None) -> bool:
+        with self._lock:
+            stored = self._jobs.get(job.id)
+            if held is not None and (not stored or stored.status != RUNNING or stored.lease_until != held):
+                return False
+            self._jobs[job.id] = job.model_copy()
+            return True
+
+    def claim(self, now: float, lease: float) -> Optional[Job]:
+        with self._lock:
+            due = [j for j in self._jobs.values()
+                   if (j.status == QUEUED and j.run_at <= now) or (j.status == RUNNING and j.lease_until <= now)]
+            if not due:
+                return None
+            running: Dict[str, int] = {}
+            for j in self._jobs.values():
+                if j.status == RUNNING and j.lease_until > now:
+                    running[j.tenant] = running.get(j.tenant, 0) + 1
+            job = min(due, key=lambda j: (running.get(j.tenant, 0), j.run_at, j.created_at))
+            job.status, job.updated_at, job.lease_until = RUNNING, now, now + lease
+            job.attempts += 1
+            return job.model_copy()
+
+    def renew(self, job_id: str, held: float, lease_until: float) -> bool:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job or job.status != RUNNING or job.lease_until != held:
+                return False
+            job.lease_until = lease_until
+            return True
+
+    def count(self, status: str) -> int:
+        with self._lock:
+            return sum(1 for j in self._jobs.values() if j.status == status)
+
+    def prune(self, before: float) -> int:
+        with self._lock:
+            old = [j.id for j in self._jobs.values() if j.status in FINISHED and j.updated_at < before]
+            for job_id in old:
+                del self._jobs[job_id]
+            return len(old)
+
+class SQLiteJobStore(JobStore):
+    _COLUMNS = ("id", "kind", "payload", "status", "attempts", "max_attempts", "run_at",
+                "last_error", "result", "created_at", "updated_at", "lease_until", "tenant")
+
+    def __init__(self, path: str):
+        # Several worker processes may share the file; wait for each other's write locks
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._lock = threading.Lock()
+        # One connection serializes the calls anyway; a thread of its own keeps a locked
+        # database from tying up the default executor
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="jobs")
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY, kind TEXT NOT NULL, payload TEXT NOT NULL,"
+                " status TEXT NOT NULL, attempts INTEGER NOT NULL, max_attempts INTEGER NOT NULL,"
+                " run_at REAL NOT NULL, last_error TEXT, result TEXT,"
+                " created_at REAL NOT NULL, updated_at REAL NOT NULL, lease_until REAL NOT NULL DEFAULT 0,"
+                " tenant TEXT NOT NULL DEFAULT '')"
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            if "lease_until" not in columns:
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN lease_until REAL NOT NULL DEFAULT 0")
+            if "tenant" not in columns:
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN tenant TEXT NOT NULL DEFAULT ''")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_due ON jobs (status, run_at)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_tenant ON jobs (tenant, status)")
+
+    async def _call(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(fn, *args))
+
+    def _row(self, job: Job) -> tuple:
+        return (job.id, job.kind, json.dumps(job.payload), job.status, job.attempts,
+                job.max_attempts, job.run_at, job.last_error,
+                json.dumps(job.result) if job.result is not None else None,
+                job.created_at, job.updated_at, job.lease_until, job.tenant)
+
+    def _job(self, row) -> Job:
+        d = dict(zip(self._COLUMNS, row))
+        d["payload"] = json.loads(d["payload"])
+        d["result"] = json.loads(d["result"]) if d["result"] else None
+        return Job(**d)
+
+    def put(self, job: Job) -> Job:
+        with self._lock:
+            cur = self._conn.execute(
+                f"INSERT OR IGNORE INTO jobs VALUES ({','.join('?' * len(self._COLUMNS))})", self._row(job)
+            )
+            if cur.rowcount:
+                return job
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job.id,)).fetchone()
+            return self._job(row)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._job(row) if row else None
+
+    def update(self, job: Job, held: Optional[float] = None) -> bool:
+        with self._lock:
+            if held is None:
+                self._conn.execute(
+                    f"REPLACE INTO jobs VALUES ({','.join('?' * len(self._COLUMNS))})", self._row(job)
+                )
+                return True
+            cur = self._conn.execute(
+                f"UPDATE jobs SET {', '.join(f'{c} = ?' for c in self._COLUMNS[1:])}"
+                " WHERE id = ? AND status = ? AND lease_until = ?",
+                (*self._row(job)[1:], job.id, RUNNING, held),
+            )
+            return bool(cur.rowcount)
+
+    def claim(self, now: float, lease: float) -> Optional[Job]:
+        with self._lock:
+            # BEGIN IMMEDIATE takes the database write lock, so two processes never claim the same job
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT * FROM jobs j WHERE (status = ? AND run_at <= ?) OR (status = ? AND lease_until <= ?)"
+                    " ORDER BY (SELECT COUNT(*) FROM jobs r WHERE r.tenant = j.tenant AND r.status = ?"
+                    " AND r.lease_until > ?), run_at, created_at LIMIT 1",
+                    (QUEUED, now, RUNNING, now, RUNNING, now),
+                ).fetchone()
+                if row:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = ?, updated_at = ?, lease_until = ?, attempts = attempts + 1"
+                        " WHERE id = ?",
+                        (RUNNING, now, now + lease, row[0]),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if not row:
+            return None
+        job = self._job(row)
+        job.status, job.updated_at, job.lease_until = RUNNING, now, now + lease
+        job.attempts += 1
+        return job
+
+    def renew(self, job_id: str, held: float, lease_until: float) -> bool:
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND status = ? AND lease_until = ?",
+                (lease_until, job_id, RUNNING, held),
+            )
+            return bool(cur.rowcount)
+
+    def count(self, status: str) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+
+    def prune(self, before: float) -> int:
+        with self._lock:
+            return self._conn.execute(
+                f"DELETE FROM jobs WHERE status IN ({','.join('?' * len(FINISHED))}) AND updated_at < ?",
+                (*sorted(FINISHED), before),
+            ).rowcount
+
+def make_job_store(url: str) -> JobStore:
+    """Build a store from a URL: ``memory://`` or ``sqlite:///path/to/jobs.db`` (a bare path means SQLite)."""
+    if url.startswith("memory:"):
+        return MemoryJobStore()
+    if url.startswith("sqlite:///"):
+        url = url[len("sqlite:///"):]
+    return SQLiteJobStore(url)
+
+Handler = Callable[[Job], Awaitable[Optional[Dict[str, Any]]]]
+
+class JobQueue:
+    """In-process queue drained by a pool of asyncio workers.
+
+    Failed jobs are retried with exponential backoff (``backoff * 2 ** (attempt - 1)`` seconds)
+    until ``max_attempts`` is reached, after which they are parked in the ``dead`` state.
+    Several processes may run queues over one shared store; leases keep them off each other's jobs.
+    Finished jobs are deleted ``retention`` seconds after they finish (0 keeps them).
+    """
+
+    def __init__(self, store: JobStore, handler: Handler, workers: int = 4,
+                 max_attempts: int = 5, backoff: float = 2.0, poll_interval: float = 1.0, lease: float = 60.0,
+                 retention: float = 7 * 24 * 3600):
+        self.store = store
+        self.handler = handler
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.retention = retention
+        self._wakeup = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        if self.retention > 0:
+            self._tasks.append(asyncio.create_task(self._sweep()))
+
+    async def stop(self) -> None:
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def enqueue(self, kind: str, payload: Dict[str, Any], job_id: Optional[str] = None,
+                      tenant: str = "") -> Job:
+        """Persist a job and wake a worker. Re-enqueueing an existing ``job_id`` is a no-op."""
+        now = time.time()
+        job = Job(id=job_id or uuid.uuid4().hex, kind=kind, payload=payload, tenant=tenant,
+                  max_attempts=self.max_attempts, run_at=now, created_at=now, updated_at=now)
+        job = await self.store.aput(job)
+        self._wakeup.set()
+        return job
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        return await self.store.aget(job_id)
+
+    async def depth(self) -> int:
+        return await self.store.acount(QUEUED)
+
+    async def _worker(self, n: int) -> None:
+        while True:
+            try:
+                await self._step()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # A store error (a locked or unreachable database) must not take the worker down
+                # with it; the pool would shrink until nothing drains the queue
+                logger.exception("Job worker %d failed; retrying in %ss", n, self.poll_interval)
+                await asyncio.sleep(self.poll_interval)
+
+    async def _step(self) -> None:
+        """Claim and run one job, or wait for one."""
+        job = await self.store.aclaim(time.time(), self.lease)
+        if job is None:
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            return
+        if job.attempts > job.max_attempts:
+            # Reclaimed after its last attempt lost the worker (a crash, OOM or kill)
+            job.status, job.last_error = DEAD, f"worker lost on attempt {job.max_attempts}/{job.max_attempts}"
+            job.attempts, job.updated_at = job.max_attempts, time.time()
+            if await self.store.aupdate(job, job.lease_until):
+                logger.warning("Job %s dead: %s", job.id, job.last_error)
+            return
+        await self._run(job)
+
+    async def _sweep(self) -> None:
+        """Delete expired finished jobs now and then; every process sharing the store may do it."""
+        while True:
+            removed = await self.store.aprune(time.time() - self.retention)
+            if removed:
+                logger.info("Pruned %d finished job(s) older than %ss", removed, self.retention)
+            await asyncio.sleep(min(self.retention, 3600))
+
+    async def _heartbeat(self, job: Job, work: asyncio.Future) -> None:
+        """Renew the job's lease until cancelled. If the lease is gone (this worker stalled past
+        it and another one claimed the job) stop the handler and return."""
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            until = time.time() + self.lease
+            try:
+                renewed = await self.store.arenew(job.id, job.lease_until, until)
+            except Exception:
+                logger.exception("Could not renew the lease of job %s", job.id)
+                continue
+            if not renewed:
+                logger.warning("Job %s lost its lease; stopping it", job.id)
+                work.cancel()
+                return
+            job.lease_until = until
+
+    async def _run(self, job: Job) -> None:
+        work = asyncio.ensure_future(self.handler(job))
+        heartbeat = asyncio.create_task(self._heartbeat(job, work))
+        try:
+            job.result = await work
+            job.status, job.last_error = DONE, None
+        except JobCancelled as e:
+            job.status, job.last_error = CANCELLED, str(e)
+        except RetryLater as e:
+            job.status, job.last_error = QUEUED, str(e)
+            job.attempts -= 1
+            job.run_at = e.retry_at
+        except asyncio.CancelledError:
+            if not heartbeat.done():
+                # Shutdown mid-run: hand the job back without charging it an attempt
+                job.status, job.attempts = QUEUED, job.attempts - 1
+                job.updated_at = time.time()
+                await self.store.aupdate(job, job.lease_until)
+                raise
+        except Exception as e:
+            job.last_error = f"{type(e).__name__}: {e}"
+            logger.warning("Job %s attempt %d/%d failed: %s", job.id, job.attempts, job.max_attempts, job.last_error)
+            if job.attempts >= job.max_attempts:
+                job.status = DEAD
+            else:
+                job.status = QUEUED
+                job.run_at = time.time() + self.backoff * 2 ** (job.attempts - 1)
+        finally:
+            lost = heartbeat.done()
+            heartbeat.cancel()
+        # Whatever the handler did, a job whose lease was lost belongs to its new holder now
+        job.updated_at = time.time()
+        if lost or not await self.store.aupdate(job, job.lease_until):
+            logger.warning("Job %s lost its lease; leaving it to its current holder", job.id)
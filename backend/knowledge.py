@@ -0,0 +1,339 @@
+import asyncio, functools, hashlib, json, re, sqlite3, threading, time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from diffparse import Hunk, iter_hunks
+from models import Finding
+import metrics
+
+# Tokens of source code in most languages: names, numbers, (possibly unterminated) string literals, punctuation
+_TOKEN = re.compile(r"""[A-Za-z_$][\w$]*|\d[\w.]*|"(?:\\.|[^"\\])*"?|'(?:\\.|[^'\\])*'?|`[^`]*`?|\S""")
+
+KEYWORDS = frozenset("""
+and as assert async await break case catch class const continue def default defer del delete do elif else enum
+except export extends false final finally fn for from func function go if impl import in instanceof interface is
+lambda let match mut new nil none not null or package pass private protected pub public raise return self static
+struct super switch this throw throws true try type typeof unsafe use var void where while with yield
+""".split())
+
+# A 64-bit SimHash in 8 bands of 8 bits: hashes up to 7 bits apart share at least one band. A one-line
+# edit to a hunk typically moves its hash 0-9 bits; unrelated code lands around 32
+_BANDS, _BAND_BITS = 8, 8
+
+def normalize(lines: List[str], literals: bool = False) -> List[str]:
+    """Tokens of ``lines`` with whitespace dropped, literals collapsed (kept with ``literals``) and
+    local names renamed in order of appearance (``v0``, ``v1``...). Keywords, attributes and called
+    names are kept: they carry what the code does, a variable's name mostly does not."""
+    tokens = [t for line in lines for t in _TOKEN.findall(line)]
+    names: Dict[str, str] = {}
+    out = []
+    for i, t in enumerate(tokens):
+        c = t[0]
+        if literals and (c.isdigit() or c in "\"'`"):
+            out.append(t)
+        elif c.isdigit():
+            out.append("0")
+        elif c in "\"'`":
+            out.append('""')
+        elif c.isalpha() or c in "_$":
+            called = i + 1 < len(tokens) and tokens[i + 1] == "("
+            if t.lower() in KEYWORDS or called or (i and tokens[i - 1] == "."):
+                out.append(t)
+            else:
+                out.append(names.setdefault(t, f"v{len(names)}"))
+        else:
+            out.append(t)
+    return out
+
+def _h64(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "big")
+
+def simhash(tokens: List[str], width: int = 3) -> int:
+    """64-bit SimHash over ``width``-token shingles: near-identical code differs in a few bits."""
+    shingles = [" ".join(tokens[i:i + width]) for i in range(max(1, len(tokens) - width + 1))]
+    weights = [0] * 64
+    for s in shingles:
+        h = _h64(s)
+        for bit in range(64):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+def bands(h: int) -> List[int]:
+    mask = (1 << _BAND_BITS) - 1
+    return [h >> (i * _BAND_BITS) & mask for i in range(_BANDS)]
+
+def distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+class HunkPrint(NamedTuple):
+    fingerprint: str  # exact key: hash of the normalized added lines, literals included
+    simhash: int  # over the same lines with literals collapsed
+    anchor: int  # new-file line of the first added line; stored findings are relative to it
+    first: int  # new-file line range the hunk covers
+    last: int
+
+def fingerprint(hunk: Hunk, min_tokens: int) -> Optional[HunkPrint]:
+    """None for hunks with too little new code to be told apart from unrelated ones."""
+    added = [l for l in hunk.lines if l.kind == "+"]
+    tokens = normalize([l.text for l in added])
+    if len(tokens) < max(min_tokens, 1):
+        return None
+    numbered = [l.new_no for l in hunk.lines if l.new_no is not None]
+    exact = " ".join(normalize([l.text for l in added], literals=True))
+    return HunkPrint(hashlib.sha1(exact.encode()).hexdigest(), simhash(tokens),
+                     added[0].new_no, numbered[0], numbered[-1])
+
+class KnowledgeBackend:
+    """Findings per ``(repo, fingerprint)`` with a SimHash band index. ``get`` refreshes recency;
+    both limits evict the least recently used entries. ``_call`` runs a blocking operation for
+    the event loop (see ``StateBackend``)."""
+
+    async def _call(self, fn, *args):
+        return await asyncio.to_thread(fn, *args)
+
+    def get(self, repo: str, fp: str) -> Optional[Tuple[int, str]]:
+        """Return ``(simhash, value)`` or None."""
+        raise NotImplementedError
+
+    def candidates(self, repo: str, h: int) -> List[Tuple[str, int]]:
+        """``(fingerprint, simhash)`` of the repo's entries sharing at least one band with ``h``."""
+        raise NotImplementedError
+
+    def set(self, repo: str, fp: str, h: int, value: str, now: float) -> None:
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+class MemoryKnowledgeBackend(KnowledgeBackend):
+    async def _call(self, fn, *args):
+        return fn(*args)
+
+    def __init__(self, max_entries: int, max_per_repo: int):
+        self.max_entries, self.max_per_repo = max_entries, max_per_repo
+        self._data: "OrderedDict[Tuple[str, str], Tuple[int, str]]" = OrderedDict()
+        self._repos: Dict[str, "OrderedDict[str, None]"] = {}
+        self._bands: Dict[Tuple[str, int, int], set] = {}
+        self._lock = threading.Lock()
+
+    def get(self, repo, fp):
+        with self._lock:
+            item = self._data.get((repo, fp))
+            if item is not None:
+                self._data.move_to_end((repo, fp))
+                self._repos[repo].move_to_end(fp)
+            return item
+
+    def candidates(self, repo, h):
+        with self._lock:
+            found = set()
+            for i, b in enumerate(bands(h)):
+                found |= self._bands.get((repo, i, b), set())
+            return [(fp, self._data[(repo, fp)][0]) for fp in found]
+
+    def set(self, repo, fp, h, value, now):
+        with self._lock:
+            self._remove(repo, fp)
+            self._data[(repo, fp)] = (h, value)
+            self._repos.setdefault(repo, OrderedDict())[fp] = None
+            for i, b in enumerate(bands(h)):
+                self._bands.setdefault((repo, i, b), set()).add(fp)
+            while len(self._repos[repo]) > self.max_per_repo:
+                self._remove(repo, next(iter(self._repos[repo])))
+            while len(self._data) > self.max_entries:
+                self._remove(*next(iter(self._data)))
+
+    def _remove(self, repo: str, fp: str) -> None:
+        item = self._data.pop((repo, fp), None)
+        if item is None:
+            return
+        fps = self._repos[repo]
+        del fps[fp]
+        if not fps:
+            del self._repos[repo]
+        for i, b in enumerate(bands(item[0])):
+            members = self._bands[(repo, i, b)]
+            members.discard(fp)
+            if not members:
+                del self._bands[(repo, i, b)]
+
+    def __len__(self):
+        return len(self._data)
+
+class SQLiteKnowledgeBackend(KnowledgeBackend):
+    def __init__(self, path: str, max_entries: int, max_per_repo: int):
+        self.max_entries, self.max_per_repo = max_entries, max_per_repo
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="knowledge")
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            # SQLite integers are signed: the hash is stored as hex, its bands as integers
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS knowledge ("
+                " repo TEXT NOT NULL, fp TEXT NOT NULL, simhash TEXT NOT NULL,"
+                + "".join(f" band{i} INTEGER NOT NULL," for i in range(_BANDS))
+                + " value TEXT NOT NULL, used_at REAL NOT NULL, PRIMARY KEY (repo, fp))"
+            )
+            for i in range(_BANDS):
+                self._conn.execute(f"CREATE INDEX IF NOT EXISTS knowledge_band{i} ON knowledge (repo, band{i})")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS knowledge_lru ON knowledge (used_at)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS knowledge_repo_lru ON knowledge (repo, used_at)")
+
+    async def _call(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(fn, *args))
+
+    def get(self, repo, fp):
+        with self._lock:
+            row = self._conn.execute("SELECT simhash, value FROM knowledge WHERE repo = ? AND fp = ?",
+                                     (repo, fp)).fetchone()
+            if row:
+                self._conn.execute("UPDATE knowledge SET used_at = ? WHERE repo = ? AND fp = ?",
+                                   (time.time(), repo, fp))
+        return (int(row[0], 16), row[1]) if row else None
+
+    def candidates(self, repo, h):
+        where = " OR ".join(f"band{i} = ?" for i in range(_BANDS))
+        with self._lock:
+            rows = self._conn.execute(f"SELECT fp, simhash FROM knowledge WHERE repo = ? AND ({where})",
+                                      (repo, *bands(h))).fetchall()
+        return [(fp, int(s, 16)) for fp, s in rows]
+
+    def set(self, repo, fp, h, value, now):
+        with self._lock:
+            self._conn.execute(f"REPLACE INTO knowledge VALUES (?, ?, ?, {', '.join('?' * _BANDS)}, ?, ?)",
+                               (repo, fp, format(h, "016x"), *bands(h), value, now))
+            self._conn.execute(
+                "DELETE FROM knowledge WHERE repo = ? AND fp IN ("
+                " SELECT fp FROM knowledge WHERE repo = ? ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (repo, repo, self.max_per_repo)
+            )
+            self._conn.execute(
+                "DELETE FROM knowledge WHERE rowid IN ("
+                " SELECT rowid FROM knowledge ORDER BY used_at DESC LIMIT -1 OFFSET ?)", (self.max_entries,)
+            )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM knowledge").fetchone()[0]
+
+class Split(NamedTuple):
+    findings: List[Finding]  # reused findings, at the patch's own line numbers
+    patch: Optional[str]  # the hunks still to review; None when every hunk was known
+    reused: int  # hunks answered from the store
+    similar: List[Finding]  # findings of near-identical hunks, for wording only (see ``reword``)
+
+class Knowledge:
+    """Per-repo memory of what the model said about each hunk it reviewed, so the same code
+    arriving again in another pull request (a backport, a fork's branch, vendored files) gets
+    the same findings without another model call. Async code uses the ``a``-prefixed
+    coroutines, which keep the backend's I/O off the event loop."""
+
+    def __init__(self, backend: KnowledgeBackend, min_tokens: int, max_distance: int):
+        self.backend = backend
+        self.min_tokens = min_tokens
+        self.max_distance = max_distance
+        self.counts = {"exact": 0, "near": 0, "new": 0}
+
+    def recall(self, repo: str, hp: HunkPrint) -> Tuple[str, Optional[List[Finding]]]:
+        """``(outcome, findings)``: the findings stored for this hunk (``"exact"``) or, failing
+        that, for the closest near-identical one (``"near"``)."""
+        item = self.backend.get(repo, hp.fingerprint)
+        outcome = "exact"
+        if item is None and self.max_distance > 0:
+            near = [(distance(hp.simhash, h), fp) for fp, h in self.backend.candidates(repo, hp.simhash)]
+            near = [c for c in near if c[0] <= self.max_distance]
+            item = self.backend.get(repo, min(near)[1]) if near else None
+            outcome = "near"
+        if item is None:
+            outcome = "new"
+        self.counts[outcome] += 1
+        metrics.KNOWLEDGE_HUNKS.inc(outcome=outcome)
+        if item is None:
+            return outcome, None
+        return outcome, [f.model_copy(update={"line": min(max(hp.anchor + f.line, hp.first), hp.last)})
+                if f.line is not None else f
+                for f in map(Finding.model_validate, json.loads(item[1]))]
+
+    def split(self, repo: str, patch: str) -> Split:
+        """Answer the hunks of ``patch`` the store knows exactly; the rest are left for the model.
+        A near-identical hunk can differ in exactly the line that matters (a dropped check, an
+        added ``eval``), so it is still reviewed and its old findings only lend their wording."""
+        findings: List[Finding] = []
+        similar: List[Finding] = []
+        unknown: List[Hunk] = []
+        reused = 0
+        for hunk in iter_hunks(patch):
+            hp = fingerprint(hunk, self.min_tokens)
+            outcome, known = self.recall(repo, hp) if hp else ("new", None)
+            if outcome != "exact":
+                similar += known or []
+                unknown.append(hunk)
+                continue
+            findings += known
+            reused += 1
+        if not reused:
+            return Split([], patch, 0, similar)
+        return Split(findings, "\n".join(h.render() for h in unknown) if unknown else None, reused, similar)
+
+    def learn(self, repo: str, patch: str, findings: List[Finding]) -> None:
+        """Store what the model found in each hunk of ``patch`` it reviewed (nothing is worth
+        storing too). Findings without a line only count when the patch has a single hunk; if
+        any finding cannot be placed in a hunk nothing is stored, or a hunk it belongs to
+        would be remembered as clean."""
+        hunks = list(iter_hunks(patch))
+        spans = [[l.new_no for l in h.lines if l.new_no is not None] for h in hunks]
+
+        def placed(f: Finding) -> bool:
+            if f.line is None:
+                return len(hunks) == 1
+            return any(n and n[0] <= f.line <= n[-1] for n in spans)
+
+        if not all(map(placed, findings)):
+            return
+        now = time.time()
+        for hunk in hunks:
+            hp = fingerprint(hunk, self.min_tokens)
+            if hp is None:
+                continue
+            mine = [f.model_copy(update={"line": f.line - hp.anchor}) for f in findings
+                    if f.line is not None and hp.first <= f.line <= hp.last]
+            if len(hunks) == 1:
+                mine += [f for f in findings if f.line is None]
+            value = json.dumps([f.model_dump() for f in mine], separators=(",", ":"))
+            self.backend.set(repo, hp.fingerprint, hp.simhash, value, now)
+
+    async def asplit(self, repo: str, patch: str) -> Split:
+        return await self.backend._call(self.split, repo, patch)
+
+    async def alearn(self, repo: str, patch: str, findings: List[Finding]) -> None:
+        await self.backend._call(self.learn, repo, patch, findings)
+
+    async def astats(self) -> Dict[str, Any]:
+        return await self.backend._call(self.stats)
+
+    def stats(self) -> Dict[str, Any]:
+        looked = sum(self.counts.values())
+        return {**self.counts, "reuse_ratio": self.counts["exact"] / looked if looked else 0.0,
+                "entries": len(self.backend)}
+
+def reword(findings: List[Finding], similar: List[Finding]) -> List[Finding]:
+    """Give the model's findings the wording of a near-identical hunk's finding with the same
+    title, so a recurring issue reads the same across pull requests. Lines and severities stay
+    the model's."""
+    wording = {f.title.lower(): f for f in similar}
+    return [f.model_copy(update={"details": wording[f.title.lower()].details,
+                                 "suggestion": wording[f.title.lower()].suggestion})
+            if f.title.lower() in wording else f for f in findings]
+
+def make_knowledge(url: str, max_entries: int, max_per_repo: int, min_tokens: int,
+                   max_distance: int) -> Optional[Knowledge]:
+    """Build the store from a URL: ``memory://`` or ``sqlite:///path/to/knowledge.db`` (a bare
+    path means SQLite). An empty URL turns it off."""
+    if not url:
+        return None
+    if url.startswith("memory:"):
+        return Knowledge(MemoryKnowledgeBackend(max_entries, max_per_repo), min_tokens, max_distance)
+    if url.startswith("sqlite:///"):
+        url = url[len("sqlite:///"):]
+    return Knowledge(SQLiteKnowledgeBackend(url, max_entries, max_per_repo), min_tokens, max_distance)
@@ -0,0 +1,33 @@
+import importlib
+from types import ModuleType
+from typing import Any, List, Optional
+
+class LazyModule(ModuleType):
+    """Stands in for a module and imports it on first attribute access. Heavy dependencies
+    (openai, httpx, jwt, yaml) held this way stay off the import path of entry points that
+    answer a request without them. Annotations naming them must be strings."""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._module: Optional[ModuleType] = None
+
+    def load(self) -> ModuleType:
+        if self._module is None:
+            self._module = importlib.import_module(self.__name__)
+        return self._module
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self.load(), attr)
+
+_lazy: List[LazyModule] = []
+
+def lazy_import(name: str) -> Any:
+    module = LazyModule(name)
+    _lazy.append(module)
+    return module
+
+def preload() -> None:
+    """Import every lazy module now. An import blocks the event loop, so a long-running server
+    does this before serving rather than stalling its first review."""
+    for module in _lazy:
+        module.load()
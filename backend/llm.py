@@ -0,0 +1,76 @@
+import asyncio
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from config import settings
+from lazy import lazy_import
+import metrics
+
+# The SDK takes most of a second to import; only processes that call the model pay for it
+openai = lazy_import("openai")
+httpx = lazy_import("httpx")
+
+_client: Optional["openai.AsyncOpenAI"] = None
+
+def get_client() -> "openai.AsyncOpenAI":
+    """Return the process-wide OpenAI client; its connection pool is reused across reviews."""
+    global _client
+    if _client is None:
+        _client = openai.AsyncOpenAI(
+            api_key=settings.openai_api_key,
+            base_url=settings.openai_base_url or None,
+            timeout=httpx.Timeout(settings.openai_timeout_seconds, connect=settings.openai_connect_timeout_seconds),
+            max_retries=settings.openai_max_retries,
+        )
+    return _client
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+async def complete(messages: List[Dict[str, str]], model: str, on_text: Optional[Callable[[str], None]] = None,
+                   **kwargs: Any) -> Tuple[str, Any]:
+    """Run a chat completion and return ``(content, usage)``.
+
+    With ``OPENAI_STREAM`` enabled the response is streamed and accumulated, and ``on_text`` sees
+    each piece as it arrives (without streaming it gets the whole content once). Cancelling the
+    awaiting task aborts the HTTP request (and closes the stream) so no further tokens are billed.
+    """
+    client = get_client()
+    if not settings.openai_stream:
+        resp = await client.chat.completions.create(model=model, messages=messages, **kwargs)
+        _count_tokens(model, resp.usage)
+        content = resp.choices[0].message.content or ""
+        if on_text:
+            on_text(content)
+        return content, resp.usage
+
+    stream = await client.chat.completions.create(
+        model=model, messages=messages, stream=True, stream_options={"include_usage": True}, **kwargs
+    )
+    parts, usage = [], None
+    try:
+        async for chunk in stream:
+            if chunk.usage is not None:
+                usage = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+                if on_text:
+                    on_text(parts[-1])
+    except asyncio.CancelledError:
+        await stream.close()
+        raise
+    _count_tokens(model, usage)
+    return "".join(parts), usage
+
+def _count_tokens(model: str, usage: Any) -> None:
+    if usage is None:
+        return
+    repo = metrics.repo_label()
+    metrics.LLM_TOKENS.inc(usage.prompt_tokens or 0, repo=repo, model=model, kind="prompt")
+    metrics.LLM_TOKENS.inc(usage.completion_tokens or 0, repo=repo, model=model, kind="completion")
+    # Prompt tokens the provider served from its prefix cache (already included in "prompt")
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) or 0
+    if cached:
+        metrics.LLM_TOKENS.inc(cached, repo=repo, model=model, kind="cached_prompt")
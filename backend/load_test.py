@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Load test: /health must keep answering while many reviews are waiting on the LLM.
+
+Runs a fake OpenAI endpoint (with configurable latency) in a child process, serves
+the bot app on a local port, starts --reviews concurrent reviews in the bot's event
+loop, and polls /health the whole time. With a blocking client every health check
+queued behind a review would wait out a full LLM round-trip; the test exits non-zero
+if the p99 health latency exceeds --max-health-ms (default: half the LLM latency).
+
+    python load_test.py --reviews 50 --llm-latency 3
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import time
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def fake_openai_app(latency: float):
+    from fastapi import FastAPI, Request
+
+    app = FastAPI()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        await asyncio.sleep(latency)
+        content = json.dumps({"summary": "Looks fine.", "files": []})
+        return {
+            "id": "chatcmpl-load", "object": "chat.completion", "created": int(time.time()),
+            "model": body["model"],
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": 100, "completion_tokens": 10, "total_tokens": 110},
+        }
+
+    return app
+
+def run_fake_openai(port: int, latency: float):
+    import uvicorn
+    uvicorn.run(fake_openai_app(latency), host="127.0.0.1", port=port, log_level="warning")
+
+async def wait_for_port(port: int):
+    while True:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.05)
+
+async def serve(app, port: int):
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    return server, task
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+async def run(args):
+    import httpx
+    import main
+    from reviewer import DEFAULT_RULES, review_changed_files
+
+    fake = multiprocessing.Process(target=run_fake_openai, args=(args.openai_port, args.llm_latency), daemon=True)
+    fake.start()
+    await wait_for_port(args.openai_port)
+    bot_server, bot_task = await serve(main.app, args.bot_port)
+
+    changed = [{"filename": f"src/mod_{i}.py", "status": "modified",
+                "patch": f"@@ -1,2 +1,2 @@\n-x = {i}\n+x = {i + 1}\n"} for i in range(3)]
+    started = time.perf_counter()
+    reviews = [asyncio.create_task(review_changed_files("load", "test", n, changed, DEFAULT_RULES))
+               for n in range(args.reviews)]
+
+    health_ms = []
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.bot_port}") as client:
+        while not all(r.done() for r in reviews):
+            t = time.perf_counter()
+            r = await client.get("/health")
+            r.raise_for_status()
+            health_ms.append((time.perf_counter() - t) * 1000)
+            await asyncio.sleep(args.health_interval)
+    await asyncio.gather(*reviews)
+    elapsed = time.perf_counter() - started
+
+    bot_server.should_exit = True
+    await bot_task
+    fake.terminate()
+
+    p99 = percentile(health_ms, 0.99)
+    print(f"reviews: {args.reviews} in {elapsed:.2f}s (LLM latency {args.llm_latency}s each)")
+    print(f"health checks: {len(health_ms)}  p50 {percentile(health_ms, 0.5):.1f} ms  "
+          f"p99 {p99:.1f} ms  max {max(health_ms, default=0):.1f} ms")
+    return p99 <= args.max_health_ms
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reviews", type=int, default=50)
+    parser.add_argument("--llm-latency", type=float, default=3.0)
+    parser.add_argument("--health-interval", type=float, default=0.05)
+    parser.add_argument("--max-health-ms", type=float, default=None)
+    parser.add_argument("--openai-port", type=int, default=free_port())
+    parser.add_argument("--bot-port", type=int, default=free_port())
+    args = parser.parse_args()
+    if args.max_health_ms is None:
+        args.max_health_ms = args.llm_latency * 1000 / 2
+
+    # Point the bot at the fake endpoint and keep all state in memory
+    os.environ.update({
+        "OPENAI_API_KEY": "load-test",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{args.openai_port}/v1",
+        "OPENAI_RPM": "0", "OPENAI_TPM": "0",
+        "REVIEW_CONCURRENCY": str(args.reviews),
+        "JOB_STORE_URL": "memory://",
+        "REVIEW_CACHE_URL": "memory://",
+        "STATE_URL": "memory://",
+        "KNOWLEDGE_URL": "memory://",
+    })
+    ok = asyncio.run(run(args))
+    print("✅ health stayed responsive" if ok else "❌ health checks stalled behind reviews")
+    raise SystemExit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
-import os, json
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, Header, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 
@@ -9,9 +10,46 @@ load_dotenv()
 
 from config import settings
 import github_client as gh
-from reviewer import parse_repo_rules, review_changed_files, render_markdown
+import lazy
+import llm
+import metrics
+import router
+import state
+import webhooks
+from jobs import Job, JobQueue, make_job_store
+from coalesce import pr_key, pr_head
+from pipeline import coalescer, review_pull_request
+from reviewer import knowledge, llm_scheduler, review_cache, rules_cache_stats
 
-app = FastAPI(title="AI Code Review Bot", version="1.0.0")
+logging.basicConfig(level=settings.log_level, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+logger = logging.getLogger("ai_review")
+
+async def handle_job(job: Job):
+    if job.kind == "pull_request":
+        with metrics.trace(job=job.id):
+            return await review_pull_request(job.payload)
+    raise ValueError(f"Unknown job kind: {job.kind}")
+
+queue = JobQueue(
+    make_job_store(settings.job_store_url),
+    handle_job,
+    workers=settings.job_workers,
+    max_attempts=settings.job_max_attempts,
+    backoff=settings.job_backoff_seconds,
+    lease=settings.job_lease_seconds,
+    retention=settings.job_retention_seconds,
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    lazy.preload()
+    await queue.start()
+    yield
+    await queue.stop()
+    await llm.close_client()
+    await gh.close_client()
+
+app = FastAPI(title="AI Code Review Bot", version="1.0.0", lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -30,49 +68,86 @@ async def root():
 async def health():
     return {"ok": True, "service": "ai-code-review-bot"}
 
+@app.get("/stats")
+async def stats():
+    return {"queue_depth": await queue.depth(), "review_cache": await review_cache.astats(),
+            "github_latency": gh.latency_stats(), "github_cache": gh.response_cache.stats(),
+            "rules_cache": rules_cache_stats(), "model_tiers": router.tier_stats.stats(),
+            "llm_scheduler": llm_scheduler.stats(), "github_rate_limits": gh.rate_limit_stats(),
+            "knowledge": await knowledge.astats() if knowledge else None}
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    metrics.QUEUE_DEPTH.set(await queue.depth())
+    for name, s in (("review", await review_cache.astats()), ("github", gh.response_cache.stats())):
+        metrics.CACHE_HIT_RATIO.set(s["hit_ratio"], cache=name)
+    rules = rules_cache_stats()
+    lookups = rules["hits"] + rules["misses"]
+    metrics.CACHE_HIT_RATIO.set(rules["hits"] / lookups if lookups else 0.0, cache="rules")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = await queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.model_dump(exclude={"payload"})
+
 @app.post("/webhook")
 async def webhook(
     request: Request,
-    x_github_event: str = Header(None, convert_underscores=False),
-    x_hub_signature_256: str = Header(None, convert_underscores=False),
+    x_github_event: str = Header(None),
+    x_hub_signature_256: str = Header(None),
+    x_github_delivery: str = Header(None),
 ):
     try:
         raw = await request.body()
-        if not gh.verify_signature(settings.github_webhook_secret, raw, x_hub_signature_256):
+        with metrics.trace(delivery=x_github_delivery), metrics.span("signature"):
+            valid = webhooks.verify_signature(settings.github_webhook_secret, raw, x_hub_signature_256)
+        if not valid:
             raise HTTPException(status_code=401, detail="Invalid signature")
 
-        payload = await request.json()
         # Only react to PR lifecycle events
-        if x_github_event != "pull_request":
-            return JSONResponse({"ignored": True, "event": x_github_event})
-
-        action = payload.get("action")
-        if action not in {"opened", "reopened", "synchronize"}:
-            return JSONResponse({"ignored_action": action})
-
-        installation_id = payload["installation"]["id"]
-        token = await gh._installation_token(installation_id)
-
-        pr = payload["pull_request"]
-        owner = payload["repository"]["owner"]["login"]
-        repo = payload["repository"]["name"]
-        pr_number = pr["number"]
-
-        # Optional repo rules
-        cfg = await gh.get_repo_file(owner, repo, ".aicodereview.yml", token)
-        rules = parse_repo_rules(cfg)
+        try:
+            payload, ignored = webhooks.triage(x_github_event, raw)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid JSON payload")
+        if ignored:
+            return JSONResponse(ignored)
 
-        changed = await gh.list_changed_files(owner, repo, pr_number, token)
-        result = await review_changed_files(owner, repo, pr_number, changed, rules)
-        body = render_markdown(result, settings.bot_comment_tag)
+        # GitHub redelivers with the same delivery id. Claiming it in shared state stops a
+        # redelivery that lands on another worker or node from triggering a second review.
+        if x_github_delivery and not await state.shared.aset_if_absent(f"delivery:{x_github_delivery}", "1",
+                                                                         ttl=webhooks.DELIVERY_TTL):
+            job = await queue.get(x_github_delivery)
+            return JSONResponse({"status": job.status if job else "duplicate", "job_id": x_github_delivery,
+                                 "pr": payload["pull_request"]["number"]}, status_code=202)
+        # Record the newest head first so queued reviews of older pushes bail out early. A late
+        # delivery of an older push is still queued; its review finds itself superseded
+        await coalescer.observe(pr_key(payload), pr_head(payload))
+        try:
+            # The review runs on a worker; keying the job on the delivery id also makes
+            # retried deliveries idempotent within one job store.
+            job = await queue.enqueue("pull_request", payload, job_id=x_github_delivery,
+                                tenant=str((payload.get("installation") or {}).get("id", "")))
+        except Exception:
+            if x_github_delivery:
+                await state.shared.adelete(f"delivery:{x_github_delivery}")
+            raise
+        return JSONResponse(
+            {"status": "queued", "job_id": job.id, "pr": payload["pull_request"]["number"]},
+            status_code=202,
+        )
 
-        await gh.create_or_update_comment(owner, repo, pr_number, token, body, settings.bot_comment_tag)
-        return {"status": "review-posted", "pr": pr_number, "files_reviewed": len(changed)}
-    
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error processing webhook: {str(e)}")
+        logger.exception("Error processing webhook %s", x_github_delivery)
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    if settings.web_workers > 1 and not state.shared.shared:
+        raise SystemExit("WEB_CONCURRENCY > 1 needs a shared STATE_URL (sqlite:///... or redis://...), not memory://")
+    # Several workers need an import string so each process builds its own app
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=settings.web_workers)
@@ -0,0 +1,158 @@
+import bisect, contextvars, json, logging, threading, time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from config import settings
+
+logger = logging.getLogger("ai_review.trace")
+
+# Seconds; wide enough to cover a 2 ms signature check and a multi-minute LLM call
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _num(v: float) -> str:
+    return "+Inf" if v == float("inf") else repr(float(v)) if isinstance(v, float) else str(v)
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name, self.help, self.labelnames = name, help, tuple(labels)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def expose(self) -> str:
+        return "\n".join([f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self.samples()])
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> Iterator[str]:
+        for key, v in sorted(self._values.items()):
+            yield f"{self.name}{_labels(self.labelnames, key)} {_num(v)}"
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: Any) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple[str, ...], List[float]] = {}  # per-bucket counts, then sum
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts = self._values.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            counts[-1] += value
+
+    def samples(self) -> Iterator[str]:
+        for key, counts in sorted(self._values.items()):
+            cumulative = 0.0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = 'le="%s"' % _num(float(bound))
+                yield f"{self.name}_bucket{_labels(self.labelnames, key, le)} {_num(cumulative)}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {_num(counts[-1])}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {_num(cumulative)}"
+
+REGISTRY: List[_Metric] = []
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    return "\n".join(m.expose() for m in REGISTRY) + "\n"
+
+STAGE_SECONDS = Histogram("review_stage_seconds", "Time spent in each stage of the webhook pipeline", ("stage", "repo"))
+REVIEW_SECONDS = Histogram("review_seconds", "End-to-end review time per pull request", ("repo",))
+REVIEWS = Counter("reviews_total", "Reviews finished, by outcome", ("repo", "outcome"))
+LLM_TOKENS = Counter("openai_tokens_total", "OpenAI tokens billed, from the response usage", ("repo", "model", "kind"))
+PROMPT_TOKENS_SAVED = Counter("prompt_tokens_saved_total", "Prompt tokens saved against the old YAML prompt format, "
+                              "counted on sampled calls (PROMPT_SAVINGS_SAMPLE)", ("repo",))
+LLM_SECONDS = Histogram("llm_request_seconds", "Model call latency by routing tier", ("tier", "model"))
+LLM_FIRST_FINDING_SECONDS = Histogram("llm_first_finding_seconds", "Model call start to the first complete finding",
+                                      ("tier", "model"))
+LLM_RETRIED_FILES = Counter("llm_retried_files_total", "Files re-requested after truncated or malformed model output",
+                            ("tier",))
+ESCALATIONS = Counter("review_escalations_total", "Files re-reviewed by the large model after the cheap one")
+GITHUB_REQUEST_SECONDS = Histogram("github_request_seconds", "GitHub API request latency", ("endpoint", "status"))
+GITHUB_RATE_REMAINING = Gauge("github_rate_limit_remaining", "X-RateLimit-Remaining of the last GitHub response",
+                              ("installation", "resource"))
+KNOWLEDGE_HUNKS = Counter("knowledge_hunks_total", "Hunks looked up in the repo knowledge store, by outcome "
+                          "(exact, near or new)", ("outcome",))
+PREPASS_FILES = Counter("prepass_files_total", "Files classified by the local pre-pass", ("kind",))
+CACHE_HIT_RATIO = Gauge("cache_hit_ratio", "Hit ratio since startup", ("cache",))
+QUEUE_DEPTH = Gauge("job_queue_depth", "Jobs waiting for a worker")
+
+# Trace context of the current webhook / job; asyncio tasks inherit a copy when created
+_context: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar("trace_context", default={})
+_repos: Dict[str, None] = {}
+
+@contextmanager
+def trace(**fields: Any) -> Iterator[None]:
+    """Attach ``fields`` (repo, pr, job, installation, ...) to the spans and metrics recorded inside."""
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+def current(field: str, default: Any = "") -> Any:
+    return _context.get().get(field, default)
+
+def repo_label(repo: Optional[str] = None) -> str:
+    """The repo label, capped at ``METRICS_MAX_REPOS`` distinct values to bound series cardinality."""
+    repo = repo if repo is not None else current("repo")
+    if repo in _repos or not repo:
+        return repo
+    if len(_repos) >= settings.metrics_max_repos:
+        return "other"
+    _repos[repo] = None
+    return repo
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time one pipeline stage: observed in ``review_stage_seconds`` and logged as a JSON line."""
+    started = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage, repo=repo_label())
+        if logger.isEnabledFor(logging.INFO):
+            record = {"span": stage, "ms": round(elapsed * 1000, 2), **_context.get()}
+            if error:
+                record["error"] = error
+            logger.info(json.dumps(record, default=str))
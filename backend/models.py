@@ -6,6 +6,7 @@ class Finding(BaseModel):
     title: str
     details: str
     suggestion: Optional[str] = None
+    line: Optional[int] = None  # line in the new version of the file, when the model can pin one
 
 class FileReview(BaseModel):
     file: str
@@ -14,3 +15,4 @@ class FileReview(BaseModel):
 class ReviewResult(BaseModel):
     summary: str
     files: List[FileReview] = []
+    head_sha: Optional[str] = None  # commit the review covers; embedded in the comment for incremental reviews
@@ -0,0 +1,153 @@
+import re
+from functools import lru_cache
+from typing import Any, AsyncIterable, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+from pydantic import BaseModel
+
+BINARY_EXTENSIONS = {
+    "png", "jpg", "jpeg", "gif", "bmp", "ico", "webp", "svgz", "pdf", "zip", "gz", "tgz", "bz2", "xz",
+    "7z", "rar", "jar", "war", "whl", "so", "dll", "dylib", "exe", "bin", "o", "a", "class", "pyc",
+    "woff", "woff2", "ttf", "otf", "eot", "mp3", "mp4", "mov", "avi", "wav", "ogg", "sqlite", "db",
+}
+VENDOR_DIRS = {"vendor", "vendors", "third_party", "thirdparty", "node_modules", "bower_components", ".yarn"}
+GENERATED_NAMES = {
+    "package-lock.json", "yarn.lock", "pnpm-lock.yaml", "poetry.lock", "Pipfile.lock", "Cargo.lock",
+    "Gemfile.lock", "composer.lock", "go.sum", "uv.lock",
+}
+_GENERATED_SUFFIX = re.compile(r"(\.min\.(js|css)|\.map|_pb2(_grpc)?\.py|\.pb\.go|\.generated\.\w+|\.g\.dart)$")
+_GENERATED_MARKER = re.compile(r"@generated|Code generated .* DO NOT EDIT|auto-generated|autogenerated", re.I)
+
+def _glob_to_regex(glob: str) -> str:
+    """Translate one gitignore pattern (without ``!``) to a regex over repo-relative paths."""
+    dir_only = glob.endswith("/")
+    glob = glob.strip("/") if dir_only else glob
+    # Patterns without an inner slash match at any depth; the rest are anchored to the root
+    anchored = "/" in glob
+    glob = glob.lstrip("/")
+    out, i = [], 0
+    while i < len(glob):
+        c = glob[i]
+        if glob.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif glob.startswith("/**", i) and i + 3 == len(glob):
+            out.append("/.*")
+            i += 3
+        elif glob.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif c == "*":
+            out.append("[^/]*")
+            i += 1
+        elif c == "?":
+            out.append("[^/]")
+            i += 1
+        elif c == "[":
+            j = glob.find("]", i + 1)
+            if j == -1:
+                out.append(re.escape(c))
+                i += 1
+            else:
+                body = glob[i + 1:j].replace("\\", "\\\\")
+                out.append("[^" + body[1:] + "]" if body.startswith("!") else "[" + body + "]")
+                i = j + 1
+        else:
+            out.append(re.escape(c))
+            i += 1
+    body = "".join(out)
+    prefix = "" if anchored else "(?:.*/)?"
+    # A pattern naming a directory also covers everything below it
+    suffix = "/.*" if dir_only else "(?:/.*)?"
+    return prefix + body + suffix
+
+class PathMatcher:
+    """All ``ignore_globs`` compiled into a single regex with gitignore semantics.
+
+    Supports ``*``, ``?``, ``[...]``, ``**``, root anchoring, trailing-``/`` directory
+    patterns and ``!`` negation (the last matching pattern wins).
+    """
+
+    def __init__(self, patterns: Sequence[str]):
+        rules: List[Tuple[str, bool]] = []
+        for p in patterns:
+            p = str(p).strip()
+            if not p or p.startswith("#"):
+                continue
+            negated = p.startswith("!")
+            rules.append((_glob_to_regex(p[1:] if negated else p), negated))
+        # Alternation tries branches left to right, so list the patterns last-first
+        # and the first branch that matches is the pattern that wins
+        rules.reverse()
+        self._negated = [neg for _, neg in rules]
+        self._regex = re.compile("|".join(f"({rx})" for rx, _ in rules)) if rules else None
+
+    def matches(self, path: str) -> bool:
+        if self._regex is None:
+            return False
+        m = self._regex.fullmatch(path)
+        return bool(m) and not self._negated[m.lastindex - 1]
+
+@lru_cache(maxsize=128)
+def compile_globs(patterns: Tuple[str, ...]) -> PathMatcher:
+    return PathMatcher(patterns)
+
+class FilterReport(BaseModel):
+    skipped_files: int = 0
+    skipped_bytes: int = 0
+    reasons: Dict[str, int] = {}
+
+    def add(self, f: Dict[str, Any], why: str) -> None:
+        self.skipped_files += 1
+        self.skipped_bytes += len((f.get("patch") or "").encode())
+        self.reasons[why] = self.reasons.get(why, 0) + 1
+
+    def merge(self, other: "FilterReport") -> None:
+        self.skipped_files += other.skipped_files
+        self.skipped_bytes += other.skipped_bytes
+        for why, n in other.reasons.items():
+            self.reasons[why] = self.reasons.get(why, 0) + n
+
+    def describe(self) -> str:
+        reasons = ", ".join(f"{n} {why}" for why, n in sorted(self.reasons.items()))
+        return f"Skipped {self.skipped_files} file(s), {self.skipped_bytes / 1024:.1f} KB of diff ({reasons})."
+
+def skip_reason(f: Dict[str, Any], matcher: PathMatcher) -> Optional[str]:
+    path = f["filename"]
+    name = path.rsplit("/", 1)[-1]
+    if matcher.matches(path):
+        return "ignored"
+    if name.rsplit(".", 1)[-1].lower() in BINARY_EXTENSIONS or (not f.get("patch") and f.get("changes", 0)):
+        # GitHub omits the patch for binary files (and for diffs too large to render)
+        return "binary"
+    if VENDOR_DIRS.intersection(path.split("/")[:-1]):
+        return "vendored"
+    if name in GENERATED_NAMES or _GENERATED_SUFFIX.search(name):
+        return "generated"
+    if _GENERATED_MARKER.search((f.get("patch") or "")[:1000]):
+        return "generated"
+    return None
+
+def filter_files(changed: List[Dict[str, Any]], ignore_globs: Sequence[str]) -> Tuple[List[Dict[str, Any]], FilterReport]:
+    """Drop files that should never reach the model and report what was skipped."""
+    matcher = compile_globs(tuple(ignore_globs or ()))
+    kept, report = [], FilterReport()
+    for f in changed:
+        why = skip_reason(f, matcher)
+        if why is None:
+            kept.append(f)
+            continue
+        report.add(f, why)
+    return kept, report
+
+async def filter_stream(files: AsyncIterable[Dict[str, Any]], ignore_globs: Sequence[str],
+                        report: FilterReport) -> AsyncIterator[Dict[str, Any]]:
+    """``filter_files`` for a stream: skipped files are counted in ``report`` and never buffered."""
+    matcher = compile_globs(tuple(ignore_globs or ()))
+    async for f in files:
+        if f.get("status") in {"removed", "renamed"}:
+            yield f
+            continue
+        why = skip_reason(f, matcher)
+        if why is None:
+            yield f
+        else:
+            report.add(f, why)
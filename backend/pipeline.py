@@ -0,0 +1,150 @@
+import asyncio, functools, time
+from typing import Dict, Any, AsyncIterable, List, Optional, Tuple
+from config import settings
+import github_client as gh
+import metrics
+import state
+from pathfilter import FilterReport, filter_stream
+from coalesce import ReviewCoalescer, pr_key, pr_head
+from jobs import JobCancelled, RetryLater
+from inline import plan_inline_review, render_review_body
+from models import ReviewResult
+from reviewer import (parse_repo_rules, review_changed_files, render_header, render_markdown, merge_reviews,
+                      parse_review_state)
+
+coalescer = ReviewCoalescer(settings.review_debounce_seconds, state.shared)
+
+async def review_pull_request(payload: Dict[str, Any], post: bool = True) -> Dict[str, Any]:
+    """Run a full review for a ``pull_request`` webhook payload and post the comment. With
+    ``post=False`` nothing is written to GitHub and the result comes back under ``"result"``.
+
+    Raises ``Superseded`` when a newer push to the same PR arrives before the comment is posted.
+    """
+    key, head = pr_key(payload), pr_head(payload)
+    repo = payload["repository"].get("full_name") or "/".join(key[:2])
+    with metrics.trace(repo=repo, pr=payload["pull_request"]["number"], sha=head.sha[:12],
+                       installation=str(payload["installation"]["id"])):
+        await coalescer.settle(key, head)
+        started, outcome = time.perf_counter(), "error"
+        task = asyncio.ensure_future(_review(payload, functools.partial(coalescer.check, key, head), post))
+        coalescer.track(key, head, task)
+        try:
+            result = await task
+            outcome = "posted" if post else "dry-run"
+            return result
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            # If a newer push has been seen the job is superseded, whoever cancelled it
+            await coalescer.check(key, head)
+            raise
+        except JobCancelled:
+            outcome = "superseded"
+            raise
+        except RetryLater:
+            outcome = "deferred"
+            raise
+        finally:
+            await coalescer.release(key, head)
+            label = metrics.repo_label()
+            metrics.REVIEW_SECONDS.observe(time.perf_counter() - started, repo=label)
+            metrics.REVIEWS.inc(repo=label, outcome=outcome)
+
+async def collect_files(source: AsyncIterable[Dict[str, Any]], rules: Dict[str, Any],
+                        skipped: FilterReport) -> Tuple[List[Dict[str, Any]], bool]:
+    """Stream changed files (e.g. a PR's pages as they arrive) through the path filter, stopping
+    (and cancelling further page fetches) once the repo's ``max_files`` / ``max_patch_bytes``
+    limits are reached. Returns the files and whether the limits cut the list short."""
+    max_files = int(rules.get("max_files") or gh.MAX_PR_FILES)
+    max_bytes = int(rules.get("max_patch_bytes") or 0)
+    files, size = [], 0
+    stream = filter_stream(source, rules.get("ignore_globs") or [], skipped)
+    try:
+        async for f in stream:
+            size += len((f.get("patch") or "").encode())
+            if len(files) >= max_files or (max_bytes and size > max_bytes):
+                return files, True
+            files.append(f)
+    finally:
+        await stream.aclose()
+    return files, False
+
+def truncation_note(rules: Dict[str, Any], reviewed: int, total: Any) -> str:
+    return (f"⚠️ PR too large: reviewed {reviewed} of {total or '?'} files "
+            f"(limits: {rules.get('max_files')} files, {rules.get('max_patch_bytes')} bytes of diff).\n\n")
+
+async def _review(payload: Dict[str, Any], checkpoint, post: bool = True) -> Dict[str, Any]:
+    installation_id = payload["installation"]["id"]
+    with metrics.span("token"):
+        token = await gh._installation_token(installation_id)
+
+    pr = payload["pull_request"]
+    owner = payload["repository"]["owner"]["login"]
+    repo = payload["repository"]["name"]
+    pr_number = pr["number"]
+
+    # Optional repo rules
+    with metrics.span("config"):
+        cfg = await gh.get_repo_file(owner, repo, ".aicodereview.yml", token)
+        rules = parse_repo_rules(cfg)
+
+    inline = rules.get("comment_mode") == "review"
+    changed, previous, existing = None, None, None
+    skipped, truncated = FilterReport(), False
+    with metrics.span("files"):
+        if payload.get("action") == "synchronize" and rules.get("review_mode", "incremental") == "incremental":
+            # Only review what changed since the commit the existing bot comment covers
+            find = gh.find_bot_review if inline else gh.find_bot_comment
+            existing = await find(owner, repo, pr_number, token, settings.bot_comment_tag)
+            previous = parse_review_state(existing["body"], settings.bot_comment_tag) if existing else None
+            if previous and previous.head_sha and previous.head_sha != pr["head"]["sha"]:
+                changed = await gh.compare_files(owner, repo, previous.head_sha, pr["head"]["sha"], token)
+            if changed is not None:
+                # Merging the base branch into the PR brings every upstream change into the
+                # compare, with patches the PR's own diff does not have: review it all again
+                own = {f["filename"] for f in await gh.list_changed_files(owner, repo, pr_number, token)}
+                if any(f["filename"] not in own for f in changed):
+                    changed = None
+        if changed is None:
+            previous = None
+            changed, truncated = await collect_files(gh.iter_changed_files(owner, repo, pr_number, token),
+                                                     rules, skipped)
+
+    result = await review_changed_files(owner, repo, pr_number, changed, rules, checkpoint=checkpoint, skipped=skipped)
+    # The model call may have overlapped a newer push; its comment would be overwritten anyway
+    await checkpoint()
+    result.head_sha = pr["head"]["sha"]
+    if truncated:
+        result.summary = truncation_note(rules, len(changed), pr.get("changed_files")) + result.summary
+    if previous:
+        result = merge_reviews(previous, result, changed)
+    if not post:
+        return {"status": "review-ready", "pr": pr_number, "sha": pr["head"]["sha"], "files_reviewed": len(changed),
+                "incremental": previous is not None, "result": result}
+    if inline:
+        await _post_inline_review(owner, repo, pr_number, token, result, changed, existing, previous is not None)
+    else:
+        with metrics.span("render"):
+            body = render_markdown(result, settings.bot_comment_tag)
+        with metrics.span("post"):
+            await gh.create_or_update_comment(owner, repo, pr_number, token, body, settings.bot_comment_tag)
+    return {"status": "review-posted", "pr": pr_number, "sha": pr["head"]["sha"], "files_reviewed": len(changed),
+            "incremental": previous is not None}
+
+async def _post_inline_review(owner: str, repo: str, pr_number: int, token: str, result: ReviewResult,
+                              changed: List[Dict[str, Any]], existing: Optional[Dict[str, Any]], incremental: bool):
+    """Post only what changed since the bot's last review: new findings go out as one batched
+    PR review, edited and stale findings are updated in place."""
+    tag = settings.bot_comment_tag
+    comments = await gh.list_review_comments(owner, repo, pr_number, token)
+    with metrics.span("render"):
+        plan = plan_inline_review(result, changed, comments, tag, added_only=incremental)
+        body = render_review_body(result, plan, render_header(result, tag))
+    with metrics.span("post"):
+        if existing is None and not plan.create:
+            existing = await gh.find_bot_review(owner, repo, pr_number, token, tag)
+        if plan.create or existing is None:
+            await gh.create_review(owner, repo, pr_number, token, result.head_sha, body, plan.create)
+        else:
+            await gh.update_review(owner, repo, pr_number, existing["id"], token, body)
+        for comment_id, text in plan.update + plan.resolve:
+            await gh.update_review_comment(owner, repo, comment_id, token, text)
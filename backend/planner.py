@@ -0,0 +1,41 @@
+from functools import lru_cache
+from typing import Dict, List
+
+@lru_cache(maxsize=1)
+def _encoder():
+    # tiktoken is optional; without it (or without its cached vocab files) we fall back to a heuristic
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+def estimate_tokens(text: str) -> int:
+    """Local token count estimate: exact with tiktoken installed, ~4 chars per token otherwise."""
+    if not text:
+        return 0
+    enc = _encoder()
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+def plan_chunks(files_payload: List[Dict[str, str]], budget: int) -> List[List[Dict[str, str]]]:
+    """Pack files into chunks whose estimated patch tokens stay under ``budget``.
+
+    Files keep their PR order. A single file larger than the budget gets a chunk of its own
+    (its patch is already capped by ``shorten_patch``).
+    """
+    chunks: List[List[Dict[str, str]]] = []
+    current: List[Dict[str, str]] = []
+    used = 0
+    for f in files_payload:
+        # patch plus its "diff --git a/<path> b/<path>" header in the prompt
+        cost = 2 * estimate_tokens(f["path"]) + estimate_tokens(f["patch"]) + 6
+        if current and used + cost > budget:
+            chunks.append(current)
+            current, used = [], 0
+        current.append(f)
+        used += cost
+    if current:
+        chunks.append(current)
+    return chunks
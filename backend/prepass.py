@@ -0,0 +1,183 @@
+import ast, os, re
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from diffparse import iter_hunks
+from models import Finding
+
+# How much of the model a file needs
+TRIVIAL = "trivial"  # nothing to review: comment-only, dependency bump
+FORMATTING = "formatting"  # same code, different layout
+REVIEW = "review"
+
+_HASH_COMMENT = {"py", "rb", "sh", "bash", "yml", "yaml", "toml", "r", "pl", "cfg", "ini", "conf", "dockerfile", "mk",
+                 "makefile"}
+_SLASH_COMMENT = {"js", "jsx", "ts", "tsx", "mjs", "cjs", "java", "kt", "go", "c", "h", "cc", "cpp", "hpp", "cs",
+                  "swift", "rs", "scala", "php", "dart", "css", "scss", "less"}
+_MARKUP_COMMENT = {"html", "xml", "vue", "svelte"}
+# Formats where indentation is syntax: re-indenting a line can move it to another block
+_INDENTED = {"py", "yml", "yaml", "mk", "makefile", "haml", "pug", "jade", "slim", "sass", "styl", "coffee", "nim"}
+# String literals, possibly left open at the end of the line
+_LITERAL = re.compile(r""""(?:\\.|[^"\\])*"?|'(?:\\.|[^'\\])*'?|`(?:\\.|[^`\\])*`?""")
+
+# Manifests where a version-only change is a dependency bump
+_MANIFESTS = re.compile(r"(^|/)(requirements[^/]*\.txt|constraints[^/]*\.txt|package\.json|pyproject\.toml|setup\.cfg|"
+                        r"Pipfile|go\.mod|Cargo\.toml|Gemfile|pom\.xml|build\.gradle(\.kts)?|composer\.json|"
+                        r"\.tool-versions|\.nvmrc|\.python-version)$")
+_VERSION = re.compile(r"v?\d+(\.[\w*]+)+(-[\w.]+)?|\^|~|>=?|<=?|==|!=|\*")
+
+class Check(NamedTuple):
+    pattern: "re.Pattern[str]"
+    severity: str
+    title: str
+    details: str
+    suggestion: str
+    extensions: Optional[frozenset] = None  # None: every language
+    comments: bool = False  # also look inside comments (secrets leak there too)
+
+_USER_INPUT = r"(request\.|req\.|input\(|sys\.argv|params|query|body|args|argv|location\.|document\.|window\.)"
+
+CHECKS = [
+    Check(re.compile(rf"(?<![\w.])(eval|exec)\s*\(.*{_USER_INPUT}"), "critical", "eval on user input",
+          "Evaluating data that comes from a request or user input allows arbitrary code execution.",
+          "Parse the value explicitly (e.g. `json.loads`, `ast.literal_eval`, `int()`) instead of evaluating it."),
+    Check(re.compile(r"(?<![\w.])eval\s*\((?!\s*['\"])"), "major", "eval on a dynamic value",
+          "`eval` runs whatever string it is given; if any part of it can be influenced from outside, this is code execution.",
+          "Avoid `eval`; use a parser or a lookup table for the values you expect.", frozenset({"py", "js", "jsx", "ts", "tsx", "mjs", "cjs", "php", "rb"})),
+    Check(re.compile(r"-----BEGIN (RSA |EC |DSA |OPENSSH |PGP )?PRIVATE KEY"), "critical", "Private key committed",
+          "A private key is being added to the repository.", "Remove it, rotate the key and load it from a secret store.",
+          comments=True),
+    Check(re.compile(r"\b(AKIA|ASIA)[0-9A-Z]{16}\b|\bgh[pousr]_[A-Za-z0-9]{36,}\b|\bsk-(proj-)?[A-Za-z0-9_-]{20,}\b|"
+                     r"\bxox[baprs]-[A-Za-z0-9-]{10,}\b|\bAIza[0-9A-Za-z_-]{35}\b"), "critical", "Hard-coded credential",
+          "This looks like a live cloud or API credential.", "Remove it, revoke it, and read it from the environment or a secret store.",
+          comments=True),
+    Check(re.compile(r"(?i)\b(password|passwd|secret|api[_-]?key|access[_-]?token|auth[_-]?token|client[_-]?secret)\b"
+                     r"\s*[:=]\s*['\"](?!\s*['\"])(?![^'\"]*(\$\{|\{\{|<|example|changeme|xxx|\*\*\*))[^'\"\s]{8,}['\"]"),
+          "major", "Hard-coded secret", "A secret-looking value is assigned a string literal in source code.",
+          "Load it from configuration or the environment instead.", comments=True),
+    Check(re.compile(r"\bpickle\.loads?\s*\(|\byaml\.load\s*\((?![^)]*Loader\s*=\s*yaml\.(C?Safe|Base)Loader)"), "major",
+          "Unsafe deserialization", "`pickle` and `yaml.load` without a safe loader can execute code from untrusted input.",
+          "Use `json`, or `yaml.safe_load`.", frozenset({"py"})),
+    Check(re.compile(r"\bsubprocess\.\w+\(.*shell\s*=\s*True|\bos\.system\s*\("), "major", "Shell command execution",
+          "Running commands through the shell is injectable if any argument is user-controlled.",
+          "Pass an argument list to `subprocess.run` without `shell=True`.", frozenset({"py"})),
+    Check(re.compile(r"\bverify\s*=\s*False\b|rejectUnauthorized\s*:\s*false|InsecureSkipVerify\s*:\s*true"), "major",
+          "TLS verification disabled", "Certificate verification is turned off, which allows man-in-the-middle attacks.",
+          "Keep verification on; configure a CA bundle if a custom certificate is needed."),
+    Check(re.compile(r"\.innerHTML\s*=(?!\s*['\"`]\s*['\"`])|dangerouslySetInnerHTML"), "minor", "Raw HTML injection",
+          "Assigning unescaped HTML can lead to XSS if the content includes user data.",
+          "Use `textContent` or sanitize the HTML first.", frozenset({"js", "jsx", "ts", "tsx", "mjs", "cjs", "vue", "svelte"})),
+]
+
+class Analysis(NamedTuple):
+    kind: str
+    reason: str
+    findings: List[Finding]
+
+def _ext(path: str) -> str:
+    name = path.rsplit("/", 1)[-1].lower()
+    return name.rsplit(".", 1)[-1] if "." in name else name
+
+def _is_comment(text: str, ext: str) -> bool:
+    t = text.strip()
+    if not t:
+        return True
+    if ext in _HASH_COMMENT:
+        return t.startswith("#") and not t.startswith("#!")
+    if ext in _SLASH_COMMENT:
+        return t.startswith(("//", "/*", "*", "*/"))
+    if ext in _MARKUP_COMMENT:
+        return t.startswith("<!--") and t.endswith("-->")
+    return False
+
+def _strip_comment(text: str, ext: str) -> str:
+    """Drop a trailing line comment (best effort: ignores markers inside strings)."""
+    if ext in _HASH_COMMENT:
+        return re.sub(r"\s+#(?!.*['\"]).*$", "", text)
+    if ext in _SLASH_COMMENT:
+        return re.sub(r"\s+//(?!.*['\"]).*$", "", text)
+    return text
+
+def _squash_line(line: str) -> str:
+    """``line`` without whitespace, except inside string literals, where it is content."""
+    out, pos = [], 0
+    for m in _LITERAL.finditer(line):
+        out += ["".join(line[pos:m.start()].split()), m.group()]
+        pos = m.end()
+    out.append("".join(line[pos:].split()))
+    return "".join(out)
+
+def _squash(lines: List[str], ext: str) -> str:
+    kept = [_strip_comment(l, ext) for l in lines if not _is_comment(l, ext)]
+    if ext in _INDENTED:
+        # Leading indentation is syntax there; only whitespace inside a line is layout
+        return "\n".join(l[:len(l) - len(l.lstrip())] + _squash_line(l) for l in kept)
+    return "".join(_squash_line(l) for l in kept)
+
+def _same_python(old: List[str], new: List[str]) -> Optional[bool]:
+    """Compare two versions of a Python fragment by AST; None when either side does not parse
+    on its own (hunks often cut through a block). Both sides lose the same margin, so a line
+    that changed indentation level still differs."""
+    lines = [l for l in old + new if l.strip()]
+    margin = len(os.path.commonprefix([l[:len(l) - len(l.lstrip())] for l in lines])) if lines else 0
+    try:
+        a = ast.parse("\n".join(l[margin:] for l in old))
+        b = ast.parse("\n".join(l[margin:] for l in new))
+    except (SyntaxError, ValueError):
+        return None
+    return ast.dump(a) == ast.dump(b)
+
+def _dependency_bump(removed: List[str], added: List[str]) -> bool:
+    if not removed or len(removed) != len(added):
+        return False
+    strip = lambda lines: sorted(_VERSION.sub("", l).strip() for l in lines)
+    return strip(removed) == strip(added) and any(_VERSION.search(l) for l in added)
+
+def classify(path: str, patch: str) -> Tuple[str, str]:
+    """Decide whether a file's diff needs the model, and why not when it doesn't."""
+    ext = _ext(path)
+    hunks = list(iter_hunks(patch))
+    removed = [l.text for h in hunks for l in h.lines if l.kind == "-"]
+    added = [l.text for h in hunks for l in h.lines if l.kind == "+"]
+    if not removed and not added:
+        return TRIVIAL, "no line changes"
+    if _MANIFESTS.search(path) and _dependency_bump(removed, added):
+        return TRIVIAL, "dependency bump"
+    if all(_is_comment(l, ext) for l in removed + added):
+        return TRIVIAL, "comment-only"
+    # Each hunk's old side against its new side, context included: a line that moved into another
+    # block, or from one hunk to another, changes a side even though the same lines were removed and added
+    for h in hunks:
+        old = [l.text for l in h.lines if l.kind in " -"]
+        new = [l.text for l in h.lines if l.kind in " +"]
+        same = _same_python(old, new) if ext == "py" else None
+        # Token fallback: identical once comments and whitespace are gone
+        if same is False or (same is None and _squash(old, ext) != _squash(new, ext)):
+            return REVIEW, ""
+    return FORMATTING, "formatting-only"
+
+def run_checks(path: str, patch: str) -> List[Finding]:
+    """Built-in pattern checks over the added lines; at most one finding per check."""
+    ext = _ext(path)
+    checks = [c for c in CHECKS if c.extensions is None or ext in c.extensions]
+    findings, fired = [], set()
+    for h in iter_hunks(patch):
+        for l in h.lines:
+            if l.kind != "+":
+                continue
+            comment = _is_comment(l.text, ext)
+            for c in checks:
+                if c.title in fired or (comment and not c.comments) or not c.pattern.search(l.text):
+                    continue
+                # The specific eval check supersedes the generic one
+                if c.title == "eval on a dynamic value" and "eval on user input" in fired:
+                    continue
+                fired.add(c.title)
+                findings.append(Finding(severity=c.severity, title=c.title, details=c.details,
+                                        suggestion=c.suggestion, line=l.new_no))
+    if "eval on user input" in fired:
+        findings = [f for f in findings if f.title != "eval on a dynamic value"]
+    return findings
+
+def analyze(f: Dict[str, Any]) -> Analysis:
+    patch = f.get("patch") or ""
+    kind, reason = classify(f["filename"], patch)
+    return Analysis(kind, reason, run_checks(f["filename"], patch))
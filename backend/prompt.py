@@ -0,0 +1,76 @@
+import json, logging, random, textwrap
+from functools import lru_cache
+from typing import Any, Dict, List, NamedTuple
+from config import settings
+from lazy import lazy_import
+import metrics
+from planner import estimate_tokens
+
+yaml = lazy_import("yaml")
+
+SYSTEM_PROMPT = (
+    "You are a senior code reviewer. Provide concise, actionable feedback.\n"
+    "Return findings grouped by file as JSON only, with keys: file, findings[{severity,title,details,suggestion,line}]. "
+    "Severity one of: info, minor, major, critical. Keep it practical; include concrete suggestions. "
+    "line is the new-file line number the finding refers to, counted from the hunk headers, or null.\n"
+    "The diff is in unified format; each file starts with a `diff --git a/<path> b/<path>` line and "
+    "file is that path."
+)
+
+# Rules that filter, limit, post or route the review; the model never needs to see them
+_OPERATIONAL_RULES = {"ignore_globs", "review_mode", "max_files", "max_patch_bytes", "comment_mode", "prepass", "models"}
+
+class Prompt(NamedTuple):
+    messages: List[Dict[str, str]]
+    prefix_tokens: int  # the system message: identical for every call with the same rules
+    tokens: int
+
+def prompt_rules(rules: Dict[str, Any]) -> Dict[str, Any]:
+    """The part of the repo rules that steers the review itself."""
+    return {k: v for k, v in rules.items() if k not in _OPERATIONAL_RULES}
+
+@lru_cache(maxsize=256)
+def _system_message(canonical_rules: str) -> str:
+    return f"{SYSTEM_PROMPT}\n\nProject rules (JSON): {canonical_rules}"
+
+def system_message(rules: Dict[str, Any]) -> str:
+    """System prompt plus the rules in canonical compact JSON (sorted keys, no whitespace),
+    so every call for a repo starts with byte-identical text the provider can cache."""
+    return _system_message(json.dumps(prompt_rules(rules), sort_keys=True, separators=(",", ":"), default=str))
+
+def render_files(files: List[Dict[str, str]]) -> str:
+    """Patches as raw unified diff, one ``diff --git`` header per file; no quoting or escaping."""
+    return "\n".join(f"diff --git a/{f['path']} b/{f['path']}\n{f['patch'].rstrip(chr(10))}" for f in files)
+
+def build(rules: Dict[str, Any], files: List[Dict[str, str]]) -> Prompt:
+    """Messages for one review call. The shared prefix (system message) comes first and the
+    per-call diff last, which is the layout provider-side prompt caching matches on."""
+    system = system_message(rules)
+    user = "Pull request diff:\n" + render_files(files)
+    prefix = estimate_tokens(system)
+    return Prompt([{"role": "system", "content": system}, {"role": "user", "content": user}],
+                  prefix, prefix + estimate_tokens(user))
+
+def legacy_tokens(rules: Dict[str, Any], files: List[Dict[str, str]]) -> int:
+    """Tokens the previous prompt format (full rules and patches dumped as YAML) used for the same call."""
+    system = SYSTEM_PROMPT.rsplit("\n", 1)[0]
+    user = textwrap.dedent(f"""
+    Project rules (YAML):
+    {yaml.safe_dump(rules, sort_keys=False)}
+
+    Pull Request diff hunks:
+    {yaml.safe_dump(files, sort_keys=False)}
+    """)
+    return estimate_tokens(system) + estimate_tokens(user)
+
+def report_savings(rules: Dict[str, Any], files: List[Dict[str, str]], built: Prompt) -> None:
+    """On a ``PROMPT_SAVINGS_SAMPLE`` fraction of calls, count the tokens this prompt saved over the
+    old format and log them with the trace context. Off the hot path otherwise: the YAML dump is slow."""
+    if random.random() >= settings.prompt_savings_sample:
+        return
+    legacy = legacy_tokens(rules, files)
+    metrics.PROMPT_TOKENS_SAVED.inc(max(0, legacy - built.tokens), repo=metrics.repo_label())
+    if metrics.logger.isEnabledFor(logging.INFO):
+        record = {"prompt_tokens": built.tokens, "prefix_tokens": built.prefix_tokens, "legacy_tokens": legacy,
+                  "saved": legacy - built.tokens, "repo": metrics.current("repo"), "pr": metrics.current("pr")}
+        metrics.logger.info(json.dumps(record, default=str))
@@ -0,0 +1,47 @@
+import asyncio, time
+
+class _Bucket:
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.stamp = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def wait_for(self, amount: float) -> float:
+        """Seconds until ``amount`` can be taken (0 if it can be taken now)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def take(self, amount: float) -> None:
+        self.level -= min(amount, self.capacity)
+
+class RateLimiter:
+    """Token-bucket limiter for requests per minute and tokens per minute.
+
+    ``acquire`` waits until both one request and ``tokens`` tokens are available. A limit of
+    0 disables that bucket. Waiters are served in arrival order.
+    """
+
+    def __init__(self, rpm: int, tpm: int):
+        self._requests = _Bucket(rpm) if rpm > 0 else None
+        self._tokens = _Bucket(tpm) if tpm > 0 else None
+        self._lock = asyncio.Lock()
+
+    def _demands(self, tokens: int):
+        return [(b, n) for b, n in ((self._requests, 1), (self._tokens, tokens)) if b is not None]
+
+    async def acquire(self, tokens: int) -> None:
+        async with self._lock:
+            while True:
+                wait = max([b.wait_for(n) for b, n in self._demands(tokens)], default=0.0)
+                if wait <= 0:
+                    for b, n in self._demands(tokens):
+                        b.take(n)
+                    return
+                await asyncio.sleep(wait)
@@ -0,0 +1,182 @@
+import asyncio, functools, hashlib, json, re, sqlite3, threading, time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+from models import FileReview
+from state import RedisState, StateBackend
+
+_HUNK_HEADER = re.compile(r"^@@ -\d+(?:,\d+)? \+\d+(?:,\d+)? @@", re.M)
+
+def normalize_patch(patch: str) -> str:
+    """Drop line numbers from hunk headers and trailing whitespace so that the same hunk
+    cherry-picked onto another branch (or shifted by unrelated edits) hashes identically."""
+    patch = _HUNK_HEADER.sub("@@", patch.replace("\r\n", "\n"))
+    return "\n".join(line.rstrip() for line in patch.split("\n")).strip("\n")
+
+def review_key(patch: str, rules: Dict[str, Any], model: str, prompt_version: str) -> str:
+    material = json.dumps([normalize_patch(patch), rules, model, prompt_version], sort_keys=True, default=str)
+    return hashlib.sha256(material.encode()).hexdigest()
+
+class CacheBackend:
+    """Key/value storage for cached reviews. ``get`` must refresh the entry's recency.
+    ``_call`` runs a blocking operation for the event loop (see ``StateBackend``)."""
+
+    async def _call(self, fn, *args):
+        return await asyncio.to_thread(fn, *args)
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        """Return ``(value, stored_at)`` or None."""
+        raise NotImplementedError
+
+    def set(self, key: str, value: str, now: float) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+class MemoryCacheBackend(CacheBackend):
+    async def _call(self, fn, *args):
+        return fn(*args)
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                self._data.move_to_end(key)
+            return item
+
+    def set(self, key, value, now):
+        with self._lock:
+            self._data[key] = (value, now)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+class SQLiteCacheBackend(CacheBackend):
+    def __init__(self, path: str, max_entries: int):
+        self.max_entries = max_entries
+        # timeout: worker processes sharing the file wait for each other's writes
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="review-cache")
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS reviews ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL, used_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS reviews_lru ON reviews (used_at)")
+
+    async def _call(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(fn, *args))
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT value, stored_at FROM reviews WHERE key = ?", (key,)).fetchone()
+            if row:
+                self._conn.execute("UPDATE reviews SET used_at = ? WHERE key = ?", (time.time(), key))
+        return tuple(row) if row else None
+
+    def set(self, key, value, now):
+        with self._lock:
+            self._conn.execute("REPLACE INTO reviews VALUES (?, ?, ?, ?)", (key, value, now, now))
+            self._conn.execute(
+                "DELETE FROM reviews WHERE key IN ("
+                " SELECT key FROM reviews ORDER BY used_at DESC LIMIT -1 OFFSET ?)", (self.max_entries,)
+            )
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM reviews WHERE key = ?", (key,))
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM reviews").fetchone()[0]
+
+class StateCacheBackend(CacheBackend):
+    """Reviews kept in the shared state store (Redis) so every node reuses them. The store
+    expires entries after ``ttl`` and evicts under its own memory policy, so there is no
+    entry count to report."""
+
+    def __init__(self, backend: StateBackend, ttl: float):
+        self.backend, self.ttl = backend, ttl
+
+    async def _call(self, fn, *args):
+        return await self.backend._call(fn, *args)
+
+    def get(self, key):
+        item = self.backend.get(f"review:{key}")
+        return tuple(json.loads(item)) if item else None
+
+    def set(self, key, value, now):
+        self.backend.set(f"review:{key}", json.dumps([value, now]), ttl=self.ttl)
+
+    def delete(self, key):
+        self.backend.delete(f"review:{key}")
+
+    def __len__(self):
+        return 0
+
+class ReviewCache:
+    """Per-file ``FileReview`` cache with LRU eviction and a TTL. Async code uses the
+    ``a``-prefixed coroutines, which keep the backend's I/O off the event loop."""
+
+    def __init__(self, backend: CacheBackend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[FileReview]:
+        item = self.backend.get(key)
+        if item is not None and time.time() - item[1] > self.ttl:
+            self.backend.delete(key)
+            item = None
+        if item is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return FileReview.model_validate_json(item[0])
+
+    def set(self, key: str, review: FileReview) -> None:
+        self.backend.set(key, review.model_dump_json(), time.time())
+
+    async def aget(self, key: str) -> Optional[FileReview]:
+        return await self.backend._call(self.get, key)
+
+    async def aset(self, key: str, review: FileReview) -> None:
+        await self.backend._call(self.set, key, review)
+
+    async def astats(self) -> Dict[str, Any]:
+        return await self.backend._call(self.stats)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_ratio": self.hits / total if total else 0.0,
+                "entries": len(self.backend)}
+
+def make_review_cache(url: str, max_entries: int, ttl: float) -> ReviewCache:
+    """Build a cache from a URL: ``memory://``, ``redis://host:6379/0`` or
+    ``sqlite:///path/to/cache.db`` (a bare path means SQLite)."""
+    if url.startswith("memory:"):
+        return ReviewCache(MemoryCacheBackend(max_entries), ttl)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return ReviewCache(StateCacheBackend(RedisState(url), ttl), ttl)
+    if url.startswith("sqlite:///"):
+        url = url[len("sqlite:///"):]
+    return ReviewCache(SQLiteCacheBackend(url, max_entries), ttl)
@@ -1,28 +1,83 @@
-import yaml, textwrap
-from typing import Dict, Any, List
-from openai import OpenAI
+import asyncio, base64, hashlib, json, re, time, zlib
+from collections import OrderedDict
+from typing import Dict, Any, List, Awaitable, Callable, Optional, Set, Tuple
 from config import settings
+import llm
+import metrics
+import prepass
+import prompt
+import router
 from models import ReviewResult, FileReview, Finding
+from diffparse import iter_hunks, select_hunks
+from pathfilter import FilterReport, filter_files
+from planner import plan_chunks
+from ratelimit import RateLimiter
+from scheduler import FairScheduler, parse_weights
+from streamparse import ReviewStream
+from review_cache import make_review_cache, review_key
+from knowledge import make_knowledge, reword
+from lazy import lazy_import
 
-client = OpenAI(api_key=settings.openai_api_key)
+yaml = lazy_import("yaml")
+
+limiter = RateLimiter(settings.openai_rpm, settings.openai_tpm)
+# Model calls from every review share these slots, handed out fairly across installations
+llm_scheduler = FairScheduler(settings.llm_concurrency, parse_weights(settings.installation_weights))
+
+# Bump whenever the prompt changes meaningfully so cached reviews from the old prompt are not reused
+PROMPT_VERSION = "3"
+
+review_cache = make_review_cache(settings.review_cache_url, settings.review_cache_max_entries,
+                                 settings.review_cache_ttl_seconds)
+knowledge = make_knowledge(settings.knowledge_url, settings.knowledge_max_entries, settings.knowledge_max_per_repo,
+                           settings.knowledge_min_tokens, settings.knowledge_max_distance)
 
 DEFAULT_RULES = {
     "max_findings_per_file": 5,
     "focus": ["correctness", "security", "performance", "readability"],
     "ignore_globs": ["*.lock", "*.md", "dist/**", "build/**"],
-    "severity_threshold": "info"  # info | minor | major | critical
+    "severity_threshold": "info",  # info | minor | major | critical
+    "review_mode": "incremental",  # incremental | full
+    "max_files": 3000,  # stop listing files past this many reviewable files
+    "max_patch_bytes": 5_000_000,  # ...or past this much reviewable diff
+    "comment_mode": "issue",  # issue (one summary comment) | review (inline PR review comments)
+    "prepass": True,  # answer trivial / formatting-only files and built-in checks without the model
+    "models": dict(router.ROUTING_DEFAULTS)  # cheap / large model tiers and when to escalate
 }
 
 SEVERITY_ORDER = {"info":0, "minor":1, "major":2, "critical":3}
 
+# Parsed .aicodereview.yml keyed by git blob SHA, so an unchanged config is parsed once
+_rules_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_RULES_CACHE_SIZE = 256
+_rules_counters = {"hits": 0, "misses": 0}
+
+def blob_sha(text: str) -> str:
+    """The git blob SHA-1 of ``text`` (what GitHub reports as the file's ``sha``)."""
+    data = text.encode()
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
 def parse_repo_rules(config_text: str | None) -> Dict[str, Any]:
+    if not config_text:
+        return DEFAULT_RULES
+    sha = blob_sha(config_text)
+    if sha in _rules_cache:
+        _rules_counters["hits"] += 1
+        _rules_cache.move_to_end(sha)
+        return _rules_cache[sha]
+    _rules_counters["misses"] += 1
     try:
-        if not config_text:
-            return DEFAULT_RULES
         y = yaml.safe_load(config_text) or {}
-        return {**DEFAULT_RULES, **y}
+        rules = {**DEFAULT_RULES, **y}
     except Exception:
-        return DEFAULT_RULES
+        rules = DEFAULT_RULES
+    _rules_cache[sha] = rules
+    if len(_rules_cache) > _RULES_CACHE_SIZE:
+        _rules_cache.popitem(last=False)
+    return rules
+
+def rules_cache_stats() -> Dict[str, int]:
+    return {**_rules_counters, "entries": len(_rules_cache)}
 
 def shorten_patch(patch: str, max_chars: int) -> str:
     if not patch:
@@ -33,64 +88,174 @@ def shorten_patch(patch: str, max_chars: int) -> str:
     tail = patch[-max_chars // 2 :]
     return f"{head}\n... [truncated] ...\n{tail}"
 
-async def review_changed_files(owner: str, repo: str, pr_number: int, changed: List[Dict[str, Any]], repo_rules: Dict[str, Any]) -> ReviewResult:
+async def review_changed_files(owner: str, repo: str, pr_number: int, changed: List[Dict[str, Any]], repo_rules: Dict[str, Any],
+                               checkpoint: Optional[Callable[[], Awaitable[None]]] = None,
+                               skipped: Optional[FilterReport] = None) -> ReviewResult:
+    """Review the PR's patches. ``checkpoint`` runs right before each model call and may raise to abort the review.
+    ``skipped`` reports files the caller already filtered out, for the summary."""
     files_payload = []
-    for f in changed:
-        if f.get("status") in {"removed", "renamed"}:
-            # skip removed and summarized renamed without patch
-            continue
-        path = f["filename"]
-        patch = f.get("patch") or ""
-        files_payload.append({"path": path, "patch": shorten_patch(patch, settings.max_patch_chars)})
-
-    if not files_payload:
-        return ReviewResult(summary="No actionable changes detected.", files=[])
-
-    system = (
-        "You are a senior code reviewer. Provide concise, actionable feedback.\n"
-        "Return findings grouped by file as JSON only, with keys: file, findings[{severity,title,details,suggestion}]. "
-        "Severity one of: info, minor, major, critical. Keep it practical; include concrete suggestions."
-    )
-
-    user_instructions = textwrap.dedent(f"""
-    Project rules (YAML):
-    {yaml.safe_dump(repo_rules, sort_keys=False)}
-
-    Pull Request diff hunks:
-    {yaml.safe_dump(files_payload, sort_keys=False)}
-    """)
-
-    resp = client.chat.completions.create(
-        model="gpt-4o",
-        temperature=0.2,
-        messages=[
-            {"role":"system","content":system},
-            {"role":"user","content":user_instructions}
-        ],
-        response_format={"type":"json_object"}
-    )
-
-    data = resp.choices[0].message.content
-    # Defensive parse: LLM returns object like {"files":[{file,findings:...}], "summary":"..."} or similar
-    import json
-    try:
-        payload = json.loads(data)
-    except Exception:
-        payload = {"files": [], "summary": "AI returned unparsable output."}
+    reviews: Dict[str, FileReview] = {}
+    keyed: Dict[str, str] = {}  # the patch each file's cache key is computed from
+    # skip removed and summarized renamed without patch
+    candidates = [f for f in changed if f.get("status") not in {"removed", "renamed"}]
+    candidates, report = filter_files(candidates, repo_rules.get("ignore_globs") or [])
+    if skipped:
+        report.merge(skipped)
+    skipped = report
+    # Files the local pre-pass can answer on its own never reach the model
+    local: Dict[str, List[Finding]] = {}
+    answered: Dict[str, int] = {}
+    if repo_rules.get("prepass", True):
+        with metrics.span("prepass"):
+            remaining = []
+            for f in candidates:
+                analysis = prepass.analyze(f)
+                metrics.PREPASS_FILES.inc(kind=analysis.kind)
+                if analysis.kind != prepass.REVIEW:
+                    reviews[f["filename"]] = FileReview(file=f["filename"], findings=analysis.findings)
+                    answered[analysis.reason] = answered.get(analysis.reason, 0) + 1
+                    continue
+                if analysis.findings:
+                    local[f["filename"]] = analysis.findings
+                remaining.append(f)
+            candidates = remaining
+    cached = 0
+    route = router.routing(repo_rules)
+    tiers: Dict[str, str] = {}
+    bases: Dict[str, int] = {}
+    # Findings already known for hunks of the patch; only the other hunks go to the model
+    known: Dict[str, List[Finding]] = {}
+    similar: Dict[str, List[Finding]] = {}
+    reused = 0
+    scopes = {tier: _knowledge_scope(owner, repo, repo_rules, route[tier]) for tier in (router.CHEAP, router.LARGE)}
 
-    files = []
-    for f in payload.get("files", []):
-        findings = []
-        for g in f.get("findings", []):
-            findings.append(Finding(
-                severity=g.get("severity","info"),
-                title=g.get("title",""),
-                details=g.get("details",""),
-                suggestion=g.get("suggestion")
-            ))
-        files.append(FileReview(file=f.get("file", "unknown"), findings=findings))
-
-    summary = payload.get("summary") or "Automated review generated."
+    def cache_key(patch: str, tier: str) -> str:
+        # Keyed on the model that produced the review, so an escalated file's large-model
+        # review is not served as the cheap model's
+        return review_key(patch, prompt.prompt_rules(repo_rules), route[tier], PROMPT_VERSION)
+
+    with metrics.span("prompt"):
+        for f in candidates:
+            path = f["filename"]
+            raw_patch = f.get("patch") or ""
+            # Whole hunks under a token budget; character truncation only for patches without hunks
+            patch = (select_hunks(raw_patch, settings.max_patch_tokens, repo_rules.get("focus") or [])
+                     or shorten_patch(raw_patch, settings.max_patch_chars))
+            score = router.risk_score(path, raw_patch, repo_rules.get("focus") or [], local.get(path))
+            tiers[path] = router.tier_for(score, route)
+            key = cache_key(patch, tiers[path])
+            hit = await review_cache.aget(key)
+            if hit is None and tiers[path] == router.CHEAP:
+                # The cheap model escalated this patch before: the large model's review is what was kept
+                hit = await review_cache.aget(cache_key(patch, router.LARGE))
+            if hit is not None:
+                reviews[path] = _shift_lines(FileReview(file=path, findings=hit.findings), _line_base(patch))
+                cached += 1
+                continue
+            keyed[path], bases[path] = patch, _line_base(patch)
+            if knowledge:
+                split = await knowledge.asplit(scopes[tiers[path]], patch)
+                reused += split.reused
+                if split.reused:
+                    known[path] = split.findings
+                if split.similar:
+                    similar[path] = split.similar
+                if split.patch is None:
+                    reviews[path] = FileReview(file=path, findings=split.findings)
+                    await review_cache.aset(key, _shift_lines(reviews[path], -bases[path]))
+                    continue
+                patch = split.patch
+            files_payload.append({"path": path, "patch": patch})
+
+    if not files_payload and not reviews:
+        summary = "No actionable changes detected."
+        if skipped.skipped_files:
+            summary += f"\n\n_{skipped.describe()}_"
+        return ReviewResult(summary=summary, files=[])
+
+    if files_payload:
+        sem = asyncio.Semaphore(settings.review_concurrency)
+
+        async def run(tier, chunk):
+            async with sem:
+                if checkpoint:
+                    await checkpoint()
+                return await _call_model(chunk, repo_rules, tier, route[tier])
+
+        async def run_all(batches):
+            tasks = [asyncio.ensure_future(run(tier, chunk)) for tier, chunk in batches]
+            try:
+                return await asyncio.gather(*tasks)
+            except BaseException:
+                for t in tasks:
+                    t.cancel()
+                raise
+
+        def batch(tier, files):
+            return [(tier, c) for c in plan_chunks(files, settings.review_chunk_tokens)] if files else []
+
+        batches = (batch(router.CHEAP, [f for f in files_payload if tiers[f["path"]] == router.CHEAP])
+                   + batch(router.LARGE, [f for f in files_payload if tiers[f["path"]] == router.LARGE]))
+        results = await run_all(batches)
+
+        # Serious findings from the cheap model get a second opinion from the large one
+        escalate = []
+        for (tier, chunk), (_, fresh, _) in zip(batches, results):
+            flagged = {fr.file for fr in fresh if tier == router.CHEAP and router.needs_escalation(fr, route)}
+            escalate += [f for f in chunk if f["path"] in flagged]
+        if escalate:
+            router.tier_stats.escalated(len(escalate))
+            metrics.ESCALATIONS.inc(len(escalate))
+            second = batch(router.LARGE, escalate)
+            batches += second
+            results += await run_all(second)
+
+        summaries = []
+        escalated = {f["path"] for f in escalate}
+        for (tier, chunk), (chunk_summary, fresh, covered) in zip(batches, results):
+            summaries.append(chunk_summary)
+            by_path = {fr.file: fr for fr in fresh}
+            # Only files the model's answer fully accounts for are cached; files it left out of
+            # a well-formed answer had nothing to report and are cached as clean, too
+            for f in chunk:
+                path = f["path"]
+                if path not in covered and path not in by_path and path not in known:
+                    continue
+                fr = by_path.setdefault(path, FileReview(file=path))
+                if path in similar:
+                    fr.findings = reword(fr.findings, similar[path])
+                # An escalated file keeps only the large model's answer, stored under its key and scope
+                kept = path in covered and not (tier == router.CHEAP and path in escalated)
+                if kept and knowledge:
+                    await knowledge.alearn(scopes[tier], f["patch"], fr.findings)
+                # The model only saw the hunks the knowledge store could not answer
+                fr.findings = known.get(path, []) + fr.findings
+                if kept:
+                    await review_cache.aset(cache_key(keyed[path], tier), _shift_lines(fr, -bases[path]))
+            # Later batches (escalations) replace what the cheap model said about a file
+            reviews.update(by_path)
+        summary = _merge_summaries(summaries, len(files_payload))
+        if escalate:
+            summary += f"\n\n_{len(escalate)} file(s) re-reviewed with {route[router.LARGE]} after the first pass._"
+    elif cached:
+        summary = f"No new changes since the last review; findings for {cached} file(s) reused."
+    else:
+        summary = "No files needed a model review."
+
+    for path, findings in local.items():
+        fr = reviews.setdefault(path, FileReview(file=path))
+        seen = {f.title.lower() for f in findings}
+        fr.findings = findings + [f for f in fr.findings if f.title.lower() not in seen]
+
+    if reused:
+        summary += f"\n\n_Findings for {reused} hunk(s) already reviewed in earlier pull requests were reused._"
+    if answered:
+        reasons = ", ".join(f"{n} {why}" for why, n in sorted(answered.items()))
+        summary += f"\n\n_Answered {sum(answered.values())} file(s) without the model ({reasons})._"
+    if skipped.skipped_files:
+        summary += f"\n\n_{skipped.describe()}_"
+
+    files = list(reviews.values())
     # Apply severity threshold & cap per file
     minsev = SEVERITY_ORDER.get(repo_rules.get("severity_threshold","info"), 0)
     maxpf = int(repo_rules.get("max_findings_per_file", 5))
@@ -99,9 +264,162 @@ async def review_changed_files(owner: str, repo: str, pr_number: int, changed: L
 
     return ReviewResult(summary=summary, files=files)
 
+def _knowledge_scope(owner: str, repo: str, rules: Dict[str, Any], model: str) -> str:
+    """Knowledge is kept per repo, prompt and model: findings made under other rules, or by
+    another model, are not reused."""
+    material = json.dumps([prompt.prompt_rules(rules), PROMPT_VERSION, model], sort_keys=True, default=str)
+    return f"{owner}/{repo}@{hashlib.sha256(material.encode()).hexdigest()[:12]}"
+
+def _line_base(patch: str) -> int:
+    hunk = next(iter_hunks(patch), None)
+    return hunk.new_start if hunk else 0
+
+def _shift_lines(review: FileReview, delta: int) -> FileReview:
+    """Cache keys ignore hunk offsets, so cached findings store lines relative to the first hunk."""
+    return FileReview(file=review.file, findings=[
+        f.model_copy(update={"line": f.line + delta}) if f.line is not None else f for f in review.findings
+    ])
+
+def _merge_summaries(summaries: List[str], n_files: int) -> str:
+    if len(summaries) == 1:
+        return summaries[0]
+    lines = [f"Reviewed {n_files} files in {len(summaries)} batches."]
+    lines += [f"- {s.strip()}" for s in summaries if s.strip()]
+    return "\n".join(lines)
+
+async def _call_model(files_payload: List[Dict[str, str]], repo_rules: Dict[str, Any], tier: str = router.LARGE,
+                      model: Optional[str] = None, retry: bool = True) -> Tuple[str, List[FileReview], List[str]]:
+    """Ask the model to review ``files_payload``; returns ``(summary, file_reviews, covered_paths)``.
+
+    The output is parsed while it streams. If it is cut off or malformed, every complete finding
+    is kept and only the files it does not cover are asked for again (once)."""
+    built = prompt.build(repo_rules, files_payload)
+    prompt.report_savings(repo_rules, files_payload, built)
+    model = model or router.routing(repo_rules)[tier]
+    stream = ReviewStream()
+
+    def on_text(delta: str) -> None:
+        nonlocal first
+        stream.feed(delta)
+        if not first and stream.findings_seen:
+            first = True
+            metrics.LLM_FIRST_FINDING_SECONDS.observe(time.perf_counter() - started, tier=tier, model=model)
+
+    # Priced in prompt tokens, so an installation sending huge prompts gets fewer calls through
+    async with llm_scheduler.slot(str(metrics.current("installation")), built.tokens):
+        await limiter.acquire(built.tokens)
+        started, first = time.perf_counter(), False
+        with metrics.span("llm"):
+            _, usage = await llm.complete(
+                built.messages,
+                model=model,
+                on_text=on_text,
+                temperature=0.2,
+                response_format={"type":"json_object"}
+            )
+        elapsed = time.perf_counter() - started
+    router.tier_stats.record(tier, model, len(files_payload), elapsed, usage)
+    metrics.LLM_SECONDS.observe(elapsed, tier=tier, model=model)
+    with metrics.span("parse"):
+        requested = [f["path"] for f in files_payload]
+        covered, reviews = stream.covered(requested), stream.reviews()
+        summary = stream.summary
+    missing = [f for f in files_payload if f["path"] not in covered]
+    if missing and retry:
+        metrics.LLM_RETRIED_FILES.inc(len(missing), tier=tier)
+        again, fresh, recovered = await _call_model(missing, repo_rules, tier, model, retry=False)
+        # The retry's answer replaces whatever partial findings the first attempt had for a file
+        redone = set(recovered) | {fr.file for fr in fresh}
+        reviews = [fr for fr in reviews if fr.file not in redone] + fresh
+        covered += recovered
+        summary = summary or again
+    if summary is None:
+        summary = "Automated review generated." if covered or reviews else "AI returned unparsable output."
+    return summary, reviews, covered
+
+def carry_over(findings: List[Finding], patch: str, fresh: List[Finding]) -> List[Finding]:
+    """Earlier findings on a file an incremental review saw only through ``patch``: those on lines
+    inside its hunks are dropped (the new review has seen them), the rest move with the lines
+    added or removed above them. Findings without a line stay unless reported again."""
+    # (first old line, old length, new length) of each hunk; a pure insertion comes after its start line
+    spans = []
+    for h in iter_hunks(patch):
+        old_len = sum(1 for l in h.lines if l.kind in " -")
+        spans.append((h.old_start if old_len else h.old_start + 1, old_len,
+                      sum(1 for l in h.lines if l.kind in " +")))
+    titles = {f.title.strip().lower() for f in fresh}
+    kept = []
+    for f in findings:
+        if f.line is None:
+            if f.title.strip().lower() not in titles:
+                kept.append(f)
+            continue
+        shift = 0
+        for start, old_len, new_len in spans:
+            if f.line < start:
+                break
+            if f.line < start + old_len:
+                shift = None
+                break
+            shift += new_len - old_len
+        if shift is not None:
+            kept.append(f.model_copy(update={"line": f.line + shift}))
+    return kept
+
+def merge_reviews(previous: ReviewResult, current: ReviewResult, changed: List[Dict[str, Any]]) -> ReviewResult:
+    """Combine an incremental review of the ``changed`` files with the earlier one: files not in
+    ``changed`` keep their previous findings, changed files take the new findings plus the earlier
+    ones outside the changed hunks (see ``carry_over``)."""
+    by_name = {f["filename"]: f for f in changed}
+    renamed = {f["previous_filename"]: f["filename"] for f in changed if f.get("previous_filename")}
+    reviews = {fr.file: fr.model_copy(deep=True) for fr in current.files}
+    files = []
+    for fr in previous.files:
+        name = renamed.get(fr.file, fr.file)
+        f = by_name.get(name)
+        if f is None:
+            files.append(fr)
+            continue
+        if f.get("status") == "removed" or not f.get("patch"):
+            continue  # nothing left to anchor to, or no hunks to tell what changed
+        review = reviews.setdefault(name, FileReview(file=name))
+        review.findings = carry_over(fr.findings, f["patch"], review.findings) + review.findings
+    reviewed = {fr.file for fr in current.files}
+    files += [fr for fr in reviews.values() if fr.findings or fr.file in reviewed]
+    since = (previous.head_sha or "")[:7]
+    summary = (f"{current.summary.strip()}\n\n_Incremental review of {len(changed)} file(s) changed since "
+               f"`{since}`; earlier findings outside the changed lines are carried over from the previous review._")
+    return ReviewResult(summary=summary, files=files, head_sha=current.head_sha)
+
+# Comment bodies are capped at 65536 chars; leave the state out rather than break the post
+_MAX_STATE_CHARS = 40000
+
+def _encode_state(result: ReviewResult) -> str:
+    state = result.model_dump(include={"head_sha", "files"})
+    return base64.b64encode(zlib.compress(json.dumps(state, separators=(",", ":")).encode())).decode()
+
+def parse_review_state(body: str, tag: str) -> Optional[ReviewResult]:
+    """Recover the head SHA and findings that ``render_markdown`` embedded in a bot comment."""
+    m = re.search(rf"<!-- {re.escape(tag)}:state ([A-Za-z0-9+/=]+) -->", body or "")
+    if not m:
+        return None
+    try:
+        state = json.loads(zlib.decompress(base64.b64decode(m.group(1))))
+        return ReviewResult(summary="", **state)
+    except Exception:
+        return None
+
+def render_header(result: ReviewResult, tag: str) -> str:
+    """Hidden markers identifying the bot's comment (or review) and carrying its state."""
+    lines = [f"<!-- {tag} -->"]
+    if result.head_sha:
+        state = _encode_state(result)
+        if len(state) <= _MAX_STATE_CHARS:
+            lines.append(f"<!-- {tag}:state {state} -->")
+    return "\n".join(lines)
+
 def render_markdown(result: ReviewResult, tag: str) -> str:
-    lines = []
-    lines.append(f"<!-- {tag} -->")
+    lines = [render_header(result, tag)]
     lines.append("## 🤖 AI Code Review\n")
     lines.append(result.summary.strip())
     for fr in result.files:
@@ -109,7 +427,8 @@ def render_markdown(result: ReviewResult, tag: str) -> str:
             continue
         lines.append(f"\n### `{fr.file}`")
         for f in fr.findings:
-            lines.append(f"- **{f.severity.upper()}** — **{f.title}**\n  {f.details.strip()}")
+            where = f" (line {f.line})" if f.line else ""
+            lines.append(f"- **{f.severity.upper()}** — **{f.title}**{where}\n  {f.details.strip()}")
             if f.suggestion:
                 lines.append(f"  \n  _Suggestion_: {f.suggestion.strip()}")
     lines.append("\n> _Re-run automatically on new commits (synchronize)_")
@@ -0,0 +1,85 @@
+import re, threading
+from typing import Any, Dict, Iterable, List, Optional
+from config import settings
+from diffparse import FOCUS_KEYWORDS, iter_hunks
+from models import FileReview, Finding
+
+CHEAP, LARGE = "cheap", "large"
+
+# Defaults for the `models:` block of .aicodereview.yml; a partial block is merged over these
+ROUTING_DEFAULTS = {
+    "cheap": settings.openai_cheap_model,  # empty: send everything to the large model
+    "large": settings.openai_model,
+    "escalate_score": 6,  # files scoring at or above this go straight to the large model
+    "escalate_on": ["major", "critical"],  # cheap-model findings that get a second look from the large model
+}
+
+_RISKY_PATH = re.compile(r"(auth|login|session|password|secret|token|crypt|security|permission|acl|payment|billing|"
+                         r"migrat|schema|\.sql$|dockerfile|\.github/workflows|terraform|\.tf$|k8s|helm|nginx|settings\.py)",
+                         re.I)
+_LOW_RISK_PATH = re.compile(r"(^|/)(tests?|__tests__|spec|docs?|examples?|fixtures?)/|(_test|\.test|\.spec|_spec)\.\w+$|"
+                            r"(^|/)test_[^/]+$|\.(md|rst|txt|css|scss|svg)$", re.I)
+
+def routing(rules: Dict[str, Any]) -> Dict[str, Any]:
+    return {**ROUTING_DEFAULTS, **(rules.get("models") or {})}
+
+def risk_score(path: str, patch: str, focus: Iterable[str] = (), local: Optional[List[Finding]] = None) -> float:
+    """How much a file needs the large model: diff size, file type, the repo's focus areas
+    and what the local pre-pass already found."""
+    added = [l.text.lower() for h in iter_hunks(patch) for l in h.lines if l.kind == "+"]
+    changed = sum(1 for h in iter_hunks(patch) for l in h.lines if l.kind in "+-")
+    score = min(4.0, changed / 50)
+    if _RISKY_PATH.search(path):
+        score += 3
+    elif _LOW_RISK_PATH.search(path):
+        score -= 1
+    text = "\n".join(added)
+    for area in focus or ():
+        hits = sum(text.count(k) for k in FOCUS_KEYWORDS.get(str(area).lower(), ()))
+        # Security keywords say more about risk than a loop or an if does
+        score += min(3.0, hits * (0.5 if str(area).lower() == "security" else 0.1))
+    for f in local or ():
+        if f.severity in {"major", "critical"}:
+            score += 5
+    return score
+
+def tier_for(score: float, route: Dict[str, Any]) -> str:
+    if not route.get("cheap") or score >= float(route["escalate_score"]):
+        return LARGE
+    return CHEAP
+
+def needs_escalation(review: FileReview, route: Dict[str, Any]) -> bool:
+    return any(f.severity in set(route.get("escalate_on") or ()) for f in review.findings)
+
+class TierStats:
+    """Per-tier call, file, latency and token totals since startup."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tiers: Dict[str, Dict[str, float]] = {}
+        self.escalations = 0
+
+    def record(self, tier: str, model: str, files: int, seconds: float, usage: Any) -> None:
+        with self._lock:
+            s = self._tiers.setdefault(tier, {"calls": 0, "files": 0, "seconds": 0.0, "max_seconds": 0.0,
+                                              "prompt_tokens": 0, "completion_tokens": 0})
+            s["model"] = model
+            s["calls"] += 1
+            s["files"] += files
+            s["seconds"] += seconds
+            s["max_seconds"] = max(s["max_seconds"], seconds)
+            if usage is not None:
+                s["prompt_tokens"] += usage.prompt_tokens or 0
+                s["completion_tokens"] += usage.completion_tokens or 0
+
+    def escalated(self, files: int) -> None:
+        with self._lock:
+            self.escalations += files
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            tiers = {t: {**s, "avg_seconds": s["seconds"] / s["calls"] if s["calls"] else 0.0}
+                     for t, s in self._tiers.items()}
+            return {"tiers": tiers, "escalated_files": self.escalations}
+
+tier_stats = TierStats()
@@ -0,0 +1,281 @@
+import asyncio, functools, sqlite3, threading, time, uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+from config import settings
+
+class StateBackend:
+    """Small key/value store shared by every worker process (and node) of the bot.
+
+    The operations mirror Redis commands so a Redis deployment needs no translation:
+    ``get`` (GET), ``set`` (SET PX), ``set_if_absent`` (SET NX PX), ``delete_if_equals``
+    and ``extend_if_equals`` (compare-and-delete / compare-and-PEXPIRE scripts).
+    ``ttl`` is in seconds; None keeps the key until it is overwritten.
+
+    The ``a``-prefixed coroutines run the same operations off the event loop: a SQLite write
+    may wait on another process's lock and a Redis call on the network, and either would
+    otherwise stall every request and review in the process.
+    """
+
+    shared = True  # False when the state lives in this process only
+
+    async def _call(self, fn, *args):
+        return await asyncio.to_thread(fn, *args)
+
+    async def aget(self, key: str) -> Optional[str]:
+        return await self._call(self.get, key)
+
+    async def aset(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        await self._call(self.set, key, value, ttl)
+
+    async def aset_if_absent(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        return await self._call(self.set_if_absent, key, value, ttl)
+
+    async def adelete_if_equals(self, key: str, value: str) -> bool:
+        return await self._call(self.delete_if_equals, key, value)
+
+    async def aextend_if_equals(self, key: str, value: str, ttl: float) -> bool:
+        return await self._call(self.extend_if_equals, key, value, ttl)
+
+    async def adelete(self, key: str) -> None:
+        await self._call(self.delete, key)
+
+    def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    def set_if_absent(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        raise NotImplementedError
+
+    def delete_if_equals(self, key: str, value: str) -> bool:
+        raise NotImplementedError
+
+    def extend_if_equals(self, key: str, value: str, ttl: float) -> bool:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+class MemoryState(StateBackend):
+    """Single-process state; only valid with one worker."""
+
+    shared = False
+
+    async def _call(self, fn, *args):
+        # Nothing here blocks; a thread hop would only add latency
+        return fn(*args)
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._data: "OrderedDict[str, Tuple[str, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _live(self, key: str) -> Optional[Tuple[str, Optional[float]]]:
+        item = self._data.get(key)
+        if item and item[1] is not None and item[1] <= time.time():
+            del self._data[key]
+            return None
+        return item
+
+    def _put(self, key: str, value: str, ttl: Optional[float]) -> None:
+        self._data[key] = (value, time.time() + ttl if ttl is not None else None)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_keys:
+            self._data.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            item = self._live(key)
+            return item[0] if item else None
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._put(key, value, ttl)
+
+    def set_if_absent(self, key, value, ttl=None):
+        with self._lock:
+            if self._live(key):
+                return False
+            self._put(key, value, ttl)
+            return True
+
+    def delete_if_equals(self, key, value):
+        with self._lock:
+            item = self._live(key)
+            if not item or item[0] != value:
+                return False
+            del self._data[key]
+            return True
+
+    def extend_if_equals(self, key, value, ttl):
+        with self._lock:
+            item = self._live(key)
+            if not item or item[0] != value:
+                return False
+            self._put(key, value, ttl)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+class SQLiteState(StateBackend):
+    """State in a SQLite file. Writes take SQLite's file lock (``BEGIN IMMEDIATE``), so the
+    compare-and-set operations are atomic across every process on the machine."""
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS state_expiry ON state (expires_at)")
+        self._last_sweep = 0.0
+        # Operations share one connection and lock anyway; one thread keeps a contended
+        # database from tying up the default executor
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="state")
+
+    async def _call(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(fn, *args))
+
+    def _expiry(self, ttl: Optional[float]) -> Optional[float]:
+        return time.time() + ttl if ttl is not None else None
+
+    def _write(self, fn):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(time.time())
+                self._conn.execute("COMMIT")
+                return result
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _current(self, key: str, now: float) -> Optional[str]:
+        row = self._conn.execute(
+            "SELECT value FROM state WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, now)
+        ).fetchone()
+        return row[0] if row else None
+
+    def get(self, key):
+        with self._lock:
+            return self._current(key, time.time())
+
+    def set(self, key, value, ttl=None):
+        def op(now):
+            self._conn.execute("REPLACE INTO state VALUES (?, ?, ?)", (key, value, self._expiry(ttl)))
+            if now - self._last_sweep > 60:
+                # Expired rows are invisible already; drop them now and then to bound the file
+                self._conn.execute("DELETE FROM state WHERE expires_at <= ?", (now,))
+                self._last_sweep = now
+        self._write(op)
+
+    def set_if_absent(self, key, value, ttl=None):
+        def op(now):
+            if self._current(key, now) is not None:
+                return False
+            self._conn.execute("REPLACE INTO state VALUES (?, ?, ?)", (key, value, self._expiry(ttl)))
+            return True
+        return self._write(op)
+
+    def delete_if_equals(self, key, value):
+        return self._write(lambda now: bool(self._conn.execute(
+            "DELETE FROM state WHERE key = ? AND value = ?", (key, value)).rowcount))
+
+    def extend_if_equals(self, key, value, ttl):
+        return self._write(lambda now: bool(self._conn.execute(
+            "UPDATE state SET expires_at = ? WHERE key = ? AND value = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (self._expiry(ttl), key, value, now)).rowcount))
+
+    def delete(self, key):
+        self._write(lambda now: self._conn.execute("DELETE FROM state WHERE key = ?", (key,)))
+
+class RedisState(StateBackend):
+    """State in Redis (or anything speaking its protocol: Valkey, KeyDB, Dragonfly).
+    Needs the optional ``redis`` package."""
+
+    _DELETE_IF_EQUALS = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+    _EXTEND_IF_EQUALS = ("if redis.call('get', KEYS[1]) == ARGV[1] then "
+                         "return redis.call('pexpire', KEYS[1], ARGV[2]) end return 0")
+
+    def __init__(self, url: str, prefix: str = "ai-review:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("STATE_URL points at Redis but the 'redis' package is not installed") from e
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self._prefix = prefix
+        self._delete = self._redis.register_script(self._DELETE_IF_EQUALS)
+        self._extend = self._redis.register_script(self._EXTEND_IF_EQUALS)
+
+    def _ms(self, ttl: Optional[float]) -> Optional[int]:
+        return max(1, int(ttl * 1000)) if ttl is not None else None
+
+    def get(self, key):
+        return self._redis.get(self._prefix + key)
+
+    def set(self, key, value, ttl=None):
+        self._redis.set(self._prefix + key, value, px=self._ms(ttl))
+
+    def set_if_absent(self, key, value, ttl=None):
+        return bool(self._redis.set(self._prefix + key, value, px=self._ms(ttl), nx=True))
+
+    def delete_if_equals(self, key, value):
+        return bool(self._delete(keys=[self._prefix + key], args=[value]))
+
+    def extend_if_equals(self, key, value, ttl):
+        return bool(self._extend(keys=[self._prefix + key], args=[value, self._ms(ttl)]))
+
+    def delete(self, key):
+        self._redis.delete(self._prefix + key)
+
+def make_state(url: str) -> StateBackend:
+    """Build a backend from a URL: ``memory://``, ``redis://host:6379/0`` (also ``rediss://``)
+    or ``sqlite:///path/to/state.db`` (a bare path means SQLite)."""
+    if url.startswith("memory:"):
+        return MemoryState()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisState(url)
+    if url.startswith("sqlite:///"):
+        url = url[len("sqlite:///"):]
+    return SQLiteState(url)
+
+class Lock:
+    """A lease-based lock in shared state. The lease expires on its own if the holder dies;
+    a live holder keeps it with ``extend``. ``value`` lets waiters see who holds it."""
+
+    def __init__(self, backend: StateBackend, name: str, ttl: float = 30.0, value: str = ""):
+        self.backend, self.name, self.ttl = backend, name, ttl
+        self.token = f"{value}|{uuid.uuid4().hex}"
+
+    async def try_acquire(self) -> bool:
+        return await self.backend.aset_if_absent(self.name, self.token, self.ttl)
+
+    async def acquire(self, poll: float = 0.05, timeout: Optional[float] = None) -> None:
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while not await self.try_acquire():
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f"lock {self.name} is held by {await self.holder()}")
+            await asyncio.sleep(poll)
+
+    async def holder(self) -> Optional[str]:
+        token = await self.backend.aget(self.name)
+        return token.rsplit("|", 1)[0] if token else None
+
+    async def extend(self) -> bool:
+        return await self.backend.aextend_if_equals(self.name, self.token, self.ttl)
+
+    async def release(self) -> None:
+        await self.backend.adelete_if_equals(self.name, self.token)
+
+    async def __aenter__(self) -> "Lock":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.release()
+
+shared = make_state(settings.state_url)
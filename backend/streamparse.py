@@ -0,0 +1,168 @@
+import json
+from typing import Any, Dict, List, Optional, Set, Tuple
+from pydantic import ValidationError
+from models import FileReview, Finding
+
+SEVERITIES = ("info", "minor", "major", "critical")
+
+def _text(value: Any) -> Any:
+    """Scalars as strings (models write ``"details": 1`` or a numeric title); anything else as is."""
+    return "" if value is None else str(value) if isinstance(value, (int, float, bool)) else value
+
+def _line(value: Any) -> Optional[int]:
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    return value if isinstance(value, int) and not isinstance(value, bool) else None
+
+def to_finding(g: Any) -> Optional[Finding]:
+    """Validate one finding object from the model; None when it is not usable."""
+    if not isinstance(g, dict):
+        return None
+    severity = str(g.get("severity") or "info").lower()
+    suggestion = g.get("suggestion")
+    try:
+        return Finding.model_validate({
+            "severity": severity if severity in SEVERITIES else "info",
+            "title": _text(g.get("title")),
+            "details": _text(g.get("details")),
+            "suggestion": _text(suggestion) if suggestion is not None else None,
+            "line": _line(g.get("line")),
+        })
+    except ValidationError:
+        return None
+
+class _Frame:
+    __slots__ = ("kind", "start", "key", "index", "expect_key")
+
+    def __init__(self, kind: str, start: int):
+        self.kind, self.start = kind, start
+        self.key: Optional[str] = None
+        self.index = 0
+        self.expect_key = kind == "{"
+
+class ReviewStream:
+    """Incremental parser for the model's ``{"summary": ..., "files": [{"file", "findings": [...]}]}``.
+
+    Text is ``feed``-ed as it streams in. A finding is validated as soon as its closing brace
+    arrives and a file as soon as its own does, so when the output is cut off or goes bad
+    halfway, everything that was complete up to that point is kept. Text before the opening
+    brace (e.g. a Markdown fence) and after the closing one is ignored.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._pos = 0
+        self._stack: List[_Frame] = []
+        self._string: Optional[int] = None  # start offset of the string being read
+        self._escape = False
+        self.summary: Optional[str] = None
+        self.done = False  # the top-level object closed
+        self.error: Optional[str] = None  # set when the text stopped being valid JSON
+        self._files: Dict[int, Tuple[Optional[str], List[Finding]]] = {}
+        self.complete: Dict[int, FileReview] = {}  # files whose object closed, by position
+        self.findings_seen = 0
+        self.rejected: Set[int] = set()  # files with a finding that could not be used, by position
+
+    def feed(self, chunk: str) -> None:
+        if self.done or self.error:
+            return
+        self.text += chunk
+        text, stack = self.text, self._stack
+        while self._pos < len(text) and not self.done and not self.error:
+            i, c = self._pos, text[self._pos]
+            self._pos += 1
+            if self._string is not None:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    raw, self._string = text[self._string:i + 1], None
+                    top = stack[-1]
+                    if top.kind == "{" and top.expect_key:
+                        try:
+                            top.key, top.expect_key = json.loads(raw), False
+                        except ValueError as e:
+                            self.error = f"invalid key at offset {i}: {e}"
+                    else:
+                        self._value(raw)
+                continue
+            if not stack:
+                if c == "{":
+                    stack.append(_Frame("{", i))
+                continue
+            if c == '"':
+                self._string = i
+            elif c in "{[":
+                stack.append(_Frame(c, i))
+            elif c in "}]":
+                frame = stack.pop()
+                if frame.kind != ("{" if c == "}" else "["):
+                    self.error = f"unexpected {c!r} at offset {i}"
+                    return
+                if not stack:
+                    self.done = True
+                    try:
+                        # Streaming only checks structure; the finished document must parse too
+                        json.loads(text[frame.start:i + 1])
+                    except ValueError as e:
+                        self.error = f"malformed JSON: {e}"
+                    return
+                self._value(text[frame.start:i + 1])
+            elif c == ",":
+                top = stack[-1]
+                if top.kind == "[":
+                    top.index += 1
+                else:
+                    top.key, top.expect_key = None, True
+
+    def _path(self) -> Tuple[Any, ...]:
+        return tuple(f.key if f.kind == "{" else f.index for f in self._stack)
+
+    def _value(self, raw: str) -> None:
+        path = self._path()
+        try:
+            if path == ("summary",):
+                self.summary = str(json.loads(raw))
+            elif len(path) == 3 and path[0] == "files" and path[2] == "file":
+                name, findings = self._files.get(path[1], (None, []))
+                self._files[path[1]] = (str(json.loads(raw)), findings)
+            elif len(path) == 4 and path[0] == "files" and path[2] == "findings":
+                finding = to_finding(json.loads(raw))
+                if finding is None:
+                    self.rejected.add(path[1])
+                else:
+                    name, findings = self._files.get(path[1], (None, []))
+                    self._files[path[1]] = (name, findings + [finding])
+                    self.findings_seen += 1
+            elif len(path) == 2 and path[0] == "files":
+                obj = json.loads(raw)
+                if isinstance(obj, dict) and isinstance(obj.get("file"), str):
+                    parsed = [to_finding(g) for g in obj.get("findings") or []]
+                    if None in parsed:
+                        self.rejected.add(path[1])
+                    findings = [f for f in parsed if f]
+                    self.complete[path[1]] = FileReview(file=obj["file"], findings=findings)
+        except ValueError as e:
+            self.error = f"invalid JSON value at {'.'.join(map(str, path))}: {e}"
+
+    def reviews(self) -> List[FileReview]:
+        """Every file with something usable: complete files, then the fully formed findings of a
+        file that was cut off (when its name had already arrived)."""
+        out = [self.complete[i] for i in sorted(self.complete)]
+        for i, (name, findings) in sorted(self._files.items()):
+            if i not in self.complete and name and findings:
+                out.append(FileReview(file=name, findings=findings))
+        return out
+
+    def covered(self, requested: List[str]) -> List[str]:
+        """The requested paths this response fully accounts for. A well-formed response covers
+        all of them (the model leaves clean files out); a broken one only its complete files.
+        A file with a finding that could not be used is never covered: it is asked for again
+        rather than cached without that finding."""
+        rejected = {self.complete[i].file if i in self.complete else self._files.get(i, (None,))[0]
+                    for i in self.rejected}
+        if self.done and not self.error:
+            return [p for p in requested if p not in rejected]
+        names = {fr.file for fr in self.complete.values()}
+        return [p for p in requested if p in names and p not in rejected]
@@ -0,0 +1,8 @@
+import os, sys
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+# Every store in memory: the modules build their stores at import time, and tests must not
+# leave SQLite files behind or share them with a running bot
+for _name in ("STATE_URL", "REVIEW_CACHE_URL", "KNOWLEDGE_URL", "JOB_STORE_URL"):
+    os.environ[_name] = "memory://"
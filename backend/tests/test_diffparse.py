@@ -0,0 +1,48 @@
+from diffparse import commentable_lines, compress_context, iter_hunks, select_hunks
+
+PATCH = """@@ -10,4 +10,5 @@ def handler(request):
+     user = load(request)
+-    check(user)
++    check(user, strict=True)
++    audit(user)
+     return user
+ 
+@@ -40,2 +41,2 @@ class Store:
+-    ttl = 60
++    ttl = 300
+\\ No newline at end of file"""
+
+def test_hunks_number_old_and_new_lines():
+    first, second = iter_hunks(PATCH)
+    assert (first.old_start, first.new_start, first.section) == (10, 10, "def handler(request):")
+    assert [(l.kind, l.old_no, l.new_no) for l in first.lines] == [
+        (" ", 10, 10), ("-", 11, None), ("+", None, 11), ("+", None, 12), (" ", 12, 13), (" ", 13, 14)]
+    assert [(l.kind, l.old_no, l.new_no) for l in second.lines] == [("-", 40, None), ("+", None, 41), ("\\", None, None)]
+    assert (first.changed, first.added) == (3, 2)
+
+def test_render_round_trips():
+    hunks = list(iter_hunks(PATCH))
+    assert [list(iter_hunks(h.render()))[0] for h in hunks] == hunks
+
+def test_file_headers_are_skipped():
+    git = "diff --git a/x b/x\n--- a/x\n+++ b/x\n@@ -1 +1 @@\n-a\n+b\ndiff --git a/y b/y\n--- a/y\n+++ b/y\n@@ -1 +1 @@\n-c\n+d"
+    assert [[l.text for l in h.lines] for h in iter_hunks(git)] == [["a", "b"], ["c", "d"]]
+
+def test_commentable_lines():
+    assert commentable_lines(PATCH) == {10, 11, 12, 13, 14, 41}
+    assert commentable_lines(PATCH, added_only=True) == {11, 12, 41}
+
+def test_compress_context_splits_and_keeps_line_numbers():
+    lines = [" ctx"] * 10 + ["-old", "+new"] + [" ctx"] * 10 + ["+added"]
+    hunk = next(iter_hunks("@@ -1,21 +1,22 @@\n" + "\n".join(lines)))
+    pieces = compress_context(hunk, keep=2)
+    assert [(p.old_start, p.new_start) for p in pieces] == [(9, 9), (20, 20)]
+    for piece in pieces:
+        assert [l.new_no for l in piece.lines if l.new_no] == [l.new_no for l in next(iter_hunks(piece.render())).lines
+                                                               if l.new_no]
+
+def test_select_hunks():
+    assert select_hunks("not a diff", 1000) is None
+    assert select_hunks(PATCH, 10000) == "\n".join(h.render() for h in iter_hunks(PATCH))
+    small = select_hunks(PATCH, 30)
+    assert small is not None and len(list(iter_hunks(small))) < 2
@@ -0,0 +1,53 @@
+import httpx
+from config import settings
+from github_client import ConditionalCache, RateBudget
+
+NOW = 1_000_000.0
+
+def response(status=200, content=b"{}", **headers):
+    return httpx.Response(status, headers={k.replace("_", "-"): str(v) for k, v in headers.items()}, content=content)
+
+def test_budget_records_limits_per_resource():
+    budget = RateBudget()
+    assert budget.observe(response(x_ratelimit_remaining=4999, x_ratelimit_limit=5000, x_ratelimit_reset=NOW + 60,
+                                   x_ratelimit_resource="search"), NOW) is None
+    assert budget.limits == {"search": (4999, 5000, NOW + 60)}
+    assert budget.delay("GET", NOW) == 0
+
+def test_budget_paces_reads_near_the_reserve():
+    budget = RateBudget()
+    budget.limits["core"] = (10, 5000, NOW + 100)
+    assert budget.delay("GET", NOW) == 10.0  # 100 s to the reset spread over 10 requests
+    budget.spend()
+    assert budget.limits["core"][0] == 9
+    budget.limits["core"] = (0, 5000, NOW + 100)
+    assert budget.delay("GET", NOW) == 100.0
+
+def test_budget_blocks_on_secondary_limits():
+    budget = RateBudget()
+    assert budget.observe(response(403, retry_after=30), NOW) == 30.0
+    assert budget.observe(response(429), NOW) == 60.0
+    assert budget.observe(response(403, b'{"message": "You have exceeded a secondary rate limit"}'), NOW) == 60.0
+    assert budget.blocked_until == NOW + 60 and budget.throttled == 3
+    assert budget.delay("GET", NOW + 10) == 50.0
+
+def test_plain_forbidden_is_not_a_rate_limit():
+    budget = RateBudget()
+    assert budget.observe(response(403, b'{"message": "Resource not accessible by integration"}'), NOW) is None
+    assert budget.blocked_until == 0 and budget.throttled == 0
+
+def test_budget_spaces_writes():
+    interval = settings.github_write_interval_seconds
+    budget = RateBudget()
+    assert [budget.delay("POST", NOW) for _ in range(3)] == [0, interval, 2 * interval]
+    assert budget.delay("GET", NOW) == 0
+    assert RateBudget(writes_spaced=False).delay("POST", NOW) == 0
+
+def test_conditional_cache_evicts_by_bytes():
+    cache = ConditionalCache(max_entries=10, max_bytes=10)
+    cache.store("a", response(content=b"123456", etag='"a"'))
+    cache.store("b", response(content=b"123456", etag='"b"'))
+    assert cache.hit("a") is None and cache.hit("b")[1] == b"123456"
+    assert cache.validators("b") == {"If-None-Match": '"b"'}
+    cache.store("c", response(content=b"1"))  # no validators: nothing to revalidate with
+    assert cache.hit("c") is None
@@ -0,0 +1,28 @@
+from inline import fingerprint, plan_inline_review, render_finding, _marker
+from models import FileReview, Finding, ReviewResult
+
+TAG = "ai-code-review-bot"
+PATCH = "@@ -1,2 +1,3 @@\n a = 1\n-b = 2\n+b = 3\n+c = 4"
+
+def finding(title, line, details="d"):
+    return Finding(severity="major", title=title, details=details, line=line)
+
+def comment(cid, f, body=None):
+    return {"id": cid, "body": body or f"{render_finding(f)}\n\n{_marker(TAG, fingerprint('a.py', f))}"}
+
+def test_plan_creates_updates_and_resolves():
+    same, edited, gone = finding("Same", 2), finding("Edited", 3), finding("Gone", 2)
+    result = ReviewResult(summary="", head_sha="abcdef123", files=[FileReview(file="a.py", findings=[
+        same, edited.model_copy(update={"details": "new text"}), finding("New", 3), finding("Outside", 40)])])
+    existing = [comment(1, same), comment(2, edited), comment(3, gone), {"id": 4, "body": "human comment"}]
+    plan = plan_inline_review(result, [{"filename": "a.py", "patch": PATCH}], existing, TAG)
+    assert [(c["path"], c["line"]) for c in plan.create] == [("a.py", 3)]
+    assert [cid for cid, _ in plan.update] == [2] and "new text" in plan.update[0][1]
+    assert [cid for cid, _ in plan.resolve] == [3] and "abcdef1" in plan.resolve[0][1]
+    assert [f.title for _, f in plan.unanchored] == ["Outside"]
+
+def test_added_only_anchors_on_added_lines():
+    result = ReviewResult(summary="", files=[FileReview(file="a.py", findings=[finding("Context", 1)])])
+    assert plan_inline_review(result, [{"filename": "a.py", "patch": PATCH}], [], TAG).create
+    plan = plan_inline_review(result, [{"filename": "a.py", "patch": PATCH}], [], TAG, added_only=True)
+    assert not plan.create and len(plan.unanchored) == 1
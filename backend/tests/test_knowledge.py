@@ -0,0 +1,50 @@
+from knowledge import Knowledge, MemoryKnowledgeBackend, reword
+from models import Finding
+
+PATCH = """@@ -10,3 +10,4 @@ def handler(request):
+     user = load_user(request)
+-    if user.is_admin:
++    if user.is_admin and user.active:
++        audit_log(request, "admin access granted")
+     return render(request)"""
+
+def make(max_distance=0):
+    return Knowledge(MemoryKnowledgeBackend(100, 100), min_tokens=4, max_distance=max_distance)
+
+def bug(line=12, **kw):
+    return Finding(severity="major", title="Missing check", details="old wording", line=line, **kw)
+
+def test_same_hunk_elsewhere_reuses_findings_at_its_own_lines():
+    k = make()
+    k.learn("o/r", PATCH, [bug()])
+    moved = PATCH.replace("@@ -10,3 +10,4 @@", "@@ -40,3 +50,4 @@")
+    split = k.split("o/r", moved)
+    assert split.patch is None and split.reused == 1
+    assert [f.line for f in split.findings] == [52]
+    assert k.split("other/repo", moved).patch == moved
+
+def test_changed_literal_is_reviewed_again():
+    k = make()
+    k.learn("o/r", PATCH, [bug()])
+    split = k.split("o/r", PATCH.replace("admin access granted", "admin access denied"))
+    assert split.reused == 0 and split.findings == [] and split.patch is not None
+
+def test_near_hunk_goes_to_the_model_with_similar_findings():
+    k = make(max_distance=64)
+    k.learn("o/r", PATCH, [bug()])
+    split = k.split("o/r", PATCH.replace("user.active", "user.enabled"))
+    assert split.reused == 0 and split.patch is not None
+    assert [f.title for f in split.similar] == ["Missing check"]
+    assert k.stats()["reuse_ratio"] == 0.0
+
+def test_unplaceable_findings_store_nothing():
+    k = make()
+    k.learn("o/r", PATCH, [bug(line=99)])
+    assert len(k.backend) == 0
+
+def test_reword_copies_wording_by_title():
+    mine = [Finding(severity="minor", title="missing CHECK", details="new", line=3),
+            Finding(severity="info", title="Other", details="keep", line=4)]
+    out = reword(mine, [bug(suggestion="add it")])
+    assert [(f.severity, f.details, f.suggestion, f.line) for f in out] == [
+        ("minor", "old wording", "add it", 3), ("info", "keep", None, 4)]
@@ -0,0 +1,24 @@
+from pathfilter import PathMatcher, filter_files
+
+def test_gitignore_semantics():
+    m = PathMatcher(["docs/", "*.snap", "/build", "!keep.snap", "src/**/fixtures/*.json"])
+    assert m.matches("docs/index.md") and m.matches("pkg/docs/a.md")
+    assert m.matches("a/b/c.snap") and not m.matches("a/keep.snap")
+    assert m.matches("build/out.js") and not m.matches("pkg/build/out.js")
+    assert m.matches("src/x/y/fixtures/a.json") and not m.matches("src/fixtures/a.json.bak")
+    assert not PathMatcher([]).matches("anything")
+
+def test_filter_files_reports_why():
+    changed = [
+        {"filename": "src/app.py", "patch": "@@ -1 +1 @@\n-a\n+b"},
+        {"filename": "logo.png", "changes": 10},
+        {"filename": "vendor/lib/x.js", "patch": "@@ -1 +1 @@\n-a\n+b"},
+        {"filename": "package-lock.json", "patch": "@@ -1 +1 @@\n-a\n+b"},
+        {"filename": "api_pb2.py", "patch": "@@ -1 +1 @@\n-a\n+b"},
+        {"filename": "schema.ts", "patch": "@@ -0,0 +1 @@\n+// Code generated by tool. DO NOT EDIT."},
+        {"filename": "docs/guide.md", "patch": "@@ -1 +1 @@\n-a\n+b"},
+    ]
+    kept, report = filter_files(changed, ["docs/"])
+    assert [f["filename"] for f in kept] == ["src/app.py"]
+    assert report.skipped_files == 6
+    assert report.reasons == {"binary": 1, "vendored": 1, "generated": 3, "ignored": 1}
@@ -0,0 +1,55 @@
+from prepass import FORMATTING, REVIEW, TRIVIAL, classify, run_checks
+
+def kind(path, patch):
+    return classify(path, patch)[0]
+
+def test_trivial():
+    assert classify("a.py", "@@ -1,2 +1,2 @@\n x = 1\n-# old note\n+# new note") == (TRIVIAL, "comment-only")
+    assert classify("requirements.txt", "@@ -1,2 +1,2 @@\n-httpx==0.26.0\n+httpx==0.27.0\n fastapi==0.111.0") == \
+        (TRIVIAL, "dependency bump")
+    assert classify("a.py", "@@ -1,1 +1,1 @@\n x = 1") == (TRIVIAL, "no line changes")
+
+def test_layout_only_changes_are_formatting():
+    assert kind("a.js", "@@ -1,3 +1,3 @@\n function f(a, b) {\n-  return a+b;\n+  return a + b;\n }") == FORMATTING
+    assert kind("a.py", "@@ -3,2 +3,4 @@\n def f():\n-    return g(1,2)\n+    return g(\n+        1, 2)") == FORMATTING
+
+def test_changed_literals_are_reviewed():
+    assert kind("a.js", '@@ -1,1 +1,1 @@\n-const role = "admin";\n+const role = "ad min";') == REVIEW
+
+def test_statement_moved_out_of_a_block_is_reviewed():
+    patch = """@@ -10,6 +10,6 @@ function admin(req, res) {
+   const user = req.user;
+   if (!user.isAdmin) {
+-    return res.status(403).end();
+   }
++  return res.status(403).end();
+   deleteEverything();
+ }"""
+    assert kind("admin.js", patch) == REVIEW
+
+def test_statement_moved_between_hunks_is_reviewed():
+    patch = """@@ -1,4 +1,3 @@
+ function transfer(from: Account, to: Account) {
+-  requireAuth(from);
+   move(from, to);
+ }
+@@ -20,3 +19,4 @@
+ function audit(from: Account) {
++  requireAuth(from);
+   log(from);
+ }"""
+    assert kind("bank.ts", patch) == REVIEW
+
+def test_python_indentation_change_without_context_is_reviewed():
+    assert kind("a.py", "@@ -3,1 +3,1 @@\n-    return 1\n+return 1") == REVIEW
+    assert kind("a.py", "@@ -2,3 +2,3 @@\n if ok:\n     run()\n-    stop()\n+stop()") == REVIEW
+
+def test_yaml_indentation_is_structure():
+    assert kind("ci.yml", "@@ -1,3 +1,3 @@\n jobs:\n   build:\n-    runs-on: ubuntu\n+  runs-on: ubuntu") == REVIEW
+
+def test_checks_report_added_lines():
+    findings = run_checks("app.py", "@@ -1,1 +1,2 @@\n x = 1\n+y = eval(request.args['q'])")
+    assert [(f.title, f.line) for f in findings] == [("eval on user input", 2)]
+    assert run_checks("app.py", "@@ -1,2 +1,1 @@\n x = 1\n-y = eval(request.args['q'])") == []
+    leaked = run_checks("notes.md", "@@ -0,0 +1,1 @@\n+<!-- token: ghp_" + "a" * 36 + " -->")
+    assert [f.title for f in leaked] == ["Hard-coded credential"]
@@ -0,0 +1,46 @@
+from models import FileReview, Finding, ReviewResult
+from reviewer import carry_over, merge_reviews, parse_review_state, render_markdown
+
+def finding(title, line=None, severity="minor"):
+    return Finding(severity=severity, title=title, details="d", line=line)
+
+# Lines 10-11 replaced by three lines, so everything below moves down by one
+PATCH = "@@ -9,4 +9,5 @@\n ctx\n-a\n-b\n+a2\n+b2\n+c2\n ctx"
+
+def test_carry_over_drops_findings_in_the_hunk_and_shifts_the_rest():
+    kept = carry_over([finding("above", 5), finding("inside", 10), finding("edge", 12), finding("below", 40)],
+                      PATCH, [])
+    assert [(f.title, f.line) for f in kept] == [("above", 5), ("below", 41)]
+
+def test_carry_over_keeps_line_less_findings_unless_reported_again():
+    old = [finding("Missing tests"), finding("Unclear naming")]
+    assert [f.title for f in carry_over(old, PATCH, [finding("missing tests ")])] == ["Unclear naming"]
+
+def test_carry_over_after_pure_insertion():
+    insertion = "@@ -20,0 +21,2 @@\n+x\n+y"
+    assert [f.line for f in carry_over([finding("at", 20), finding("after", 21)], insertion, [])] == [20, 23]
+
+def test_merge_reviews():
+    previous = ReviewResult(summary="", head_sha="a" * 40, files=[
+        FileReview(file="untouched.py", findings=[finding("old", 3)]),
+        FileReview(file="edited.py", findings=[finding("inside", 10), finding("below", 40)]),
+        FileReview(file="old_name.py", findings=[finding("moved", 50)]),
+        FileReview(file="gone.py", findings=[finding("dead", 1)]),
+    ])
+    current = ReviewResult(summary="New.", head_sha="b" * 40,
+                           files=[FileReview(file="edited.py", findings=[finding("fresh", 11)])])
+    changed = [{"filename": "edited.py", "status": "modified", "patch": PATCH},
+               {"filename": "new_name.py", "previous_filename": "old_name.py", "status": "renamed",
+                "patch": "@@ -1,1 +1,2 @@\n x\n+y"},
+               {"filename": "gone.py", "status": "removed", "patch": "@@ -1,1 +0,0 @@\n-x"}]
+    merged = merge_reviews(previous, current, changed)
+    files = {fr.file: [(f.title, f.line) for f in fr.findings] for fr in merged.files}
+    assert files == {"untouched.py": [("old", 3)], "edited.py": [("below", 41), ("fresh", 11)],
+                     "new_name.py": [("moved", 51)]}
+    assert merged.head_sha == "b" * 40 and "`aaaaaaa`" in merged.summary
+
+def test_review_state_round_trips_through_the_comment():
+    result = ReviewResult(summary="s", head_sha="c" * 40, files=[FileReview(file="a.py", findings=[finding("t", 2)])])
+    state = parse_review_state(render_markdown(result, "ai-review"), "ai-review")
+    assert state.head_sha == result.head_sha and state.files == result.files
+    assert parse_review_state("no state here", "ai-review") is None
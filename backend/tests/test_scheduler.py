@@ -0,0 +1,44 @@
+import asyncio
+from scheduler import FairScheduler, parse_weights
+
+def test_parse_weights():
+    assert parse_weights(" 123:4, 456:0.5,,789") == {"123": 4.0, "456": 0.5, "789": 1.0}
+
+def run_order(scheduler, requests):
+    order = []
+
+    async def one(tenant):
+        async with scheduler.slot(tenant):
+            order.append(tenant)
+            await asyncio.sleep(0)
+
+    async def main():
+        async with scheduler.slot("hold"):  # queue everything up behind one busy slot
+            tasks = [asyncio.ensure_future(one(t)) for t in requests]
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    return order
+
+def test_backlog_does_not_starve_a_one_off_tenant():
+    order = run_order(FairScheduler(1), ["big"] * 5 + ["small"])
+    assert order.index("small") <= 1
+
+def test_weights_share_slots():
+    order = run_order(FairScheduler(1, {"a": 2}), ["a"] * 6 + ["b"] * 6)
+    assert order[:6].count("a") == 4
+
+def test_cancelled_waiter_releases_nothing():
+    async def main():
+        s = FairScheduler(1)
+        await s.acquire("a")
+        waiter = asyncio.ensure_future(s.acquire("b"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        s.release()
+        return s.stats()
+
+    stats = asyncio.run(main())
+    assert stats["busy"] == 0 and stats["waiting"] == {} and "b" not in stats["served"]
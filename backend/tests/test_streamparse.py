@@ -0,0 +1,37 @@
+import json
+from streamparse import ReviewStream, to_finding
+
+OUTPUT = json.dumps({"summary": "Two files.", "files": [
+    {"file": "a.py", "findings": [{"severity": "MAJOR", "title": "Bug", "details": "x", "line": "12"}]},
+    {"file": "b.py", "findings": [{"severity": "minor", "title": "Style", "details": "y", "line": 3}]},
+]})
+
+def feed(text, size=7):
+    stream = ReviewStream()
+    for i in range(0, len(text), size):
+        stream.feed(text[i:i + size])
+    return stream
+
+def test_streamed_output_parses_like_the_whole():
+    stream = feed("```json\n" + OUTPUT + "\n```")
+    assert stream.done and not stream.error and stream.summary == "Two files."
+    assert [(fr.file, [(f.severity, f.line) for f in fr.findings]) for fr in stream.reviews()] == [
+        ("a.py", [("major", 12)]), ("b.py", [("minor", 3)])]
+    assert stream.covered(["a.py", "b.py", "clean.py"]) == ["a.py", "b.py", "clean.py"]
+
+def test_cut_off_output_keeps_what_was_complete():
+    stream = feed(OUTPUT[:OUTPUT.index('"line": 3')])
+    assert not stream.done
+    assert [fr.file for fr in stream.reviews()] == ["a.py"]
+    assert stream.covered(["a.py", "b.py"]) == ["a.py"]
+
+def test_unusable_findings_keep_their_file_uncovered():
+    bad = json.dumps({"summary": "", "files": [{"file": "a.py", "findings": ["not an object", {"title": "ok", "details": "d"}]}]})
+    stream = feed(bad)
+    assert [len(fr.findings) for fr in stream.reviews()] == [1]
+    assert stream.covered(["a.py", "b.py"]) == ["b.py"]
+
+def test_to_finding_coerces_scalars():
+    f = to_finding({"severity": "urgent", "title": 404, "details": None, "suggestion": 1.5, "line": True})
+    assert (f.severity, f.title, f.details, f.suggestion, f.line) == ("info", "404", "", "1.5", None)
+    assert to_finding(["no"]) is None
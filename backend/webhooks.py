@@ -0,0 +1,30 @@
+import hashlib, hmac, json
+from typing import Any, Dict, Optional, Tuple
+
+# Standard library only: entry points answer pings and ignored events with this module
+# before importing anything that reviews
+
+REVIEW_EVENT = "pull_request"
+REVIEW_ACTIONS = frozenset({"opened", "reopened", "synchronize"})
+# How long a delivery id is remembered; GitHub redelivers within hours, not days
+DELIVERY_TTL = 86400
+
+def verify_signature(secret: str, raw_body: bytes, signature_header: str) -> bool:
+    if not signature_header or not signature_header.startswith("sha256="):
+        return False
+    digest = hmac.new(secret.encode(), raw_body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(f"sha256={digest}", signature_header)
+
+def triage(event: Optional[str], raw_body: bytes) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """``(payload, None)`` for a delivery that needs a review, ``(None, response)`` for one that
+    is only acknowledged. Other events (``ping``, ``push``...) are dropped unparsed. Raises
+    ``ValueError`` for a body that is not a JSON object; both entry points answer it with 400."""
+    if event != REVIEW_EVENT:
+        return None, {"ignored": True, "event": event}
+    payload = json.loads(raw_body)
+    if not isinstance(payload, dict):
+        raise ValueError("webhook payload is not a JSON object")
+    action = payload.get("action")
+    if action not in REVIEW_ACTIONS:
+        return None, {"ignored_action": action}
+    return payload, None